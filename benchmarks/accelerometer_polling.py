@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""Compares `MMA8452Q.get_xyz()` with `MMA8452Q.get_xyz_into()`: calls per
+second and the peak memory allocated during a call.
+
+If the accelerometer cannot be opened the I2C transfers are simulated, so
+only the Python overhead of each call is measured.
+
+    python3 benchmarks/accelerometer_polling.py [seconds]
+
+"""
+import os
+import sys
+import time
+import array
+import tracemalloc
+parentdir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, parentdir)
+from microstacknode.hardware.accelerometer.mma8452q import MMA8452Q
+
+
+class SimulatedMMA8452Q(MMA8452Q):
+    """Answers every read with zeros instead of using the I2C bus."""
+
+    def open(self):
+        self.fd = None
+
+    def close(self):
+        pass
+
+    def transaction(self, *msgs):
+        return [bytes(m.len) for m in msgs]
+
+    def _rdwr(self, ioctl_data):
+        pass
+
+
+def open_accelerometer():
+    accelerometer = MMA8452Q()
+    try:
+        accelerometer.open()
+        accelerometer.init()
+        return accelerometer, False
+    except OSError:
+        accelerometer = SimulatedMMA8452Q()
+        accelerometer.open()
+        accelerometer.init()
+        return accelerometer, True
+
+
+def calls_per_second(call, seconds):
+    n = 0
+    start = time.perf_counter()
+    end = start + seconds
+    while time.perf_counter() < end:
+        for i in range(100):
+            call()
+        n += 100
+    return n / (time.perf_counter() - start)
+
+
+def peak_bytes_per_call(call):
+    call()  # warm up (the first get_xyz_into() call builds its transfer)
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    baseline, peak = tracemalloc.get_traced_memory()
+    call()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak - baseline
+
+
+if __name__ == '__main__':
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 2
+    accelerometer, simulated = open_accelerometer()
+    xyz = array.array('f', [0, 0, 0])
+    calls = (('get_xyz()', accelerometer.get_xyz),
+             ('get_xyz_into()', lambda: accelerometer.get_xyz_into(xyz)))
+    if simulated:
+        print('Accelerometer not found, simulating the I2C bus.')
+    print('{:16} {:>14} {:>22}'.format('', 'calls/s', 'peak bytes per call'))
+    for name, call in calls:
+        print('{:16} {:14.0f} {:22d}'.format(
+            name, calls_per_second(call, seconds), peak_bytes_per_call(call)))
+    accelerometer.close()
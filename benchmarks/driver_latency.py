@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""Measures how long it takes to import each driver and to get a first
+reading from it.
+
+Import times are measured in a fresh interpreter for each module so that
+nothing is already cached. First-reading latency needs the hardware to be
+connected; drivers which fail are reported as unavailable.
+
+    python3 benchmarks/driver_latency.py [repeats]
+
+"""
+import os
+import sys
+import time
+import subprocess
+parentdir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, parentdir)
+
+
+DRIVER_MODULES = ('microstacknode.hardware.gps.l80gps',
+                  'microstacknode.hardware.accelerometer.mma8452q',
+                  'microstacknode.hardware.humiditytemperature.sht21',
+                  'microstacknode.hardware.display.ssd1306')
+
+IMPORT_TIMER = ('import sys, time; sys.path.insert(0, {!r}); '
+                't = time.perf_counter(); import {}; '
+                'print(time.perf_counter() - t)')
+
+
+def import_time(module, repeats):
+    """Returns the best time (in seconds) to import module in a fresh
+    interpreter.
+    """
+    times = []
+    for i in range(repeats):
+        output = subprocess.check_output(
+            [sys.executable, '-c', IMPORT_TIMER.format(parentdir, module)])
+        times.append(float(output))
+    return min(times)
+
+
+def first_reading_gps():
+    from microstacknode.hardware.gps.l80gps import L80GPS
+    L80GPS().get_nmea_pkt('GP')
+
+
+def first_reading_accelerometer():
+    from microstacknode.hardware.accelerometer.mma8452q import MMA8452Q
+    with MMA8452Q() as accelerometer:
+        accelerometer.get_xyz()
+
+
+def first_reading_sht21():
+    from microstacknode.hardware.humiditytemperature.sht21 import SHT21
+    with SHT21() as htsensor:
+        htsensor.get_temperature()
+
+
+def first_reading_display():
+    from microstacknode.hardware.display.ssd1306 import SSD1306_96x16
+    with SSD1306_96x16() as display:
+        display.init()
+
+
+FIRST_READINGS = (('l80gps', first_reading_gps),
+                  ('mma8452q', first_reading_accelerometer),
+                  ('sht21', first_reading_sht21),
+                  ('ssd1306', first_reading_display))
+
+
+def first_reading_latency(read):
+    """Returns the time (in seconds) read takes or None if it fails."""
+    start = time.perf_counter()
+    try:
+        read()
+    except Exception:
+        return None
+    return time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    print('Import time (best of {}):'.format(repeats))
+    for module in DRIVER_MODULES:
+        print('    {:50} {:8.2f} ms'.format(
+            module, import_time(module, repeats) * 1000))
+    print()
+    print('First reading (including import and bus setup):')
+    for name, read in FIRST_READINGS:
+        latency = first_reading_latency(read)
+        if latency is None:
+            print('    {:50} unavailable'.format(name))
+        else:
+            print('    {:50} {:8.2f} ms'.format(name, latency * 1000))
@@ -4,18 +4,25 @@ return it to an upright position.
 import time
 import datetime
 from microstacknode.hardware.accelerometer.mma8452q import MMA8452Q
+from microstacknode.hardware.accelerometer.capture import MMA8452QCapture
+from microstacknode.hardware.accelerometer.dsp import (Pipeline,
+                                                       Decimator,
+                                                       TiltAngles)
 
 
 if __name__ == '__main__':
-    with MMA8452Q() as accelerometer:
+    # 800 Hz down to 10 Hz, filtering out vibration and noise
+    pipeline = Pipeline(filters=[Decimator(80)], analysers=[TiltAngles()])
+    with MMA8452Q() as accelerometer, \
+            MMA8452QCapture(accelerometer) as capture:
         while True:
-            x, y, z = accelerometer.get_xyz()
-            x_angle = x * -180
-            y_angle = y * -180
-            z_angle = 90 - (180 * z)
+            time.sleep(1)
+            (angles,) = pipeline.run(capture.buffer)
+            pitch, roll, tilt = angles
+            if len(pitch) == 0:
+                continue
             print('Angle to upright @ {}:'.format(datetime.datetime.now()))
-            print('x:{:.2f}°'.format(x_angle))
-            print('y:{:.2f}°'.format(y_angle))
-            print('z:{:.2f}°'.format(z_angle))
+            print('x:{:.2f}°'.format(-pitch[-1]))
+            print('y:{:.2f}°'.format(-roll[-1]))
+            print('z:{:.2f}°'.format(tilt[-1]))
             print()
-            time.sleep(1)
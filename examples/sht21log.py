@@ -0,0 +1,15 @@
+'''Logs the humidity and temperature when they change (or every five
+minutes if they do not).'''
+import datetime
+from microstacknode.hardware.humiditytemperature.sht21 import SHT21
+from microstacknode.hardware.humiditytemperature.sampler import (
+    AdaptiveSampler)
+
+
+if __name__ == '__main__':
+    with SHT21() as htsensor:
+        for reading in AdaptiveSampler(htsensor):
+            print('{} {:.2f}°C {:.2f} %RH'.format(
+                datetime.datetime.fromtimestamp(reading.timestamp),
+                reading.temperature,
+                reading.humidity))
@@ -2,6 +2,10 @@
 import time
 from microstacknode.hardware.display.ssd1306 import SSD1306
 from microstacknode.hardware.accelerometer.mma8452q import MMA8452Q
+from microstacknode.hardware.accelerometer.capture import MMA8452QCapture
+from microstacknode.hardware.accelerometer.dsp import (Pipeline,
+                                                       Decimator,
+                                                       TiltAngles)
 from microstacknode.hardware.display.sprite import Sprite
 
 
@@ -18,7 +22,7 @@ def draw_circle(display):
     display.draw_sprite(45, 6, circle_sprite, update_display=False)
 
 
-def draw_dot(display, x_angle, y_angle, z_angle):
+def draw_dot(display, x_angle, y_angle):
     x = int((x_angle + 40) / 80 * 96)
     y = 16 - int((y_angle + 20) / 40 * 16)
     if 0 <= x < 96:
@@ -26,14 +30,17 @@ def draw_dot(display, x_angle, y_angle, z_angle):
 
 
 if __name__ == '__main__':
-    with SSD1306() as display, MMA8452Q() as accelerometer:
+    # 800 Hz down to 50 Hz, filtering out vibration and noise
+    pipeline = Pipeline(filters=[Decimator(16)], analysers=[TiltAngles()])
+    with SSD1306() as display, MMA8452Q() as accelerometer, \
+            MMA8452QCapture(accelerometer) as capture:
         while True:
-            xyz = accelerometer.get_xyz()
-            x_angle = xyz['x'] * -180
-            y_angle = xyz['y'] * -180
-            z_angle = 90 - (180 * xyz['z'])
+            time.sleep(0.05)
+            (angles,) = pipeline.run(capture.buffer)
+            pitch, roll, tilt = angles
+            if len(pitch) == 0:
+                continue
             display.clear_display(update_display=False)
             draw_circle(display)
-            draw_dot(display, x_angle, y_angle, z_angle)
+            draw_dot(display, -pitch[-1], -roll[-1])
             display.update_display()
-            # time.sleep(0.05)
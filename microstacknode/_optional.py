@@ -0,0 +1,43 @@
+"""Optional dependencies. NumPy and SciPy are only imported when they are
+first needed since they are slow to import, and everything which uses
+them has a plain Python fallback for when they are not installed.
+"""
+import importlib
+
+
+_modules = {}  # module name -> module or None if it is not installed
+
+
+def import_numpy():
+    """Returns the numpy module or None if it is not installed."""
+    return _import('numpy')
+
+
+def import_scipy_signal():
+    """Returns the scipy.signal module or None if SciPy is not installed."""
+    return _import('scipy.signal')
+
+
+def disable(name):
+    """Treats the module `name` (e.g. 'numpy') as not installed, so the
+    fallbacks can be tested or benchmarked. Undo with `reset()`.
+    """
+    _modules[name] = None
+
+
+def reset():
+    """Forgets the imported (and disabled) modules."""
+    _modules.clear()
+
+
+def _import(name):
+    try:
+        return _modules[name]
+    except KeyError:
+        pass
+    try:
+        module = importlib.import_module(name)
+    except ImportError:
+        module = None
+    _modules[name] = module
+    return module
@@ -0,0 +1,99 @@
+"""Offset calibration for the MMA8452Q.
+
+The offsets are written to the OFF_X, OFF_Y and OFF_Z registers so the
+chip corrects every sample itself. They are also saved in a small cache
+file (per I2C bus and address) which `MMA8452Q.init()` reloads:
+
+    >>> with MMA8452Q() as accelerometer:
+    ...     # lying flat, face up
+    ...     calibrate(accelerometer)
+
+"""
+import os
+import json
+import array
+
+
+DEFAULT_CALIBRATION_CACHE = os.path.join(os.path.expanduser('~'),
+                                         '.cache',
+                                         'microstacknode',
+                                         'mma8452q.json')
+DEFAULT_SAMPLES = 64
+DISCARD_SAMPLES = 2  # samples taken before the offsets changed
+MG_PER_OFFSET_COUNT = 2  # OFF_X/Y/Z resolution (milli G's)
+
+
+def calibrate(accelerometer,
+              n_samples=DEFAULT_SAMPLES,
+              gravity=(0, 0, 1),
+              cache=DEFAULT_CALIBRATION_CACHE):
+    """Averages n_samples samples with the accelerometer held still in a
+    known orientation, writes the offsets which correct them to the chip
+    and saves them in the cache. Returns the offsets (x, y, z) in OFF_X/Y/Z
+    register counts (2 milli G's each).
+
+    :param accelerometer: An initialised MMA8452Q.
+    :type accelerometer: MMA8452Q
+    :param n_samples: Number of samples to average.
+    :type n_samples: int
+    :param gravity: The expected reading in G's, (0, 0, 1) is flat and
+                    face up.
+    :type gravity: tuple
+    :param cache: Calibration cache file (or None to not save).
+    :type cache: str
+    :raises: TimeoutError if the accelerometer is not producing samples
+             (see `MMA8452Q.get_xyz_block_into()`).
+    """
+    with accelerometer.configure():
+        accelerometer.set_offsets(0, 0, 0)
+    samples = array.array('h', [0] * (3 * n_samples))
+    accelerometer.get_xyz_block_into(samples, DISCARD_SAMPLES, raw=True)
+    accelerometer.get_xyz_block_into(samples, n_samples, raw=True)
+    mg_per_count = accelerometer.g_range * 1000 / (1 << 11)
+    offsets = []
+    for axis in range(3):
+        mean = sum(samples[axis::3]) / n_samples
+        error = mean * mg_per_count - gravity[axis] * 1000
+        offsets.append(
+            min(max(-int(round(error / MG_PER_OFFSET_COUNT)), -128), 127))
+    with accelerometer.configure():
+        accelerometer.set_offsets(*offsets)
+    if cache is not None:
+        save_offsets(cache,
+                     accelerometer.bus,
+                     accelerometer.i2c_address,
+                     offsets)
+    return tuple(offsets)
+
+
+def load_offsets(path, bus, address):
+    """Returns the cached offsets (x, y, z) of the accelerometer at address
+    on bus or None if there are none.
+    """
+    entry = _load(path).get(_key(bus, address))
+    return tuple(entry) if entry is not None else None
+
+
+def save_offsets(path, bus, address, offsets):
+    """Saves the offsets of the accelerometer at address on bus."""
+    calibrations = _load(path)
+    calibrations[_key(bus, address)] = list(offsets)
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(calibrations, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def _load(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _key(bus, address):
+    return '{}:0x{:02x}'.format(bus, address)
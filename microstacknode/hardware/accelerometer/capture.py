@@ -0,0 +1,385 @@
+"""Background acquisition of MMA8452Q samples into a ring buffer.
+
+    >>> with MMA8452Q() as accelerometer, \\
+    ...         MMA8452QCapture(accelerometer) as capture:
+    ...     while True:
+    ...         samples, timestamps = capture.buffer.read_block()
+    ...         # samples is array('h', [x0, y0, z0, x1, y1, z1, ...])
+
+`ShockTrigger` watches the same buffer for shocks:
+
+    >>> trigger = ShockTrigger(capture.buffer, threshold=2.5)
+    >>> while True:
+    ...     for shock in trigger.poll():
+    ...         print(shock.timestamp, shock.peak)
+    ...     time.sleep(0.1)
+
+"""
+import math
+import time
+import array
+import threading
+from microstacknode.hardware.accelerometer.mma8452q import (STATUS_ZYXDR,
+                                                           STATUS_ZYXOW,
+                                                           SYSMOD_SLEEP,
+                                                           SYSMOD_WAKE)
+
+
+DEFAULT_CAPACITY = 4096  # samples (about 5 s at 800 Hz)
+# poll this many times per sample period while waiting for a late sample
+NOT_READY_POLLS_PER_PERIOD = 8
+# each sample is scheduled a retry / GRID_LEAD_DIVISOR early, so about one
+# in this many samples is read before it is ready and realigns the grid
+GRID_LEAD_DIVISOR = 8
+AXES = ('x', 'y', 'z')
+# while the accelerometer is asleep check SYSMOD for it waking this often
+SLEEP_POLL_INTERVAL = 0.1  # seconds
+
+
+class SampleRingBuffer(object):
+    """Fixed-size ring buffer of raw signed 12-bit (x, y, z) samples and
+    their `time.monotonic()` timestamps. Nothing is allocated once the
+    buffer has been created (apart from the arrays returned by
+    `read_block()`).
+
+    `overruns` counts samples which were overwritten before they were read.
+    `dropped` counts samples which never made it into the buffer (the
+    writer fell behind the accelerometer).
+
+    :param capacity: Number of samples held.
+    :type capacity: int
+    """
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self.capacity = capacity
+        self.samples = array.array('h', [0] * (3 * capacity))
+        self.timestamps = array.array('d', [0.0] * capacity)
+        self.write_count = 0  # samples ever written
+        self.read_count = 0  # samples ever read
+        self.overruns = 0
+        self.dropped = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        """Returns the number of unread samples."""
+        return self.write_count - self.read_count
+
+    def write(self, x, y, z, timestamp):
+        """Adds a sample, overwriting the oldest if the buffer is full."""
+        with self._lock:
+            i = self.write_count % self.capacity
+            j = 3 * i
+            self.samples[j] = x
+            self.samples[j+1] = y
+            self.samples[j+2] = z
+            self.timestamps[i] = timestamp
+            self.write_count += 1
+            if self.write_count - self.read_count > self.capacity:
+                self.overruns += 1
+                self.read_count = self.write_count - self.capacity
+
+    def read_block(self, max_samples=None):
+        """Returns (and consumes) the unread samples as a tuple of
+        (samples, timestamps): array('h') of interleaved x, y, z and
+        array('d').
+
+        :param max_samples: Maximum number of samples to return.
+        :type max_samples: int
+        """
+        with self._lock:
+            n = self.write_count - self.read_count
+            if max_samples is not None:
+                n = min(n, max_samples)
+            samples, timestamps = self._copy(self.read_count, n)
+            self.read_count += n
+        return samples, timestamps
+
+    def _copy(self, start, n):
+        """Returns copies of n samples from absolute sample index start."""
+        i = start % self.capacity
+        end = i + n
+        if end <= self.capacity:
+            return (self.samples[3*i:3*end], self.timestamps[i:end])
+        else:
+            end -= self.capacity
+            return (self.samples[3*i:] + self.samples[:3*end],
+                    self.timestamps[i:] + self.timestamps[:end])
+
+
+class ShockEvent(object):
+    """The samples around a trigger.
+
+    :param samples: Interleaved signed 12-bit x, y, z counts.
+    :type samples: array.array('h')
+    :param trigger_index: Index (in samples, not counts) of the sample
+                          which triggered.
+    :type trigger_index: int
+    :param timestamp: `time.monotonic()` of the trigger sample.
+    :type timestamp: float
+    :param peak: Largest level (G's) in the samples.
+    :type peak: float
+    """
+
+    def __init__(self, samples, trigger_index, timestamp, peak):
+        self.samples = samples
+        self.trigger_index = trigger_index
+        self.timestamp = timestamp
+        self.peak = peak
+
+    def __repr__(self):
+        return 'ShockEvent(timestamp={}, peak={}, samples={})'.format(
+            self.timestamp, self.peak, len(self.samples) // 3)
+
+
+class ShockTrigger(object):
+    """Finds shocks in a `SampleRingBuffer` and copies out the samples
+    around them. Call `poll()` regularly (at least once per buffer
+    capacity). It only reads the samples written since the last call, in
+    place, and does not consume them, so the buffer can still be read as
+    usual. Nothing is copied unless there is a trigger.
+
+    The level is the magnitude of (x, y, z) or the absolute value of one
+    axis. The trigger fires when the level reaches `threshold` and is
+    armed again when it drops below `threshold - hysteresis`. After firing
+    it ignores the signal for `holdoff` seconds.
+
+    :param buffer: The buffer to watch.
+    :type buffer: SampleRingBuffer
+    :param threshold: Trigger level (G's), remember the magnitude includes
+                      gravity.
+    :type threshold: float
+    :param axis: 'x', 'y', 'z' or None for the magnitude.
+    :type axis: str
+    :param g_range: The range the samples were recorded with.
+    :type g_range: int
+    :param hysteresis: G's below threshold to re-arm.
+    :type hysteresis: float
+    :param holdoff: Seconds after a trigger before the next one.
+    :type holdoff: float
+    :param pre_samples: Samples kept before the trigger.
+    :type pre_samples: int
+    :param post_samples: Samples kept from the trigger on.
+    :type post_samples: int
+    """
+
+    def __init__(self, buffer, threshold, axis=None, g_range=2,
+                 hysteresis=0.1, holdoff=1.0, pre_samples=128,
+                 post_samples=256):
+        if pre_samples + post_samples > buffer.capacity:
+            raise ValueError("The buffer is too small for the window.")
+        self.buffer = buffer
+        self.axis = axis
+        self.holdoff = holdoff
+        self.pre_samples = pre_samples
+        self.post_samples = post_samples
+        self._counts_per_g = (1 << 11) / g_range
+        on = threshold * self._counts_per_g
+        off = max(threshold - hysteresis, 0) * self._counts_per_g
+        if axis is None:
+            # compare squared magnitudes
+            on, off = on * on, off * off
+        self._on = on
+        self._off = off
+        self._armed = True
+        self._holdoff_until = -math.inf
+        self._cursor = buffer.write_count
+        self._pending = []  # trigger sample indices awaiting post samples
+
+    def poll(self):
+        """Scans the new samples and returns a list of the `ShockEvent`s
+        whose post-trigger window is complete.
+        """
+        buffer = self.buffer
+        with buffer._lock:
+            end = buffer.write_count
+        capacity = buffer.capacity
+        samples = buffer.samples
+        timestamps = buffer.timestamps
+        axis = None if self.axis is None else AXES.index(self.axis)
+        on = self._on
+        off = self._off
+        armed = self._armed
+        for n in range(max(self._cursor, end - capacity), end):
+            i = n % capacity
+            j = 3 * i
+            if axis is None:
+                x = samples[j]
+                y = samples[j+1]
+                z = samples[j+2]
+                level = x * x + y * y + z * z
+            else:
+                level = abs(samples[j+axis])
+            if armed:
+                if level >= on and timestamps[i] >= self._holdoff_until:
+                    armed = False
+                    self._pending.append(n)
+                    self._holdoff_until = timestamps[i] + self.holdoff
+            elif level < off:
+                armed = True
+        self._armed = armed
+        self._cursor = end
+        events = []
+        while self._pending and \
+                self._pending[0] + self.post_samples <= end:
+            events.append(self._record(self._pending.pop(0)))
+        return events
+
+    def _record(self, n):
+        buffer = self.buffer
+        with buffer._lock:
+            first = max(n - self.pre_samples,
+                        buffer.write_count - buffer.capacity)
+            samples, timestamps = buffer._copy(
+                first, n + self.post_samples - first)
+            timestamp = buffer.timestamps[n % buffer.capacity]
+        if self.axis is None:
+            peak = math.sqrt(max(
+                samples[i] ** 2 + samples[i+1] ** 2 + samples[i+2] ** 2
+                for i in range(0, len(samples), 3)))
+        else:
+            peak = max(map(abs, samples[AXES.index(self.axis)::3]))
+        return ShockEvent(samples, n - first, timestamp,
+                          peak / self._counts_per_g)
+
+
+class MMA8452QCapture(threading.Thread):
+    """Thread which reads samples from an MMA8452Q as they become ready and
+    writes them into a `SampleRingBuffer`.
+
+    The STATUS register (read in the same transfer as the samples) gates
+    acquisition: a read without ZYXDR set is a repeat of the last sample
+    and is not stored (`not_ready` counts these) and ZYXOW means the chip
+    overwrote a sample before we read it (counted in `buffer.dropped`).
+    Reads are scheduled on a grid of output data rate periods (so the time
+    taken by the reads themselves doesn't delay the next one) which runs
+    slightly fast. A read that comes too early is retried and moves the
+    grid back into step with the chip, so there is about one I2C read per
+    sample.
+
+    If auto-sleep is on (see `MMA8452Q.set_auto_sleep()`) the thread
+    follows the SYSMOD register. It notices the chip falling asleep by a
+    sample period passing without a new sample. While the chip is asleep
+    it reads one sample per sleep rate period (no retries) and checks
+    SYSMOD every `SLEEP_POLL_INTERVAL`, and when it wakes it goes back to
+    the output data rate. `system_mode` is the last SYSMOD value read.
+
+    Call `start()` and `stop()` or use it as a context manager.
+
+    :param accelerometer: An initialised and active MMA8452Q.
+    :type accelerometer: MMA8452Q
+    :param capacity: Number of samples held in the buffer.
+    :type capacity: int
+    :param clock: Converts the buffer's timestamps to UTC (see `to_utc()`).
+    :type clock: gps.clocksync.GPSClock
+    """
+
+    def __init__(self, accelerometer, capacity=DEFAULT_CAPACITY,
+                 clock=None):
+        super().__init__(daemon=True)
+        self.accelerometer = accelerometer
+        self.clock = clock
+        self.buffer = SampleRingBuffer(capacity)
+        self.not_ready = 0
+        self.system_mode = SYSMOD_WAKE
+        self._stop_event = threading.Event()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def stop(self):
+        """Stops the capture thread and waits for it to finish."""
+        self._stop_event.set()
+        if self.is_alive():
+            self.join()
+
+    def to_utc(self, timestamps):
+        """Returns array('d') of the UTC times (seconds since the epoch) of
+        timestamps from the buffer, converted by `clock`. The timestamps
+        stay monotonic in the buffer so capture doesn't depend on the GPS.
+
+        :raises: gps.clocksync.ClockNotSyncedError
+        """
+        if self.clock is None:
+            raise ValueError("MMA8452QCapture has no clock.")
+        to_utc = self.clock.to_utc
+        return array.array('d', [to_utc(t) for t in timestamps])
+
+    def run(self):
+        accelerometer = self.accelerometer
+        buffer = self.buffer
+        xyz = array.array('h', [0, 0, 0])
+        auto_sleep = accelerometer.sleep_rate is not None
+        asleep = False
+        period, retry = self._poll_periods()
+        not_ready = 0
+        next_time = next_mode_check = time.monotonic()
+        while not self._stop_event.is_set():
+            now = time.monotonic()
+            if asleep and now >= next_mode_check:
+                # SYSMOD has its own timer, the sleep rate may be slower
+                next_mode_check = now + SLEEP_POLL_INTERVAL
+                if self._update_system_mode():
+                    asleep = False
+                    period, retry = self._poll_periods()
+                    next_time = now
+            if now >= next_time:
+                status = accelerometer.get_xyz_into(xyz, raw=True)
+                now = time.monotonic()
+                if status & STATUS_ZYXDR:
+                    if status & STATUS_ZYXOW:
+                        buffer.dropped += 1
+                    buffer.write(xyz[0], xyz[1], xyz[2], now)
+                    not_ready = 0
+                    if asleep:
+                        next_time += period
+                    else:
+                        # stay on the sample grid (not `now + period`,
+                        # which would fall behind by the read time every
+                        # sample), slightly early so that the chip's clock
+                        # can't get ahead of it
+                        next_time += period - retry / GRID_LEAD_DIVISOR
+                elif asleep:
+                    # one read per sleep period, the next one will have it
+                    self.not_ready += 1
+                    next_time += period
+                else:
+                    # early, the retries move the grid back to the samples
+                    self.not_ready += 1
+                    next_time += retry
+                    not_ready += 1
+                if auto_sleep and not_ready >= NOT_READY_POLLS_PER_PERIOD:
+                    not_ready = 0
+                    if self._update_system_mode():
+                        asleep = self.system_mode == SYSMOD_SLEEP
+                        period, retry = self._poll_periods()
+                        next_time = now
+                        next_mode_check = now + SLEEP_POLL_INTERVAL
+            wake_time = next_time
+            if asleep:
+                wake_time = min(wake_time, next_mode_check)
+            delay = wake_time - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            elif time.monotonic() - next_time > period:
+                # stalled for more than a sample, start a new grid
+                next_time = time.monotonic()
+
+    def _update_system_mode(self):
+        """Reads SYSMOD into `system_mode`, returns True if it changed."""
+        mode = self.accelerometer.get_system_mode()
+        if mode == self.system_mode:
+            return False
+        self.system_mode = mode
+        return True
+
+    def _poll_periods(self):
+        """Returns the sample period and the retry interval for the
+        current system mode.
+        """
+        rate = self.accelerometer.get_sample_rate(self.system_mode)
+        period = 1 / rate
+        return period, period / NOT_READY_POLLS_PER_PERIOD
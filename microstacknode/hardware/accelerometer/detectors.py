@@ -0,0 +1,544 @@
+"""The MMA8452Q's embedded event detectors: motion/freefall, transient,
+tap (pulse) and orientation (portrait/landscape).
+
+The chip watches the samples itself and latches an event in its source
+register, so the host only has to read INT_SOURCE (or wait for the
+interrupt line) instead of polling the x, y and z values at a high rate:
+
+    >>> with MMA8452Q() as accelerometer:
+    ...     monitor = EventMonitor(accelerometer,
+    ...                            [TransientDetector(threshold=0.5),
+    ...                             TapDetector(threshold=1.5)])
+    ...     monitor.configure()
+    ...     for event in monitor:
+    ...         print(event)
+
+Set the output data rate before configuring the detectors, their timings
+are converted to counts of the sample period.
+"""
+import abc
+import time
+import select
+from microstacknode.hardware.accelerometer.mma8452q import (
+    INT_SOURCE, CTRL_REG3, CTRL_REG4, CTRL_REG5,
+    CTRL_REG3_IPOL, CTRL_REG3_PP_OD,
+    INT_TRANS, INT_LNDPRT, INT_PULSE, INT_FF_MT,
+    FF_MT_CFG, FF_MT_SRC, FF_MT_THS, FF_MT_COUNT,
+    TRANSIENT_CFG, TRANSIENT_SRC, TRANSIENT_THS, TRANSIENT_COUNT,
+    PULSE_CFG, PULSE_SRC, PULSE_THSX, PULSE_THSY, PULSE_THSZ,
+    PULSE_TMLT, PULSE_LTCY, PULSE_WIND,
+    PL_STATUS, PL_CFG, PL_COUNT)
+
+
+G_PER_THRESHOLD_COUNT = 0.063  # FF_MT_THS, TRANSIENT_THS and PULSE_THS*
+DEFAULT_POLL_INTERVAL = 0.05  # seconds between INT_SOURCE reads
+AXES = ('x', 'y', 'z')
+
+# FF_MT_CFG
+# +-----+-----+------+------+------+---+---+---+
+# | ELE | OAE | ZEFE | YEFE | XEFE | 0 | 0 | 0 |
+# +-----+-----+------+------+------+---+---+---+
+# OAE: 1 = motion (any axis above threshold), 0 = freefall (all below)
+FF_MT_CFG_ELE = 0x80
+FF_MT_CFG_OAE = 0x40
+FF_MT_CFG_EFE = {'x': 0x08, 'y': 0x10, 'z': 0x20}
+# FF_MT_SRC
+# +----+---+-----+-----+-----+-----+-----+-----+
+# | EA | 0 | ZHE | ZHP | YHE | YHP | XHE | XHP |
+# +----+---+-----+-----+-----+-----+-----+-----+
+# HE: event on the axis, HP: 1 = negative (TRANSIENT_SRC is the same)
+FF_MT_SRC_EA = 0x80
+SRC_AXIS_EVENT = {'x': 0x02, 'y': 0x08, 'z': 0x20}
+SRC_AXIS_POLARITY = {'x': 0x01, 'y': 0x04, 'z': 0x10}
+
+# TRANSIENT_CFG
+# +---+---+---+-----+--------+--------+--------+---------+
+# | 0 | 0 | 0 | ELE | ZTEFE  | YTEFE  | XTEFE  | HPF_BYP |
+# +---+---+---+-----+--------+--------+--------+---------+
+TRANSIENT_CFG_ELE = 0x10
+TRANSIENT_CFG_HPF_BYP = 0x01
+TRANSIENT_CFG_TEFE = {'x': 0x02, 'y': 0x04, 'z': 0x08}
+# TRANSIENT_SRC
+# +---+----+---------+----------+---------+----------+---------+----------+
+# | 0 | EA | ZTRANSE | Z_POL    | YTRANSE | Y_POL    | XTRANSE | X_POL    |
+# +---+----+---------+----------+---------+----------+---------+----------+
+TRANSIENT_SRC_EA = 0x40
+
+# PULSE_CFG
+# +-----+-----+--------+--------+--------+--------+--------+--------+
+# | DPA | ELE | ZDPEFE | ZSPEFE | YDPEFE | YSPEFE | XDPEFE | XSPEFE |
+# +-----+-----+--------+--------+--------+--------+--------+--------+
+PULSE_CFG_ELE = 0x40
+PULSE_CFG_SPEFE = {'x': 0x01, 'y': 0x04, 'z': 0x10}
+PULSE_CFG_DPEFE = {'x': 0x02, 'y': 0x08, 'z': 0x20}
+# PULSE_SRC
+# +----+-----+-----+-----+-----+------+------+------+
+# | EA | AxZ | AxY | AxX | DPE | PolZ | PolY | PolX |
+# +----+-----+-----+-----+-----+------+------+------+
+PULSE_SRC_EA = 0x80
+PULSE_SRC_DPE = 0x08
+PULSE_SRC_AX = {'x': 0x10, 'y': 0x20, 'z': 0x40}
+PULSE_SRC_POL = {'x': 0x01, 'y': 0x02, 'z': 0x04}
+
+# PL_CFG
+# +--------+-------+---+---+---+---+---+---+
+# | DBCNTM | PL_EN | 0 | 0 | 0 | 0 | 0 | 0 |
+# +--------+-------+---+---+---+---+---+---+
+PL_CFG_DBCNTM = 0x80
+PL_CFG_PL_EN = 0x40
+# PL_STATUS
+# +-------+----+---+---+---+-------+-------+-------+
+# | NEWLP | LO | 0 | 0 | 0 | LAPO1 | LAPO0 | BAFRO |
+# +-------+----+---+---+---+-------+-------+-------+
+PL_STATUS_NEWLP = 0x80
+PL_STATUS_LO = 0x40
+PL_STATUS_BAFRO = 0x01
+ORIENTATIONS = ('portrait up', 'portrait down',
+                'landscape right', 'landscape left')
+
+
+class AccelerometerEvent(object):
+    """An event decoded from one of the detectors' source registers.
+
+    `axes` maps each axis which triggered the event to its direction
+    (+1 or -1).
+    """
+
+    kind = None
+
+    def __init__(self, source, timestamp, axes=None):
+        self.source = source  # raw source register value
+        self.timestamp = timestamp  # time.monotonic()
+        self.axes = axes if axes is not None else {}
+
+    def __repr__(self):
+        return '{}(axes={}, timestamp={})'.format(
+            type(self).__name__, self.axes, self.timestamp)
+
+
+class MotionEvent(AccelerometerEvent):
+    kind = 'motion'
+
+
+class FreefallEvent(AccelerometerEvent):
+    kind = 'freefall'
+
+
+class TransientEvent(AccelerometerEvent):
+    kind = 'transient'
+
+
+class TapEvent(AccelerometerEvent):
+    kind = 'tap'
+
+    def __init__(self, source, timestamp, axes=None, double=False):
+        super().__init__(source, timestamp, axes)
+        self.double = double
+
+    def __repr__(self):
+        return 'TapEvent(axes={}, double={}, timestamp={})'.format(
+            self.axes, self.double, self.timestamp)
+
+
+class OrientationEvent(AccelerometerEvent):
+    kind = 'orientation'
+
+    def __init__(self, source, timestamp, orientation, back, lockout):
+        super().__init__(source, timestamp)
+        self.orientation = orientation  # one of ORIENTATIONS
+        self.back = back  # facing down
+        self.lockout = lockout  # tilted too far to tell
+
+    def __repr__(self):
+        return ('OrientationEvent(orientation={!r}, back={}, lockout={}, '
+                'timestamp={})').format(self.orientation, self.back,
+                                        self.lockout, self.timestamp)
+
+
+class Detector(abc.ABC):
+    """Base class of the detector configurations. `registers()` returns
+    the values to write and `decode()` turns the source register into an
+    event. Subclasses must implement both.
+    """
+
+    interrupt = None  # bit in CTRL_REG4/INT_SOURCE
+    source_register = None
+
+    @abc.abstractmethod
+    def registers(self, output_data_rate):
+        """Returns a dictionary of register address: value."""
+
+    @abc.abstractmethod
+    def decode(self, source, timestamp):
+        """Returns the event for a source register value or None."""
+
+
+class MotionDetector(Detector):
+    """Motion: the acceleration on any of `axes` is above `threshold`.
+    Unlike `TransientDetector` this includes gravity.
+
+    :param threshold: Threshold in G's (0 to 8, 0.063 G steps).
+    :type threshold: float
+    :param axes: Axes to watch.
+    :type axes: str
+    :param duration: How long the condition must last (seconds).
+    :type duration: float
+    """
+
+    interrupt = INT_FF_MT
+    source_register = FF_MT_SRC
+    freefall = False
+
+    def __init__(self, threshold=1.5, axes='xyz', duration=0):
+        self.threshold = threshold
+        self.axes = axes
+        self.duration = duration
+
+    def registers(self, output_data_rate):
+        cfg = FF_MT_CFG_ELE
+        if not self.freefall:
+            cfg |= FF_MT_CFG_OAE
+        for axis in self.axes:
+            cfg |= FF_MT_CFG_EFE[axis]
+        return {FF_MT_CFG: cfg,
+                FF_MT_THS: _threshold_counts(self.threshold),
+                FF_MT_COUNT: _period_counts(self.duration,
+                                            output_data_rate)}
+
+    def decode(self, source, timestamp):
+        if not source & FF_MT_SRC_EA:
+            return None
+        axes = _decode_axes(source, SRC_AXIS_EVENT, SRC_AXIS_POLARITY)
+        event_type = FreefallEvent if self.freefall else MotionEvent
+        return event_type(source, timestamp, axes)
+
+
+class FreefallDetector(MotionDetector):
+    """Freefall: the acceleration on all of `axes` is below `threshold`.
+    Freefall and motion share the same detector on the chip, so only one
+    of them can be used at a time.
+    """
+
+    freefall = True
+
+    def __init__(self, threshold=0.3, axes='xyz', duration=0.03):
+        super().__init__(threshold, axes, duration)
+
+
+class TransientDetector(Detector):
+    """Transient: the high-pass filtered acceleration (so gravity is
+    removed) on any of `axes` is above `threshold`. Good for detecting
+    shocks and "wake on motion".
+
+    :param threshold: Threshold in G's (0 to 8, 0.063 G steps).
+    :type threshold: float
+    :param axes: Axes to watch.
+    :type axes: str
+    :param duration: How long the condition must last (seconds).
+    :type duration: float
+    :param high_pass: Use the high-pass filter (see HP_FILTER_CUTOFF).
+    :type high_pass: boolean
+    """
+
+    interrupt = INT_TRANS
+    source_register = TRANSIENT_SRC
+
+    def __init__(self, threshold=0.5, axes='xyz', duration=0,
+                 high_pass=True):
+        self.threshold = threshold
+        self.axes = axes
+        self.duration = duration
+        self.high_pass = high_pass
+
+    def registers(self, output_data_rate):
+        cfg = TRANSIENT_CFG_ELE
+        if not self.high_pass:
+            cfg |= TRANSIENT_CFG_HPF_BYP
+        for axis in self.axes:
+            cfg |= TRANSIENT_CFG_TEFE[axis]
+        return {TRANSIENT_CFG: cfg,
+                TRANSIENT_THS: _threshold_counts(self.threshold),
+                TRANSIENT_COUNT: _period_counts(self.duration,
+                                                output_data_rate)}
+
+    def decode(self, source, timestamp):
+        if not source & TRANSIENT_SRC_EA:
+            return None
+        axes = _decode_axes(source, SRC_AXIS_EVENT, SRC_AXIS_POLARITY)
+        return TransientEvent(source, timestamp, axes)
+
+
+class TapDetector(Detector):
+    """Single and/or double taps on any of `axes`.
+
+    The timings assume normal oversampling mode, where the time step of
+    PULSE_TMLT is half the sample period and the steps of PULSE_LTCY and
+    PULSE_WIND are the sample period.
+
+    :param threshold: Threshold in G's (0 to 8), one value or (x, y, z).
+    :type threshold: float or tuple
+    :param axes: Axes to watch.
+    :type axes: str
+    :param single: Detect single taps.
+    :type single: boolean
+    :param double: Detect double taps.
+    :type double: boolean
+    :param time_limit: Longest a tap may last (seconds).
+    :type time_limit: float
+    :param latency: Time after a tap during which taps are ignored.
+    :type latency: float
+    :param window: Time after the latency for the second tap of a double
+                   tap.
+    :type window: float
+    """
+
+    interrupt = INT_PULSE
+    source_register = PULSE_SRC
+
+    def __init__(self, threshold=2.0, axes='xyz', single=True, double=False,
+                 time_limit=0.05, latency=0.1, window=0.3):
+        self.threshold = threshold
+        self.axes = axes
+        self.single = single
+        self.double = double
+        self.time_limit = time_limit
+        self.latency = latency
+        self.window = window
+
+    def registers(self, output_data_rate):
+        cfg = PULSE_CFG_ELE
+        for axis in self.axes:
+            if self.single:
+                cfg |= PULSE_CFG_SPEFE[axis]
+            if self.double:
+                cfg |= PULSE_CFG_DPEFE[axis]
+        try:
+            thresholds = tuple(self.threshold)
+        except TypeError:
+            thresholds = (self.threshold,) * 3
+        return {PULSE_CFG: cfg,
+                PULSE_THSX: _threshold_counts(thresholds[0]),
+                PULSE_THSY: _threshold_counts(thresholds[1]),
+                PULSE_THSZ: _threshold_counts(thresholds[2]),
+                PULSE_TMLT: _period_counts(self.time_limit,
+                                           2 * output_data_rate),
+                PULSE_LTCY: _period_counts(self.latency, output_data_rate),
+                PULSE_WIND: _period_counts(self.window, output_data_rate)}
+
+    def decode(self, source, timestamp):
+        if not source & PULSE_SRC_EA:
+            return None
+        axes = _decode_axes(source, PULSE_SRC_AX, PULSE_SRC_POL)
+        return TapEvent(source, timestamp, axes,
+                        double=bool(source & PULSE_SRC_DPE))
+
+
+class OrientationDetector(Detector):
+    """Portrait/landscape and front/back orientation changes.
+
+    :param duration: How long a new orientation must last (seconds).
+    :type duration: float
+    """
+
+    interrupt = INT_LNDPRT
+    source_register = PL_STATUS
+
+    def __init__(self, duration=0.1):
+        self.duration = duration
+
+    def registers(self, output_data_rate):
+        return {PL_CFG: PL_CFG_DBCNTM | PL_CFG_PL_EN,
+                PL_COUNT: _period_counts(self.duration, output_data_rate)}
+
+    def decode(self, source, timestamp):
+        if not source & PL_STATUS_NEWLP:
+            return None
+        return OrientationEvent(source,
+                                timestamp,
+                                ORIENTATIONS[(source >> 1) & 0x03],
+                                back=bool(source & PL_STATUS_BAFRO),
+                                lockout=bool(source & PL_STATUS_LO))
+
+
+class EventMonitor(object):
+    """Configures detectors on an MMA8452Q and reports their events.
+
+    Without `interrupt` INT_SOURCE is read every `poll_interval` seconds
+    (one single byte register read). With `interrupt` the monitor sleeps
+    until the interrupt line fires. Any object with a
+    `wait(timeout) -> bool` method will do, see `GPIOInterrupt`.
+
+    :param accelerometer: An initialised MMA8452Q.
+    :type accelerometer: MMA8452Q
+    :param detectors: The detectors to enable.
+    :type detectors: list
+    :param interrupt: Waits for the accelerometer's interrupt line.
+    :type interrupt: GPIOInterrupt
+    :param int_pin: Route the interrupts to INT1 (1) or INT2 (2).
+    :type int_pin: int
+    :param poll_interval: Seconds between INT_SOURCE reads (or between
+                          checks without an interrupt edge).
+    :type poll_interval: float
+    :param active_high: Interrupt outputs are active high (CTRL_REG3).
+    :type active_high: boolean
+    :param open_drain: Interrupt outputs are open drain (CTRL_REG3).
+    :type open_drain: boolean
+    """
+
+    def __init__(self, accelerometer, detectors, interrupt=None, int_pin=1,
+                 poll_interval=DEFAULT_POLL_INTERVAL, active_high=False,
+                 open_drain=False):
+        self.accelerometer = accelerometer
+        self.detectors = list(detectors)
+        self.interrupt = interrupt
+        self.int_pin = int_pin
+        self.poll_interval = poll_interval
+        self.active_high = active_high
+        self.open_drain = open_drain
+        self.interrupt_mask = 0
+        for detector in self.detectors:
+            self.interrupt_mask |= detector.interrupt
+
+    def configure(self):
+        """Writes the detector configuration and enables their interrupts
+        (one configuration session, see `MMA8452Q.configure()`).
+        """
+        accelerometer = self.accelerometer
+        output_data_rate = accelerometer.output_data_rate or 800
+        ctrl_reg3 = 0
+        if self.active_high:
+            ctrl_reg3 |= CTRL_REG3_IPOL
+        if self.open_drain:
+            ctrl_reg3 |= CTRL_REG3_PP_OD
+        mask = INT_TRANS | INT_LNDPRT | INT_PULSE | INT_FF_MT
+        with accelerometer.configure():
+            for detector in self.detectors:
+                for register, value in sorted(
+                        detector.registers(output_data_rate).items()):
+                    accelerometer.write_register(register, value)
+            accelerometer.update_register(
+                CTRL_REG3, CTRL_REG3_IPOL | CTRL_REG3_PP_OD, ctrl_reg3)
+            accelerometer.update_register(CTRL_REG4, mask,
+                                          self.interrupt_mask)
+            accelerometer.update_register(
+                CTRL_REG5, mask, self.interrupt_mask if self.int_pin == 1
+                else 0)
+
+    def disable(self):
+        """Disables the detectors' interrupts."""
+        with self.accelerometer.configure():
+            self.accelerometer.update_register(CTRL_REG4,
+                                               self.interrupt_mask, 0)
+
+    def read_events(self):
+        """Returns the pending events (reading a source register clears
+        its event). Does not wait.
+        """
+        accelerometer = self.accelerometer
+        pending = accelerometer.read_register(INT_SOURCE) & \
+            self.interrupt_mask
+        events = []
+        if pending:
+            now = time.monotonic()
+            for detector in self.detectors:
+                if pending & detector.interrupt:
+                    event = detector.decode(
+                        accelerometer.read_register(detector.source_register),
+                        now)
+                    if event is not None:
+                        events.append(event)
+        return events
+
+    def wait(self, timeout=None):
+        """Waits for events and returns them, or an empty list after
+        `timeout` seconds.
+        """
+        if timeout is not None:
+            end = time.monotonic() + timeout
+        while True:
+            # check first so an edge we missed doesn't block forever
+            events = self.read_events()
+            if events:
+                return events
+            delay = self.poll_interval
+            if timeout is not None:
+                remaining = end - time.monotonic()
+                if remaining <= 0:
+                    return events
+                delay = min(delay, remaining)
+            if self.interrupt is not None:
+                self.interrupt.wait(None if timeout is None else delay)
+            else:
+                time.sleep(delay)
+
+    def __iter__(self):
+        while True:
+            for event in self.wait():
+                yield event
+
+
+class GPIOInterrupt(object):
+    """Waits for edges on a GPIO pin (Linux sysfs GPIO number) connected
+    to one of the accelerometer's interrupt outputs. The interrupts are
+    active low by default, so wait for falling edges.
+
+    :param pin_num: GPIO number.
+    :type pin_num: int
+    :param edge: 'falling', 'rising' or 'both'.
+    :type edge: str
+    """
+
+    def __init__(self, pin_num, edge='falling'):
+        self.pin_num = pin_num
+        self.edge = edge
+        self.pin = None
+        self._poll = None
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def open(self):
+        from microstackcommon.gpio import Pin, IN
+        self.pin = Pin(self.pin_num, direction=IN, interrupt=self.edge)
+        self.pin.open()
+        self._poll = select.poll()
+        self._poll.register(self.pin.fileno(),
+                            select.POLLPRI | select.POLLERR)
+        self.pin.get()  # clear any edge from before we started
+
+    def close(self):
+        if self.pin is not None:
+            self.pin.close()
+            self.pin = None
+
+    def wait(self, timeout=None):
+        """Waits for an edge. Returns False on timeout.
+
+        :param timeout: Seconds to wait (None waits forever).
+        :type timeout: float
+        """
+        timeout_ms = None if timeout is None else int(timeout * 1000)
+        if self._poll.poll(timeout_ms):
+            self.pin.get()
+            return True
+        return False
+
+
+def _threshold_counts(threshold):
+    """Returns a threshold in G's as 7-bit register counts."""
+    return min(max(int(round(threshold / G_PER_THRESHOLD_COUNT)), 0), 127)
+
+
+def _period_counts(seconds, rate):
+    """Returns a duration as 8-bit register counts of 1/rate."""
+    return min(max(int(round(seconds * rate)), 0), 255)
+
+
+def _decode_axes(source, event_bits, polarity_bits):
+    """Returns {axis: +1 or -1} for the axes with their event bit set."""
+    return {axis: -1 if source & polarity_bits[axis] else 1
+            for axis in AXES if source & event_bits[axis]}
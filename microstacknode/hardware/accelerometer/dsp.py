@@ -0,0 +1,494 @@
+"""Block-oriented signal processing for accelerometer samples, for example
+vibration monitoring:
+
+    >>> pipeline = Pipeline(filters=[HighPassFilter(5, 800)],
+    ...                     analysers=[WindowedStats(800),
+    ...                                BandEnergies(800, [(10, 100),
+    ...                                                   (100, 400)])])
+    >>> with MMA8452Q() as accelerometer, \\
+    ...         MMA8452QCapture(accelerometer) as capture:
+    ...     while True:
+    ...         time.sleep(0.5)
+    ...         stats, spectra = pipeline.run(capture.buffer)
+
+Each stage keeps its state (filter memory, partial windows) between
+blocks, so a signal can be processed in blocks of any size without gaps.
+Inside a pipeline a block is a list of channels (x, y, z) each holding
+that channel's samples in G's: NumPy arrays if NumPy is installed,
+otherwise array('d').
+
+The IIR filters use `scipy.signal.lfilter` if SciPy is installed,
+otherwise with NumPy they run in chunks of `BIQUAD_CHUNK` samples (see
+`BiquadFilter`) and without it sample by sample. The statistics and
+spectra are computed over whole blocks with NumPy if it is installed.
+"""
+import math
+import cmath
+import array
+from microstacknode._optional import import_numpy, import_scipy_signal
+from microstacknode.hardware.accelerometer.mma8452q import g_per_count
+
+
+# samples per chunk of the NumPy biquad (the cost per sample grows with it)
+BIQUAD_CHUNK = 64
+
+
+class BiquadFilter(object):
+    """A second-order IIR filter (transposed direct form II) with its own
+    state for each channel.
+
+    Without SciPy the NumPy version treats the filter as a state-space
+    system, s[n+1] = A s[n] + B x[n] and y[n] = s1[n] + b0 x[n], and
+    filters chunks of `BIQUAD_CHUNK` samples at a time: each chunk's
+    output is the convolution of its input with the impulse response plus
+    the response to the state at its start (A^k), and the state at its
+    end is computed in one product too.
+
+    :param b: Numerator coefficients (b0, b1, b2).
+    :type b: tuple
+    :param a: Denominator coefficients (a0, a1, a2).
+    :type a: tuple
+    :param channels: Number of channels.
+    :type channels: int
+    """
+
+    def __init__(self, b, a, channels=3):
+        a0 = a[0]
+        self.b = tuple(v / a0 for v in b)
+        self.a = tuple(v / a0 for v in a)
+        self.channels = channels
+        self._chunk_matrices = None
+        self.reset()
+
+    def reset(self):
+        """Clears the filter memory."""
+        self._state = [(0.0, 0.0)] * self.channels
+
+    def process(self, block):
+        """Returns the filtered block."""
+        numpy = import_numpy()
+        if numpy is None:
+            return [self._process_list(i, x) for i, x in enumerate(block)]
+        signal = import_scipy_signal()
+        filtered = []
+        for i, x in enumerate(block):
+            x = numpy.asarray(x, dtype=float)
+            if signal is not None:
+                y, state = signal.lfilter(self.b, self.a, x,
+                                          zi=numpy.array(self._state[i]))
+                self._state[i] = tuple(state.tolist())
+            else:
+                y = self._process_chunks(i, x)
+            filtered.append(y)
+        return filtered
+
+    def _process_list(self, i, x):
+        b0, b1, b2 = self.b
+        _, a1, a2 = self.a
+        z1, z2 = self._state[i]
+        y = _tolist(x)
+        for n, v in enumerate(y):
+            r = b0 * v + z1
+            z1 = b1 * v - a1 * r + z2
+            z2 = b2 * v - a2 * r
+            y[n] = r
+        self._state[i] = (z1, z2)
+        return _channel(y)
+
+    def _process_chunks(self, i, x):
+        numpy = import_numpy()
+        if self._chunk_matrices is None:
+            self._chunk_matrices = self._build_chunk_matrices()
+        powers, impulse, state_impulse = self._chunk_matrices
+        state = numpy.array(self._state[i])
+        y = numpy.empty_like(x)
+        for start in range(0, len(x), BIQUAD_CHUNK):
+            chunk = x[start:start + BIQUAD_CHUNK]
+            n = len(chunk)
+            y[start:start + n] = (numpy.convolve(chunk, impulse[:n])[:n] +
+                                  powers[:n, 0, :].dot(state))
+            state = (powers[n].dot(state) +
+                     state_impulse[n - 1::-1].T.dot(chunk))
+        self._state[i] = tuple(state.tolist())
+        return y
+
+    def _build_chunk_matrices(self):
+        """Returns (A^k for k up to BIQUAD_CHUNK, the impulse response and
+        A^k B) for `_process_chunks()`.
+        """
+        numpy = import_numpy()
+        b0, b1, b2 = self.b
+        _, a1, a2 = self.a
+        a = numpy.array([[-a1, 1.0], [-a2, 0.0]])
+        b = numpy.array([b1 - a1 * b0, b2 - a2 * b0])
+        powers = numpy.empty((BIQUAD_CHUNK + 1, 2, 2))
+        powers[0] = numpy.eye(2)
+        for k in range(BIQUAD_CHUNK):
+            powers[k + 1] = a.dot(powers[k])
+        state_impulse = powers[:BIQUAD_CHUNK].dot(b)
+        impulse = numpy.concatenate(([b0], state_impulse[:-1, 0]))
+        return powers, impulse, state_impulse
+
+
+class LowPassFilter(BiquadFilter):
+    """Second-order Butterworth low-pass filter.
+
+    :param cutoff: Cutoff frequency (Hz).
+    :type cutoff: float
+    :param sample_rate: Sample rate (Hz).
+    :type sample_rate: float
+    """
+
+    def __init__(self, cutoff, sample_rate, channels=3, q=1 / math.sqrt(2)):
+        cos_w0, alpha = _biquad_params(cutoff, sample_rate, q)
+        super().__init__(((1 - cos_w0) / 2, 1 - cos_w0, (1 - cos_w0) / 2),
+                         (1 + alpha, -2 * cos_w0, 1 - alpha),
+                         channels)
+
+
+class HighPassFilter(BiquadFilter):
+    """Second-order Butterworth high-pass filter (removes gravity and
+    offsets).
+
+    :param cutoff: Cutoff frequency (Hz).
+    :type cutoff: float
+    :param sample_rate: Sample rate (Hz).
+    :type sample_rate: float
+    """
+
+    def __init__(self, cutoff, sample_rate, channels=3, q=1 / math.sqrt(2)):
+        cos_w0, alpha = _biquad_params(cutoff, sample_rate, q)
+        super().__init__(((1 + cos_w0) / 2, -(1 + cos_w0), (1 + cos_w0) / 2),
+                         (1 + alpha, -2 * cos_w0, 1 - alpha),
+                         channels)
+
+
+class WindowedStats(object):
+    """RMS and peak (largest absolute value) of each channel over
+    consecutive windows of `window` samples.
+
+    `process()` returns a list with a (rms, peak) pair for each window
+    completed by the block, where rms and peak are tuples with a value for
+    each channel.
+
+    :param window: Window length in samples.
+    :type window: int
+    """
+
+    def __init__(self, window, channels=3):
+        self.window = window
+        self.channels = channels
+        self._pending = _Pending(channels)
+
+    def process(self, block):
+        window = self.window
+        data = self._pending.extend(block)
+        n_windows = len(data[0]) // window
+        self._pending.keep(data, n_windows * window)
+        if n_windows == 0:
+            return []
+        numpy = import_numpy()
+        if numpy is not None:
+            frames = numpy.stack([channel[:n_windows * window]
+                                  for channel in data])
+            frames = frames.reshape(len(data), n_windows, window)
+            rms = numpy.sqrt(numpy.mean(frames * frames, axis=2))
+            peak = numpy.max(numpy.abs(frames), axis=2)
+            return [(tuple(rms[:, w].tolist()), tuple(peak[:, w].tolist()))
+                    for w in range(n_windows)]
+        results = []
+        for start in range(0, n_windows * window, window):
+            rms = []
+            peak = []
+            for channel in data:
+                frame = channel[start:start + window]
+                rms.append(math.sqrt(sum(v * v for v in frame) / window))
+                peak.append(max(map(abs, frame)))
+            results.append((tuple(rms), tuple(peak)))
+        return results
+
+
+class BandEnergies(object):
+    """Energy in frequency bands from overlapping Hann windowed FFTs.
+
+    `process()` returns a list with an entry for each frame completed by
+    the block. Each entry is a list (one per channel) of the mean square
+    acceleration (G^2) in each band.
+
+    :param sample_rate: Sample rate (Hz).
+    :type sample_rate: float
+    :param bands: Frequency bands as (low, high) in Hz, high exclusive.
+    :type bands: list
+    :param window: FFT length in samples (a power of two).
+    :type window: int
+    :param overlap: Fraction of each window shared with the next.
+    :type overlap: float
+    """
+
+    def __init__(self, sample_rate, bands, window=256, overlap=0.5,
+                 channels=3):
+        if window & (window - 1):
+            raise ValueError("The window must be a power of two.")
+        self.sample_rate = sample_rate
+        self.bands = list(bands)
+        self.window = window
+        self.hop = max(int(window * (1 - overlap)), 1)
+        self.channels = channels
+        self._hann = [0.5 - 0.5 * math.cos(2 * math.pi * n / window)
+                      for n in range(window)]
+        # one-sided spectrum to mean square
+        self._scale = 2 / (window * sum(w * w for w in self._hann))
+        bin_width = sample_rate / window
+        self._bins = [(int(math.ceil(low / bin_width)),
+                       min(int(math.ceil(high / bin_width)), window // 2 + 1))
+                      for low, high in self.bands]
+        self._pending = _Pending(channels)
+
+    def process(self, block):
+        window = self.window
+        data = self._pending.extend(block)
+        n_frames = max((len(data[0]) - window) // self.hop + 1, 0)
+        self._pending.keep(data, n_frames * self.hop)
+        if n_frames == 0:
+            return []
+        numpy = import_numpy()
+        if numpy is not None:
+            index = (numpy.arange(n_frames)[:, None] * self.hop +
+                     numpy.arange(window))
+            hann = numpy.array(self._hann)
+            results = [[] for _ in range(n_frames)]
+            for channel in data:
+                frames = numpy.asarray(channel)[index] * hann
+                power = numpy.abs(numpy.fft.rfft(frames, axis=1)) ** 2
+                energies = numpy.stack([power[:, low:high].sum(axis=1)
+                                        for low, high in self._bins],
+                                       axis=1) * self._scale
+                for f in range(n_frames):
+                    results[f].append(energies[f].tolist())
+            return results
+        results = []
+        for start in range(0, n_frames * self.hop, self.hop):
+            frame_energies = []
+            for channel in data:
+                spectrum = _fft([complex(v * w) for v, w in
+                                 zip(channel[start:start + window],
+                                     self._hann)])
+                power = [abs(v) ** 2 for v in spectrum[:window // 2 + 1]]
+                frame_energies.append([sum(power[low:high]) * self._scale
+                                       for low, high in self._bins])
+            results.append(frame_energies)
+        return results
+
+
+class Decimator(object):
+    """Reduces the sample rate by `factor` with a linear phase FIR
+    anti-aliasing filter (a Hamming windowed sinc). Only every `factor`th
+    output is computed (polyphase), so the cost is per output sample.
+
+    For example 800 Hz to 10 Hz tilt data:
+
+        >>> pipeline = Pipeline(filters=[Decimator(80)],
+        ...                     analysers=[TiltAngles()])
+
+    :param factor: Decimation factor.
+    :type factor: int
+    :param taps_per_phase: Filter length is factor * taps_per_phase + 1.
+    :type taps_per_phase: int
+    :param cutoff: Cutoff as a fraction of the output Nyquist frequency.
+    :type cutoff: float
+    """
+
+    def __init__(self, factor, taps_per_phase=8, cutoff=0.8, channels=3):
+        self.factor = factor
+        self.channels = channels
+        n_taps = factor * taps_per_phase + 1
+        fc = cutoff / (2 * factor)  # cycles per input sample
+        middle = (n_taps - 1) / 2
+        taps = []
+        for k in range(n_taps):
+            t = k - middle
+            sinc = 2 * fc if t == 0 else \
+                math.sin(2 * math.pi * fc * t) / (math.pi * t)
+            window = 0.54 - 0.46 * math.cos(2 * math.pi * k / (n_taps - 1))
+            taps.append(sinc * window)
+        total = sum(taps)
+        # reversed so outputs are dot products with the input in order
+        self.taps = [tap / total for tap in reversed(taps)]
+        self.reset()
+
+    def reset(self):
+        """Clears the filter memory."""
+        self._history = [[0.0] * (len(self.taps) - 1)] * self.channels
+        self._count = 0
+
+    def process(self, block):
+        """Returns the decimated block."""
+        n = len(block[0])
+        n_taps = len(self.taps)
+        # index (in the block) of the first sample which has an output
+        first = -self._count % self.factor
+        self._count += n
+        numpy = import_numpy()
+        decimated = []
+        for i, channel in enumerate(block):
+            if numpy is not None:
+                data = numpy.concatenate((self._history[i],
+                                          numpy.asarray(channel)))
+                ends = numpy.arange(first, n, self.factor) + n_taps
+                index = ends[:, None] + numpy.arange(-n_taps, 0)
+                decimated.append(data[index].dot(self.taps))
+            else:
+                data = list(self._history[i]) + list(channel)
+                taps = self.taps
+                decimated.append(array.array('d', (
+                    sum(map(float.__mul__, taps,
+                            data[end - n_taps:end]))
+                    for end in range(first + n_taps, n + n_taps,
+                                     self.factor))))
+            self._history[i] = data[len(data) - (n_taps - 1):]
+        return decimated
+
+
+class TiltAngles(object):
+    """Analyser giving the `tilt_angles()` of each sample."""
+
+    def process(self, block):
+        return tilt_angles(block)
+
+
+def tilt_angles(block):
+    """Returns (pitch, roll, tilt) in degrees for each sample of a block
+    (x, y, z channels) measured when the accelerometer is still:
+
+    - pitch: angle of the x axis above the horizontal.
+    - roll: angle of the y axis above the horizontal.
+    - tilt: angle between the z axis and the vertical.
+    """
+    x, y, z = block[:3]
+    numpy = import_numpy()
+    if numpy is not None:
+        x = numpy.asarray(x)
+        y = numpy.asarray(y)
+        z = numpy.asarray(z)
+        return (numpy.degrees(numpy.arctan2(x, numpy.hypot(y, z))),
+                numpy.degrees(numpy.arctan2(y, numpy.hypot(x, z))),
+                numpy.degrees(numpy.arctan2(numpy.hypot(x, y), z)))
+    atan2 = math.atan2
+    hypot = math.hypot
+    degrees = math.degrees
+    return (array.array('d', (degrees(atan2(a, hypot(b, c)))
+                              for a, b, c in zip(x, y, z))),
+            array.array('d', (degrees(atan2(b, hypot(a, c)))
+                              for a, b, c in zip(x, y, z))),
+            array.array('d', (degrees(atan2(hypot(a, b), c))
+                              for a, b, c in zip(x, y, z))))
+
+
+class Pipeline(object):
+    """Converts blocks of raw samples to G's, runs them through `filters`
+    (in order) and then gives the filtered block to each of `analysers`.
+
+    :param g_range: The range the samples were recorded with.
+    :type g_range: int
+    :param filters: Stages with `process(block) -> block`.
+    :type filters: list
+    :param analysers: Stages with `process(block) -> results`.
+    :type analysers: list
+    """
+
+    def __init__(self, g_range=2, filters=(), analysers=()):
+        self.g_range = g_range
+        self.filters = list(filters)
+        self.analysers = list(analysers)
+
+    def process(self, samples):
+        """Processes interleaved signed 12-bit x, y, z counts (for example
+        from `capture.SampleRingBuffer.read_block()`) and returns a list of
+        the results of each analyser.
+        """
+        block = deinterleave(samples, 3, g_per_count(self.g_range))
+        for stage in self.filters:
+            block = stage.process(block)
+        return [stage.process(block) for stage in self.analysers]
+
+    def run(self, buffer, max_samples=None):
+        """Processes the unread samples in a `capture.SampleRingBuffer`."""
+        samples, timestamps = buffer.read_block(max_samples)
+        return self.process(samples)
+
+
+def deinterleave(samples, channels=3, scale=1.0):
+    """Splits interleaved samples into a list of channels, multiplying
+    them by scale.
+    """
+    numpy = import_numpy()
+    if numpy is not None:
+        data = numpy.asarray(samples, dtype=numpy.float64) * scale
+        data = data.reshape(-1, channels)
+        return [data[:, i].copy() for i in range(channels)]
+    return [array.array('d', (v * scale for v in samples[i::channels]))
+            for i in range(channels)]
+
+
+class _Pending(object):
+    """Samples carried over from one block to the next."""
+
+    def __init__(self, channels):
+        self._data = [[] for _ in range(channels)]
+
+    def extend(self, block):
+        numpy = import_numpy()
+        if numpy is not None:
+            return [numpy.concatenate((numpy.asarray(p, dtype=numpy.float64),
+                                       numpy.asarray(channel)))
+                    for p, channel in zip(self._data, block)]
+        return [list(p) + list(channel)
+                for p, channel in zip(self._data, block)]
+
+    def keep(self, data, start):
+        self._data = [channel[start:] for channel in data]
+
+
+def _biquad_params(cutoff, sample_rate, q):
+    w0 = 2 * math.pi * cutoff / sample_rate
+    return math.cos(w0), math.sin(w0) / (2 * q)
+
+
+def _tolist(channel):
+    return channel.tolist() if hasattr(channel, 'tolist') else list(channel)
+
+
+def _channel(values):
+    numpy = import_numpy()
+    if numpy is not None:
+        return numpy.array(values)
+    return array.array('d', values)
+
+
+def _fft(x):
+    """In-place iterative radix-2 FFT of a list of complex numbers (the
+    fallback when NumPy is not installed).
+    """
+    n = len(x)
+    j = 0
+    for i in range(1, n):
+        bit = n >> 1
+        while j & bit:
+            j ^= bit
+            bit >>= 1
+        j |= bit
+        if i < j:
+            x[i], x[j] = x[j], x[i]
+    size = 2
+    while size <= n:
+        half = size // 2
+        step = cmath.exp(-2j * math.pi / size)
+        for start in range(0, n, size):
+            w = 1
+            for k in range(start, start + half):
+                t = x[k + half] * w
+                x[k + half] = x[k] - t
+                x[k] += t
+                w *= step
+        size *= 2
+    return x
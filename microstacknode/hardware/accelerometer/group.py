@@ -0,0 +1,197 @@
+"""Synchronised reading of several MMA8452Qs on one I2C bus (there are two
+addresses, 0x1C and 0x1D):
+
+    >>> accelerometers = [MMA8452Q(i2c_address=0x1c),
+    ...                   MMA8452Q(i2c_address=0x1d)]
+    >>> with MMA8452QGroup(accelerometers) as group:
+    ...     samples, timestamps = group.read_block(800)
+    ...     first, second = group.split(samples)
+
+"""
+import time
+import array
+import ctypes
+import struct
+from microstackcommon.i2c import writing_bytes
+from microstackcommon.linux_i2c import I2C_M_RD, i2c_msg, i2c_rdwr_ioctl_data
+from microstacknode.hardware.i2cbus import ManagedI2CMaster, PRIORITY_SENSOR
+from microstacknode.hardware.accelerometer.mma8452q import (
+    CTRL_REG1,
+    CTRL_REG1_SET_ACTIVE,
+    STATUS_ZYXDR,
+    STATUS_ZYXOW)
+
+
+SAMPLE_BYTES = 7  # STATUS and OUT_X_MSB to OUT_Z_LSB
+NOT_READY_POLLS_PER_PERIOD = 8
+# rows are scheduled a retry / GRID_LEAD_DIVISOR early (see
+# `capture.MMA8452QCapture`)
+GRID_LEAD_DIVISOR = 8
+
+
+class MMA8452QGroup(ManagedI2CMaster):
+    """Several MMA8452Qs on one I2C bus, configured the same way and read
+    back to back.
+
+    The group opens the bus once and the accelerometers share it. They
+    are activated in one transfer so their sample clocks start together,
+    and each tick reads all of them in one I2C_RDWR transfer (one read
+    message per accelerometer, joined by repeated STARTs).
+
+    The first accelerometer is the reference: `read_block()` stores a row
+    (a sample from every accelerometer) each time it has a new sample. The
+    chips have their own oscillators so the others drift against it, if
+    one of them has no new sample its previous one is repeated (counted in
+    `held`). `overwritten` counts samples lost on each chip. The reads of
+    a tick are one transfer so they can't be timed separately, rows are
+    timestamped with the start of the transfer (the first accelerometer
+    is read first).
+
+    Fast read mode is not supported (each read is seven bytes).
+
+    If the accelerometers have a bus manager the group uses it too.
+
+    :param accelerometers: Unopened accelerometers on the same bus.
+    :type accelerometers: list of MMA8452Q
+    :param output_data_rate: Output data rate for all of them (Hz).
+    :type output_data_rate: float
+    :param g_range: Range for all of them (G's).
+    :type g_range: int
+    """
+
+    priority = PRIORITY_SENSOR
+
+    def __init__(self, accelerometers, output_data_rate=800, g_range=2):
+        self.accelerometers = list(accelerometers)
+        bus = self.accelerometers[0].bus
+        if any(a.bus != bus for a in self.accelerometers):
+            raise ValueError("The accelerometers must share a bus.")
+        super().__init__(bus, self.accelerometers[0].bus_manager)
+        # statistics key on a managed bus
+        self.i2c_address = tuple(a.i2c_address for a in self.accelerometers)
+        self.output_data_rate = output_data_rate
+        self.g_range = g_range
+        n = len(self.accelerometers)
+        self.held = [0] * n
+        self.overwritten = [0] * n
+        self.ticks = 0
+        # the latest sample of each accelerometer, copied into each row
+        self._last = array.array('h', [0] * (3 * n))
+        self._format = '>' + 'Bhhh' * n
+        self._buf = (ctypes.c_uint8 * (SAMPLE_BYTES * n))()
+        msgs = (i2c_msg * n)(*[
+            i2c_msg(addr=a.i2c_address,
+                    flags=I2C_M_RD,
+                    len=SAMPLE_BYTES,
+                    buf=ctypes.cast(ctypes.addressof(self._buf) +
+                                    SAMPLE_BYTES * k,
+                                    ctypes.POINTER(ctypes.c_char)))
+            for k, a in enumerate(self.accelerometers)])
+        self._transfer = i2c_rdwr_ioctl_data(msgs=msgs, nmsgs=n)
+
+    def __enter__(self):
+        self = super().__enter__()
+        self.init()
+        return self
+
+    def open(self):
+        super().open()
+        for accelerometer in self.accelerometers:
+            accelerometer.fd = self.fd
+
+    def init(self):
+        """Configures every accelerometer (including its cached calibration)
+        and then activates them all together.
+        """
+        if any(a.fast_read for a in self.accelerometers):
+            raise ValueError("Fast read mode is not supported in a group.")
+        for accelerometer in self.accelerometers:
+            with accelerometer.configure():
+                accelerometer.init()
+                accelerometer.set_output_data_rate(self.output_data_rate)
+                accelerometer.set_g_range(self.g_range)
+                accelerometer.standby()
+        self.activate()
+
+    def activate(self):
+        """Activates all of the accelerometers in one transfer."""
+        msgs = []
+        for accelerometer in self.accelerometers:
+            accelerometer._ctrl_reg1_value |= CTRL_REG1_SET_ACTIVE
+            accelerometer._shadow[CTRL_REG1] = accelerometer._ctrl_reg1_value
+            msgs.append(writing_bytes(accelerometer.i2c_address,
+                                      CTRL_REG1,
+                                      accelerometer._ctrl_reg1_value))
+        self.transaction(*msgs)
+
+    def standby(self):
+        """Puts all of the accelerometers in standby."""
+        for accelerometer in self.accelerometers:
+            accelerometer.standby()
+
+    def read_tick(self, out, offset=0):
+        """Reads every accelerometer once (one transfer) and stores signed
+        12-bit x, y, z counts for each of them in `out` from `offset`.
+        Returns (timestamp, status of the first accelerometer).
+        """
+        start = time.monotonic()
+        self._rdwr(self._transfer)
+        values = struct.unpack_from(self._format, self._buf)
+        last = self._last
+        reference_ready = values[0] & STATUS_ZYXDR
+        if reference_ready:
+            self.ticks += 1
+        for k in range(len(self.accelerometers)):
+            status = values[4*k]
+            if status & STATUS_ZYXOW:
+                self.overwritten[k] += 1
+            if status & STATUS_ZYXDR:
+                last[3*k] = values[4*k+1] >> 4
+                last[3*k+1] = values[4*k+2] >> 4
+                last[3*k+2] = values[4*k+3] >> 4
+            elif reference_ready:
+                self.held[k] += 1
+        out[offset:offset+len(last)] = last
+        return start, values[0]
+
+    def read_block(self, n_samples):
+        """Returns n_samples rows as (samples, timestamps). samples is an
+        array('h') of signed 12-bit counts, each row being x, y, z for
+        every accelerometer in turn (see `split()`) and timestamps are the
+        `time.monotonic()` times the first accelerometer was read.
+        """
+        width = 3 * len(self.accelerometers)
+        samples = array.array('h', [0] * (width * n_samples))
+        timestamps = array.array('d', [0.0] * n_samples)
+        period = 1 / self.output_data_rate
+        retry = period / NOT_READY_POLLS_PER_PERIOD
+        i = 0
+        next_time = time.monotonic()
+        while i < n_samples:
+            timestamp, status = self.read_tick(samples, width * i)
+            if status & STATUS_ZYXDR:
+                timestamps[i] = timestamp
+                i += 1
+                # on the sample grid, not from the end of the read
+                next_time += period - retry / GRID_LEAD_DIVISOR
+            else:
+                next_time += retry
+            delay = next_time - time.monotonic()
+            if delay > 0 and i < n_samples:
+                time.sleep(delay)
+            elif -delay > period:
+                next_time = time.monotonic()
+        return samples, timestamps
+
+    def split(self, samples):
+        """Returns a list of interleaved x, y, z sample arrays, one for
+        each accelerometer.
+        """
+        width = 3 * len(self.accelerometers)
+        devices = []
+        for k in range(len(self.accelerometers)):
+            device = array.array('h', [0] * (len(samples) // width * 3))
+            for axis in range(3):
+                device[axis::3] = samples[3*k+axis::width]
+            devices.append(device)
+        return devices
@@ -1,6 +1,15 @@
 import sys
 import time
-from microstackcommon.i2c import I2CMaster, writing_bytes, writing, reading
+import array
+import ctypes
+import struct
+from microstackcommon.i2c import writing_bytes, writing, reading
+from microstackcommon.linux_i2c import I2C_M_RD, i2c_msg, i2c_rdwr_ioctl_data
+from microstacknode._optional import import_numpy
+from microstacknode.hardware.i2cbus import ManagedI2CMaster, PRIORITY_SENSOR
+from microstacknode.hardware.accelerometer.calibration import (
+    DEFAULT_CALIBRATION_CACHE,
+    load_offsets)
 
 
 DEFAULT_I2C_BUS = 1
@@ -27,9 +36,10 @@ PL_BF_ZCOMP = 0x13
 P_L_THS_REG = 0x14
 FF_MT_CFG = 0x15
 FF_MT_SRC = 0x16
-FF_MT_SRC = 0x17
+FF_MT_THS = 0x17
 FF_MT_COUNT = 0x18
 TRANSIENT_CFG = 0x1D
+TRANSIENT_SRC = 0x1E
 TRANSIENT_THS = 0x1F
 TRANSIENT_COUNT = 0x20
 PULSE_CFG = 0x21
@@ -51,6 +61,20 @@ OFF_Y = 0x30
 OFF_Z = 0x31
 
 # register values
+# STATUS Register (Read Only)
+# +-------+-------+-------+-------+-------+-------+-------+-------+
+# | bit 7 | bit 6 | bit 5 | bit 4 | bit 3 | bit 2 | bit 1 | bit 0 |
+# +-------+-------+-------+-------+-------+-------+-------+-------+
+# | ZYXOW | ZOW   | YOW   | XOW   | ZYXDR | ZDR   | YDR   | XDR   |
+# +-------+-------+-------+-------+-------+-------+-------+-------+
+STATUS_ZYXOW = 0x80  # a new sample overwrote one which hadn't been read
+STATUS_ZYXDR = 0x08  # a new sample is ready
+
+# SYSMOD Register (Read Only), bits 1 and 0
+SYSMOD_STANDBY = 0x00
+SYSMOD_WAKE = 0x01
+SYSMOD_SLEEP = 0x02
+
 # CTRL_REG1 Register (Read/Write)
 # +------------+------------+-------+-------+------+--------+--------+--------+
 # | bit 7      | bit 6      | bit 5 | bit 4 | bit 3| bit 2  | bit 1  | bit 0  |
@@ -58,15 +82,60 @@ OFF_Z = 0x31
 # | ASLP_RATE1 | ASLP_RATE0 | DR2   | DR1   | DR0  | LNOISE | F_READ | ACTIVE |
 # +------------+------------+-------+-------+------+--------+--------+--------+
 CTRL_REG1_SET_ACTIVE = 0x01
+CTRL_REG1_F_READ = 0x02  # auto increment skips the OUT LSB registers
 # DR2 DR1 DR0
-CTRL_REG1_ODR_800 = 1 << 3  # period = 1.25 ms
-CTRL_REG1_ODR_400 = 2 << 3  # period = 2.5 ms
-CTRL_REG1_ODR_200 = 3 << 3  # period = 5 ms
-CTRL_REG1_ODR_100 = 4 << 3  # period = 10 ms
-CTRL_REG1_ODR_50 = 5 << 3  # period = 20 ms
-CTRL_REG1_ODR_12_5 = 6 << 3  # period = 80 ms
-CTRL_REG1_ODR_6_25 = 7 << 3  # period = 160 ms
-CTRL_REG1_ODR_1_56 = 8 << 3  # period = 640 ms
+CTRL_REG1_ODR_800 = 0 << 3  # period = 1.25 ms
+CTRL_REG1_ODR_400 = 1 << 3  # period = 2.5 ms
+CTRL_REG1_ODR_200 = 2 << 3  # period = 5 ms
+CTRL_REG1_ODR_100 = 3 << 3  # period = 10 ms
+CTRL_REG1_ODR_50 = 4 << 3  # period = 20 ms
+CTRL_REG1_ODR_12_5 = 5 << 3  # period = 80 ms
+CTRL_REG1_ODR_6_25 = 6 << 3  # period = 160 ms
+CTRL_REG1_ODR_1_56 = 7 << 3  # period = 640 ms
+# ASLP_RATE1 ASLP_RATE0 (output data rate while asleep)
+CTRL_REG1_ASLP_RATE_50 = 0 << 6
+CTRL_REG1_ASLP_RATE_12_5 = 1 << 6
+CTRL_REG1_ASLP_RATE_6_25 = 2 << 6
+CTRL_REG1_ASLP_RATE_1_56 = 3 << 6
+
+# CTRL_REG2 Register (Read/Write)
+# +----+-----+---+-------+-------+------+-------+-------+
+# | 7  | 6   | 5 | 4     | 3     | 2    | 1     | 0     |
+# +----+-----+---+-------+-------+------+-------+-------+
+# | ST | RST | 0 | SMODS1| SMODS0| SLPE | MODS1 | MODS0 |
+# +----+-----+---+-------+-------+------+-------+-------+
+CTRL_REG2_SLPE = 0x04  # auto-sleep enable
+
+# ASLP_COUNT: inactivity time before sleeping, 320 ms steps (640 ms at an
+# output data rate of 1.56 Hz)
+ASLP_COUNT_STEP = 0.32
+
+# CTRL_REG4 (interrupt enable) and INT_SOURCE (Read Only) Registers
+# +-------+-------+--------+---------+--------+--------+-------+-------+
+# | bit 7 | bit 6 | bit 5  | bit 4   | bit 3  | bit 2  | bit 1 | bit 0 |
+# +-------+-------+--------+---------+--------+--------+-------+-------+
+# | ASLP  | 0     | TRANS  | LNDPRT  | PULSE  | FF_MT  | 0     | DRDY  |
+# +-------+-------+--------+---------+--------+--------+-------+-------+
+# CTRL_REG5 routes each interrupt to INT1 (1) or INT2 (0), same layout.
+INT_ASLP = 0x80
+INT_TRANS = 0x20
+INT_LNDPRT = 0x10
+INT_PULSE = 0x08
+INT_FF_MT = 0x04
+INT_DRDY = 0x01
+
+# CTRL_REG3 Register (Read/Write)
+# +---+---------+-------------+------------+------------+---+------+-------+
+# | 7 | 6       | 5           | 4          | 3          | 2 | 1    | 0     |
+# +---+---------+-------------+------------+------------+---+------+-------+
+# | 0 | WAKE_TR | WAKE_LNDPRT | WAKE_PULSE | WAKE_FF_MT | 0 | IPOL | PP_OD |
+# +---+---------+-------------+------------+------------+---+------+-------+
+CTRL_REG3_WAKE_TRANS = 0x40
+CTRL_REG3_WAKE_LNDPRT = 0x20
+CTRL_REG3_WAKE_PULSE = 0x10
+CTRL_REG3_WAKE_FF_MT = 0x08
+CTRL_REG3_IPOL = 0x02  # interrupts are active high
+CTRL_REG3_PP_OD = 0x01  # open drain interrupt outputs
 
 # XYZ_DATA_CFG (Read/Write)
 # +-------+-------+-------+---------+-------+-------+-------+-------+
@@ -81,45 +150,68 @@ XYZ_DATA_CFG_FSR_8G = 0x02
 
 STANDARD_GRAVITY = 9.80665
 
+# A configuration session fills gaps of up to this many registers with
+# their known values rather than starting another write.
+MAX_WRITE_GAP = 2
+
+# `get_xyz_block_into()` gives up if no new sample arrives for this many
+# sample periods (the chip is in standby or misconfigured)
+BLOCK_READ_TIMEOUT_PERIODS = 4
+
 
-class MMA8452Q(I2CMaster):
+class MMA8452Q(ManagedI2CMaster):
     """Freescale MMA8452Q accelerometer.
 
     http://www.freescale.com/files/sensors/doc/data_sheet/MMA8452Q.pdf
 
+    :param bus_manager: Shared bus to use instead of opening i2c_bus (see
+                        `microstacknode.hardware.i2cbus`).
+    :type bus_manager: I2CBusManager
     """
-    # This chip uses an SMBus implementation which is not well supported on
-    # the Raspberry Pi (at least, not in Python 3). We can write to registers
-    # but reading requires sending multiple START signals. This somehow resets
-    # the requested register address to 0x00. So we *can* read, but only from
-    # register 0x00 and subsequent registers (using a multiple read). Luckily
-    # the XYZ registers are in the first few and we can access them using a
-    # multi-read.
-
-    # One might be inclined to multi-read the whole register bank however the
-    # auto increment resets to 0x00 shortly after the XYZ registers.
-
-    # Maybe we can get it working though. Try getting python-smbus working
-    # with Python 3
-    # http://www.spinics.net/lists/linux-i2c/msg08427.html
-    #http://git.kernel.org/cgit/linux/kernel/git/torvalds/linux.git/plain/Documentation/i2c/smbus-protocol
+    # Reading a register requires writing the register address and then
+    # reading with a repeated START (no STOP in between), otherwise the chip
+    # resets the register address to 0x00. A plain read therefore always
+    # starts at STATUS, which is handy for the XYZ data (the first few
+    # registers) and is what `get_xyz()` does.
+
+    # Any other register is read with a combined write-read transfer: both
+    # messages go to `I2CMaster.transaction()` together, which sends them
+    # in one I2C_RDWR ioctl so the kernel joins them with a repeated START.
+    # See `read_registers()` and `MMA8452QRegister.get()`.
 
     # Special thanks for John Nivard for providing a working class, which
     # this one is based off. I have made changes for consistency with other
     # Microstack modules.
 
+    priority = PRIORITY_SENSOR
+
     def __init__(self,
                  i2c_bus=DEFAULT_I2C_BUS,
-                 i2c_address=DEFAULT_I2C_ADDRESS):
-        super().__init__(i2c_bus)
+                 i2c_address=DEFAULT_I2C_ADDRESS,
+                 calibration_cache=DEFAULT_CALIBRATION_CACHE,
+                 bus_manager=None):
+        super().__init__(i2c_bus, bus_manager)
         self.i2c_address = i2c_address
-        self.xyz_data_cfg = MMA8452QRegister(XYZ_DATA_CFG,
-                                             self.i2c_address,
-                                             self)
-        self.ctrl_reg1 = MMA8452QRegister(CTRL_REG1, self.i2c_address, self)
-        # have to store some registers locally since we can't read
+        # offsets saved by `calibration.calibrate()`, None to ignore them
+        self.calibration_cache = calibration_cache
+        self.offsets = (0, 0, 0)
+        # the settings registers are kept here so that changing one setting
+        # doesn't need a read back
         self._xyz_data_cfg_value = 0
         self._ctrl_reg1_value = 0
+        # register address -> last value written (see `configure()`)
+        self._shadow = {}
+        self._session = None
+        self.output_data_rate = None
+        self.sleep_rate = None  # auto-sleep off (see `set_auto_sleep()`)
+        self.fast_read = False
+        self.g_range = 2
+        # G's per count at 12 and 8-bit resolution (see `set_g_range()`)
+        self._gmul12 = self.g_range / (1 << 11)
+        self._gmul8 = self.g_range / (1 << 7)
+        # reused by `get_xyz_into()` (built on first use)
+        self._xyz_buf = None
+        self._xyz_transfer = None
 
     def __enter__(self):
         self = super().__enter__()
@@ -127,30 +219,101 @@ class MMA8452Q(I2CMaster):
         return self
 
     def init(self):
-        """Initalises the accelerometer with some default values."""
-        self.standby()
-        self.set_output_data_rate(800)  # Hz
-        self.set_g_range(2)
-        self.activate()
+        """Initalises the accelerometer with some default values and the
+        cached calibration offsets (if there are any).
+        """
+        with self.configure():
+            self.standby()
+            self.set_output_data_rate(800)  # Hz
+            self.set_g_range(2)
+            if self.calibration_cache is not None:
+                offsets = load_offsets(self.calibration_cache,
+                                       self.bus,
+                                       self.i2c_address)
+                if offsets is not None:
+                    self.set_offsets(*offsets)
+            self.activate()
 
     def reset(self):
         """Resets the accelerometer."""
         self._ctrl_reg1_value = 0
-        self.ctrl_reg1.set(self._ctrl_reg1_value)
+        self._set_register(CTRL_REG1, self._ctrl_reg1_value)
+        self._set_fast_read_state(False)
 
     def activate(self):
         """Start recording the accelerometer values. Call this after
         changing any settings.
         """
         self._ctrl_reg1_value |= CTRL_REG1_SET_ACTIVE
-        self.ctrl_reg1.set(self._ctrl_reg1_value)
+        self._set_register(CTRL_REG1, self._ctrl_reg1_value)
 
     def standby(self):
         """Stop recording the accelerometer values. Call this before
         changing any settings.
         """
         self._ctrl_reg1_value &= 0xff ^ CTRL_REG1_SET_ACTIVE
-        self.ctrl_reg1.set(self._ctrl_reg1_value)
+        self._set_register(CTRL_REG1, self._ctrl_reg1_value)
+
+    def configure(self):
+        """Returns a configuration session. Register writes made inside
+        the session are only recorded and are sent when it ends, as a few
+        auto increment writes of consecutive registers. The chip is put in
+        standby first and reactivated last, so there is no need to call
+        `standby()` and `activate()`:
+
+            >>> with accelerometer.configure():
+            ...     accelerometer.set_output_data_rate(100)
+            ...     accelerometer.set_g_range(4)
+
+        The values set so far are still written if the block raises, as
+        they would have been outside a session. Sessions can be nested,
+        the outermost one writes the registers.
+        """
+        if self._session is None:
+            self._session = MMA8452QConfiguration(self)
+        return self._session
+
+    def _set_register(self, register_address, value):
+        """Writes a register now or, inside `configure()`, at the end of
+        the session.
+        """
+        self._shadow[register_address] = value
+        if self._session is None:
+            self.transaction(
+                writing_bytes(self.i2c_address, register_address, value))
+        else:
+            self._session.dirty.add(register_address)
+
+    def _write_registers(self, register_address, values):
+        """Writes values to consecutive registers in one transfer."""
+        self.transaction(
+            writing_bytes(self.i2c_address, register_address, *values))
+
+    def write_register(self, register_address, value):
+        """Writes a single register (at the end of the session inside
+        `configure()`).
+        """
+        self._set_register(register_address, value)
+
+    def update_register(self, register_address, mask, value):
+        """Changes the bits in `mask` of a register to `value` leaving the
+        others as they were last written.
+        """
+        value = (self._shadow.get(register_address, 0) & (0xff ^ mask)) | \
+            (value & mask)
+        self._set_register(register_address, value)
+
+    def read_registers(self, register_address, n_bytes):
+        """Returns n_bytes bytes read from consecutive registers starting
+        at register_address (using a repeated START).
+        """
+        return self.transaction(
+            writing_bytes(self.i2c_address, register_address),
+            reading(self.i2c_address, n_bytes))[0]
+
+    def read_register(self, register_address):
+        """Returns the value of a single register."""
+        return self.read_registers(register_address, 1)[0]
 
     def get_xyz(self, raw=False, res12=True):
         """Returns the x, y and z values as a dictionary. By default it returns
@@ -158,15 +321,17 @@ class MMA8452Q(I2CMaster):
         (8-bit) or request the raw register values. Signed values are
         in G's. You can alter the recording range with `set_g_range()`.
 
+        In fast read mode (see `set_fast_read()`) only the 8-bit values are
+        available so `res12` is ignored.
+
         :param raw: If True: return raw, unsigned data, else: sign values
         :type raw: boolean (default: False)
         :param res12: If True: read 12-bit resolution, else: 8-bit
         :type res12: boolean (default: True)
         """
-        # Since we can't read arbitary registers from this chip over I2C
-        # (because there is no decent SMBus implementation, in Python 3 at
-        # least) we have to just read the first 7 registers and pull the
-        # XYZ data from that.
+        # A plain read starts at STATUS (0x00) and the output registers
+        # follow it, so one read message gets the status and the XYZ data
+        # without the register address write `read_registers()` needs.
 
         # Notes:
 
@@ -190,43 +355,173 @@ class MMA8452Q(I2CMaster):
         #     | value  | unused |
         #     +--------+--------+
 
-        # bulk read works
-        buf = self.transaction(reading(self.i2c_address, 7))[0]
-        # status = buf[0]
-        if res12:
-            x = (buf[1] << 4) | (buf[2] >> 4)
-            y = (buf[3] << 4) | (buf[4] >> 4)
-            z = (buf[5] << 4) | (buf[6] >> 4)
+        # - fast read (F_READ) skips the LSB registers:
+
+        #     +--------+-----------+-----------+-----------+
+        #     | STATUS | OUT_X_MSB | OUT_Y_MSB | OUT_Z_MSB |
+        #     +--------+-----------+-----------+-----------+
+
+        if self.fast_read:
+            buf = self.transaction(reading(self.i2c_address, 4))[0]
+            # status = buf[0]
+            res12 = False
+            x, y, z = buf[1], buf[2], buf[3]
         else:
-            x, y, z = buf[1], buf[3], buf[5]
+            # bulk read works
+            buf = self.transaction(reading(self.i2c_address, 7))[0]
+            # status = buf[0]
+            if res12:
+                x = (buf[1] << 4) | (buf[2] >> 4)
+                y = (buf[3] << 4) | (buf[4] >> 4)
+                z = (buf[5] << 4) | (buf[6] >> 4)
+            else:
+                x, y, z = buf[1], buf[3], buf[5]
 
         if not raw:
-            # get range
-            fsr = self._xyz_data_cfg_value & 0x03
-            g_ranges = {XYZ_DATA_CFG_FSR_2G: 2,
-                        XYZ_DATA_CFG_FSR_4G: 4,
-                        XYZ_DATA_CFG_FSR_8G: 8}
-            g_range = g_ranges[fsr]
             resolution = 12 if res12 else 8
-            gmul = g_range / (2 ** (resolution - 1))
+            gmul = self._gmul12 if res12 else self._gmul8
             x = twos_complement(x, resolution) * gmul
             y = twos_complement(y, resolution) * gmul
             z = twos_complement(z, resolution) * gmul
 
         return {'x': x, 'y': y, 'z': z}
 
+    def read_sample(self):
+        """Returns the STATUS register and the signed 12-bit x, y and z
+        values (counts, not G's) as a tuple: (status, x, y, z).
+        """
+        xyz = [0, 0, 0]
+        status = self.get_xyz_into(xyz, raw=True)
+        return (status, xyz[0], xyz[1], xyz[2])
+
+    def get_xyz_into(self, out, raw=False):
+        """Reads the x, y and z values into `out` and returns the STATUS
+        register. This allocates nothing per call (the I2C transfer is
+        built once and reused), so use it in tight polling loops:
+
+            >>> xyz = array.array('f', [0, 0, 0])
+            >>> while True:
+            ...     status = accelerometer.get_xyz_into(xyz)
+
+        In fast read mode (see `set_fast_read()`) only four bytes are read
+        and the 8-bit values are scaled up to 12-bit counts.
+
+        :param out: Mutable sequence of at least three items.
+        :type out: array.array or list
+        :param raw: If True: store signed 12-bit counts, else: G's.
+        :type raw: boolean (default: False)
+        """
+        if self._xyz_transfer is None:
+            self._xyz_buf, self._xyz_transfer = self._read_transfer(
+                4 if self.fast_read else 7)
+        self._rdwr(self._xyz_transfer)
+        buf = self._xyz_buf
+        if self.fast_read:
+            x = ((buf[1] ^ 0x80) - 0x80) << 4
+            y = ((buf[2] ^ 0x80) - 0x80) << 4
+            z = ((buf[3] ^ 0x80) - 0x80) << 4
+        else:
+            # sign the big endian 16-bit word then drop the unused nibble
+            x = ((((buf[1] << 8) | buf[2]) ^ 0x8000) - 0x8000) >> 4
+            y = ((((buf[3] << 8) | buf[4]) ^ 0x8000) - 0x8000) >> 4
+            z = ((((buf[5] << 8) | buf[6]) ^ 0x8000) - 0x8000) >> 4
+        if raw:
+            out[0] = x
+            out[1] = y
+            out[2] = z
+        else:
+            gmul = self._gmul12
+            out[0] = x * gmul
+            out[1] = y * gmul
+            out[2] = z * gmul
+        return buf[0]
+
+    def get_xyz_block_into(self, out, n_samples, raw=False):
+        """Reads the next n_samples new samples into `out` (interleaved x,
+        y, z) and returns the number of samples the chip overwrote before
+        they were read.
+
+        The MMA8452Q has no FIFO so each sample is one burst read of STATUS
+        and the output registers. Reads without ZYXDR set (no new sample
+        yet) are not stored and the next read is a fraction of the output
+        data rate period later.
+
+        :param out: Mutable sequence of at least 3 * n_samples items.
+        :type out: array.array or list
+        :param n_samples: Number of samples to read.
+        :type n_samples: int
+        :param raw: If True: store signed 12-bit counts, else: G's.
+        :type raw: boolean (default: False)
+        :raises: TimeoutError if no new sample arrives for
+                 `BLOCK_READ_TIMEOUT_PERIODS` sample periods (the chip is
+                 in standby, for example).
+        """
+        xyz = [0, 0, 0]
+        rate = self.output_data_rate or 800
+        if self.sleep_rate is not None:
+            rate = min(rate, self.sleep_rate)
+        retry = 1 / (8 * rate)
+        timeout = BLOCK_READ_TIMEOUT_PERIODS / rate
+        deadline = time.monotonic() + timeout
+        overwritten = 0
+        i = 0
+        while i < 3 * n_samples:
+            status = self.get_xyz_into(xyz, raw)
+            if status & STATUS_ZYXDR:
+                if status & STATUS_ZYXOW:
+                    overwritten += 1
+                out[i] = xyz[0]
+                out[i+1] = xyz[1]
+                out[i+2] = xyz[2]
+                i += 3
+                deadline = time.monotonic() + timeout
+            elif time.monotonic() > deadline:
+                raise TimeoutError(
+                    "No new sample from the MMA8452Q in {:.3f} s, is it "
+                    "active?".format(timeout))
+            else:
+                time.sleep(retry)
+        return overwritten
+
+    def _read_transfer(self, n_bytes):
+        """Returns a (buffer, ioctl data) pair for a reusable I2C read of
+        n_bytes from the accelerometer. Pass the ioctl data to `_rdwr()`.
+        """
+        buf = (ctypes.c_uint8 * n_bytes)()
+        msgs = (i2c_msg * 1)(
+            i2c_msg(addr=self.i2c_address,
+                    flags=I2C_M_RD,
+                    len=n_bytes,
+                    buf=ctypes.cast(buf, ctypes.POINTER(ctypes.c_char))))
+        return buf, i2c_rdwr_ioctl_data(msgs=msgs, nmsgs=1)
+
     def get_xyz_ms2(self):
         """Returns the x, y, z values as a dictionary in SI units (m/s^2)."""
         xyz = self.get_xyz(raw=False, res12=True)
         # multiply each xyz value by the standard gravity value
-        return {direction: magnitude * STANDARD_GRAVITY
-                for direction, magnitude in xyz.items()}
+        for direction in xyz:
+            xyz[direction] *= STANDARD_GRAVITY
+        return xyz
+
+    def raw_to_g(self, buf, si=False):
+        """Converts a block of raw output register bytes (OUT_X_MSB to
+        OUT_Z_LSB, six bytes per sample) to G's (or m/s^2) using the current
+        range. See `raw_to_g()`.
+        """
+        return raw_to_g(buf, self.g_range, si)
+
+    def counts_to_g(self, counts, si=False):
+        """Converts signed 12-bit counts (for example from
+        `capture.SampleRingBuffer`) to G's (or m/s^2) using the current
+        range. See `counts_to_g()`.
+        """
+        return counts_to_g(counts, self.g_range, si)
 
     def set_g_range(self, g_range):
         """Sets the force range (in Gs -- where 1G is the force of gravity).
 
         Be sure to call `standby()` before using this method and `activate()`
-        after using this method.
+        after using this method (or use `configure()`).
 
         :param g_range: The force range in Gs.
         :type g_range: int (acceptable ranges: 2, 4 or 8)
@@ -235,15 +530,42 @@ class MMA8452Q(I2CMaster):
                     4: XYZ_DATA_CFG_FSR_4G,
                     8: XYZ_DATA_CFG_FSR_8G}
         if g_range in g_ranges:
+            self.g_range = g_range
+            self._gmul12 = g_range / (1 << 11)
+            self._gmul8 = g_range / (1 << 7)
             self._xyz_data_cfg_value &= 0b11111100
             self._xyz_data_cfg_value |= g_ranges[g_range]
-            self.xyz_data_cfg.set(self._xyz_data_cfg_value)
+            self._set_register(XYZ_DATA_CFG, self._xyz_data_cfg_value)
+
+    def set_fast_read(self, enabled):
+        """Turns fast read mode on or off. In fast read mode the chip only
+        auto increments over the OUT MSB registers so each sample is four
+        bytes (STATUS, X, Y, Z) instead of seven, at 8-bit resolution.
+
+        Be sure to call `standby()` before using this method and `activate()`
+        after using this method (or use `configure()`).
+
+        :param enabled: Fast read on/off.
+        :type enabled: boolean
+        """
+        if enabled:
+            self._ctrl_reg1_value |= CTRL_REG1_F_READ
+        else:
+            self._ctrl_reg1_value &= 0xff ^ CTRL_REG1_F_READ
+        self._set_register(CTRL_REG1, self._ctrl_reg1_value)
+        self._set_fast_read_state(enabled)
+
+    def _set_fast_read_state(self, enabled):
+        self.fast_read = bool(enabled)
+        # the reusable read in get_xyz_into() depends on the mode
+        self._xyz_buf = None
+        self._xyz_transfer = None
 
     def set_output_data_rate(self, output_data_rate):
         """Sets the output data rate in Hz.
 
         Be sure to call `standby()` before using this method and `activate()`
-        after using this method.
+        after using this method (or use `configure()`).
 
         :param output_data_rate: The output data rate.
         :type output_data_rate: int (acceptable rates: 800, 400, 200, 100,
@@ -258,17 +580,164 @@ class MMA8452Q(I2CMaster):
                              6.25: CTRL_REG1_ODR_6_25,
                              1.56: CTRL_REG1_ODR_1_56}
         if output_data_rate in output_data_rates:
-            self._ctrl_reg1_value &= 0b11100111
+            self.output_data_rate = output_data_rate
+            self._ctrl_reg1_value &= 0b11000111
             self._ctrl_reg1_value |= output_data_rates[output_data_rate]
-            self.ctrl_reg1.set(self._ctrl_reg1_value)
+            self._set_register(CTRL_REG1, self._ctrl_reg1_value)
 
+    def set_auto_sleep(self, sleep_rate=6.25, timeout=5,
+                       wake_sources=('transient',)):
+        """Turns auto-sleep on. After `timeout` seconds without an event
+        from any of `wake_sources` the chip drops to `sleep_rate` and
+        returns to the output data rate on the next event. The detectors
+        used as wake sources must be configured too (see
+        `accelerometer.detectors`).
 
-class MMA8452QRegister(object):
-    """An 8 bit register inside an MMA8452Q. Since the native I2C driver
-    does not support multiple starts (SMBus) we cannot implement register
-    reads.
+        Be sure to call `standby()` before using this method and `activate()`
+        after using this method (or use `configure()`).
+
+        :param sleep_rate: Output data rate while asleep (or None to turn
+                           auto-sleep off).
+        :type sleep_rate: float (acceptable rates: 50, 12.5, 6.25, 1.56)
+        :param timeout: Seconds of inactivity before sleeping (up to 81.6,
+                        in 0.32 s steps).
+        :type timeout: float
+        :param wake_sources: Any of 'transient', 'orientation', 'tap',
+                             'motion' and 'freefall'.
+        :type wake_sources: list
+        """
+        sleep_rates = {50: CTRL_REG1_ASLP_RATE_50,
+                       12.5: CTRL_REG1_ASLP_RATE_12_5,
+                       6.25: CTRL_REG1_ASLP_RATE_6_25,
+                       1.56: CTRL_REG1_ASLP_RATE_1_56}
+        wake_bits = {'transient': CTRL_REG3_WAKE_TRANS,
+                     'orientation': CTRL_REG3_WAKE_LNDPRT,
+                     'tap': CTRL_REG3_WAKE_PULSE,
+                     'motion': CTRL_REG3_WAKE_FF_MT,
+                     'freefall': CTRL_REG3_WAKE_FF_MT}
+        wake_mask = CTRL_REG3_WAKE_TRANS | CTRL_REG3_WAKE_LNDPRT | \
+            CTRL_REG3_WAKE_PULSE | CTRL_REG3_WAKE_FF_MT
+        if sleep_rate is None:
+            self.sleep_rate = None
+            self.update_register(CTRL_REG2, CTRL_REG2_SLPE, 0)
+            self.update_register(CTRL_REG3, wake_mask, 0)
+        elif sleep_rate in sleep_rates:
+            self.sleep_rate = sleep_rate
+            self._ctrl_reg1_value &= 0b00111111
+            self._ctrl_reg1_value |= sleep_rates[sleep_rate]
+            self._set_register(CTRL_REG1, self._ctrl_reg1_value)
+            step = ASLP_COUNT_STEP
+            if self.output_data_rate == 1.56:
+                step *= 2
+            self._set_register(ASLP_COUNT,
+                               min(max(int(round(timeout / step)), 0), 255))
+            self.update_register(CTRL_REG2, CTRL_REG2_SLPE, CTRL_REG2_SLPE)
+            wake = 0
+            for source in wake_sources:
+                wake |= wake_bits[source]
+            self.update_register(CTRL_REG3, wake_mask, wake)
+
+    def set_offsets(self, x, y, z):
+        """Sets the offsets the chip adds to every sample (OFF_X, OFF_Y and
+        OFF_Z), see `calibration.calibrate()`.
+
+        Be sure to call `standby()` before using this method and `activate()`
+        after using this method (or use `configure()`).
+
+        :param x: x offset in 2 milli G steps (-128 to 127).
+        :type x: int
+        """
+        self.offsets = (x, y, z)
+        for register_address, offset in zip((OFF_X, OFF_Y, OFF_Z),
+                                            self.offsets):
+            self._set_register(register_address, offset & 0xff)
+
+    def get_system_mode(self):
+        """Returns the SYSMOD register: SYSMOD_STANDBY, SYSMOD_WAKE or
+        SYSMOD_SLEEP.
+        """
+        return self.read_register(SYSMOD) & 0x03
+
+    def get_sample_rate(self, system_mode=SYSMOD_WAKE):
+        """Returns the rate samples are produced at in a system mode (the
+        sleep rate when auto-sleep has put the chip to sleep).
+        """
+        if system_mode == SYSMOD_SLEEP and self.sleep_rate is not None:
+            # the chip never samples faster asleep than awake
+            return min(self.sleep_rate, self.output_data_rate or 800)
+        return self.output_data_rate or 800
+
+
+class MMA8452QConfiguration(object):
+    """A batch of MMA8452Q register writes, see `MMA8452Q.configure()`.
+
+    The accelerometer keeps the last value written to each register (its
+    shadow map), the session only tracks which of them are dirty. At the
+    end of the session the chip is put in standby (if it might be
+    active), the dirty registers are written in runs of consecutive
+    addresses (short gaps are filled with their known values) and then
+    CTRL_REG1 is written, which sets ACTIVE again.
     """
 
+    def __init__(self, accelerometer):
+        self.accelerometer = accelerometer
+        self.dirty = set()
+        self._depth = 0
+        self._start_ctrl_reg1 = None
+
+    def __enter__(self):
+        if self._depth == 0:
+            self._start_ctrl_reg1 = self.accelerometer._shadow.get(CTRL_REG1)
+        self._depth += 1
+        return self
+
+    def __exit__(self, *args):
+        self._depth -= 1
+        if self._depth == 0:
+            self.accelerometer._session = None
+            self.commit()
+
+    def commit(self):
+        """Writes the dirty registers."""
+        accelerometer = self.accelerometer
+        shadow = accelerometer._shadow
+        dirty = sorted(self.dirty - {CTRL_REG1})
+        ctrl_reg1 = shadow.get(CTRL_REG1)
+        # what CTRL_REG1 holds on the chip
+        current_ctrl_reg1 = self._start_ctrl_reg1
+        write_ctrl_reg1 = CTRL_REG1 in self.dirty
+        # changes to CTRL_REG1 other than ACTIVE (DR, ASLP_RATE, F_READ)
+        # are also ignored unless the chip is in standby
+        ctrl_reg1_settings = write_ctrl_reg1 and \
+            ctrl_reg1 & CTRL_REG1_SET_ACTIVE and \
+            (current_ctrl_reg1 is None or
+             (ctrl_reg1 ^ current_ctrl_reg1) & (0xff ^ CTRL_REG1_SET_ACTIVE))
+        if (dirty or ctrl_reg1_settings) and \
+                (current_ctrl_reg1 is None and write_ctrl_reg1 or
+                 current_ctrl_reg1 is not None and
+                 current_ctrl_reg1 & CTRL_REG1_SET_ACTIVE):
+            # the registers can only be changed in standby, if we don't
+            # know what CTRL_REG1 holds we must be setting it
+            standby = ctrl_reg1 if current_ctrl_reg1 is None \
+                else current_ctrl_reg1
+            standby &= 0xff ^ CTRL_REG1_SET_ACTIVE
+            accelerometer._write_registers(CTRL_REG1, [standby])
+            current_ctrl_reg1 = standby
+            write_ctrl_reg1 = True
+        runs = _register_runs(dirty, shadow, current_ctrl_reg1)
+        if write_ctrl_reg1 and ctrl_reg1 != current_ctrl_reg1:
+            if runs and runs[-1][0] + len(runs[-1][1]) == CTRL_REG1:
+                runs[-1][1].append(ctrl_reg1)
+            else:
+                runs.append((CTRL_REG1, [ctrl_reg1]))
+        for register_address, values in runs:
+            accelerometer._write_registers(register_address, values)
+        self.dirty.clear()
+
+
+class MMA8452QRegister(object):
+    """An 8 bit register inside an MMA8452Q."""
+
     def __init__(self, register_address, device_address, i2c_master):
         self.register_address = register_address
         self.device_address = device_address
@@ -278,6 +747,95 @@ class MMA8452QRegister(object):
         self.i2c_master.transaction(
             writing_bytes(self.device_address, self.register_address, v))
 
+    def get(self):
+        """Reads the register (write the address, repeated START, read)."""
+        return self.i2c_master.transaction(
+            writing_bytes(self.device_address, self.register_address),
+            reading(self.device_address, 1))[0][0]
+
+
+def _register_runs(addresses, shadow, ctrl_reg1):
+    """Groups sorted register addresses into runs of consecutive registers
+    as a list of (first address, [values]). Gaps of up to MAX_WRITE_GAP
+    registers are filled with their shadow values (`ctrl_reg1` for
+    CTRL_REG1) if they are known.
+    """
+    runs = []
+    for address in addresses:
+        if runs:
+            start, values = runs[-1]
+            gap = range(start + len(values), address)
+            fill = [ctrl_reg1 if a == CTRL_REG1 else shadow.get(a)
+                    for a in gap]
+            if len(fill) <= MAX_WRITE_GAP and None not in fill:
+                values.extend(fill)
+                values.append(shadow[address])
+                continue
+        runs.append((address, [shadow[address]]))
+    return runs
+
+
+def raw_to_g(buf, g_range=2, si=False):
+    """Converts a block of raw output register bytes to G's (or m/s^2 if
+    `si` is True) in one pass. Each sample is six bytes: OUT_X_MSB,
+    OUT_X_LSB, OUT_Y_MSB, OUT_Y_LSB, OUT_Z_MSB, OUT_Z_LSB.
+
+    Returns interleaved x, y, z values: a float32 NumPy array if NumPy is
+    installed, otherwise an array('f') (converted with a lookup table).
+
+    :param buf: Raw register bytes (length must be a multiple of 6).
+    :type buf: bytes-like
+    :param g_range: The range the samples were recorded with.
+    :type g_range: int (2, 4 or 8)
+    """
+    if len(buf) % 6:
+        raise ValueError("Buffer length must be a multiple of 6 bytes.")
+    numpy = import_numpy()
+    if numpy is not None:
+        # big endian words, the arithmetic shift drops the unused nibble
+        counts = numpy.frombuffer(buf, dtype='>i2') >> 4
+        return counts.astype(numpy.float32) * g_per_count(g_range, si)
+    table = _raw_to_g_table(g_range, si)
+    words = struct.unpack('>{}H'.format(len(buf) // 2), buf)
+    # the low nibble of each word is unused
+    return array.array('f', [table[word >> 4] for word in words])
+
+
+def counts_to_g(counts, g_range=2, si=False):
+    """Converts signed 12-bit counts to G's (or m/s^2 if `si` is True).
+
+    Returns a float32 NumPy array if NumPy is installed, otherwise an
+    array('f').
+    """
+    gmul = g_per_count(g_range, si)
+    numpy = import_numpy()
+    if numpy is not None:
+        return numpy.asarray(counts, dtype=numpy.float32) * gmul
+    return array.array('f', map(gmul.__mul__, counts))
+
+
+def g_per_count(g_range, si=False):
+    """Returns the G's (or m/s^2 if `si` is True) per 12-bit count."""
+    gmul = g_range / (1 << 11)
+    return gmul * STANDARD_GRAVITY if si else gmul
+
+
+_raw_to_g_tables = {}
+
+
+def _raw_to_g_table(g_range, si):
+    """Returns a table mapping each unsigned 12-bit count (a raw output
+    register word, MSB << 8 | LSB, shifted right by four) to G's (or
+    m/s^2). Built once per range.
+    """
+    key = (g_range, si)
+    if key not in _raw_to_g_tables:
+        gmul = g_per_count(g_range, si)
+        _raw_to_g_tables[key] = array.array(
+            'f', (twos_complement(count, 12) * gmul
+                  for count in range(1 << 12)))
+    return _raw_to_g_tables[key]
+
 
 def twos_complement(value, bits):
     """Signs a value with an arbitary number of bits."""
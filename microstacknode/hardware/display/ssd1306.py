@@ -1,9 +1,13 @@
 import time
 import math
-from microstackcommon.i2c import I2CMaster, writing_bytes, writing, reading
+from microstackcommon.i2c import DEFAULT_BUS, writing_bytes, writing, reading
+from microstacknode.hardware.i2cbus import ManagedI2CMaster, PRIORITY_DISPLAY
 
 
 I2C_ADDR = 0x3C
+# data bytes per transfer on a managed bus, so that other devices get the
+# bus between parts of a flush
+MANAGED_DATA_CHUNK = 32
 
 # Commands
 CMD_SET_LOW_COL_START_ADDR = 0x00  # 0x0F
@@ -33,13 +37,25 @@ CMD_SET_VCOMH_DESELECT_LEVEL = 0xDB
 CMD_SET_CHARGE_PUMP = 0x8D
 
 
-class SSD1306_96x16(I2CMaster):
-    """SSD1306 96x16 dot matrix OLED."""
+class SSD1306_96x16(ManagedI2CMaster):
+    """SSD1306 96x16 dot matrix OLED.
+
+    :param bus: The I2C bus number.
+    :type bus: int
+    :param bus_manager: Shared bus to use instead of opening bus (see
+                        `microstacknode.hardware.i2cbus`).
+    :type bus_manager: I2CBusManager
+    """
 
     pixel_width = 96
     pixel_height = 16
     num_pages = pixel_height / 8 # one page is 8 bits high
     rotate_display_180 = True
+    i2c_address = I2C_ADDR
+    priority = PRIORITY_DISPLAY
+
+    def __init__(self, bus=DEFAULT_BUS, bus_manager=None):
+        super().__init__(bus, bus_manager)
 
     def send_command(self, *cmd):
         # co = 0
@@ -53,7 +69,14 @@ class SSD1306_96x16(I2CMaster):
         # dc = 1
         # control = (co << 7) | (dc << 6)
         control = 0x40
-        self.transaction(writing_bytes(I2C_ADDR, control, *data))
+        if self.bus_manager is None:
+            self.transaction(writing_bytes(I2C_ADDR, control, *data))
+        else:
+            # the column and page addresses carry on from one transfer to
+            # the next
+            for i in range(0, len(data), MANAGED_DATA_CHUNK):
+                self.transaction(writing_bytes(
+                    I2C_ADDR, control, *data[i:i+MANAGED_DATA_CHUNK]))
 
     def init(self):
         """Initialises and clears the screen."""
@@ -0,0 +1,134 @@
+"""Maps `time.monotonic()` to UTC using the GPS.
+
+A `GPSClock` is fed the UTC time from GPRMC/GPGGA messages along with the
+monotonic time the serial frame arrived. It fits offset and drift between
+the two clocks (Theil-Sen, so the odd late frame does not skew the fit)
+over a bounded window of recent fixes. Any sensor can then stamp its
+samples with `time.monotonic()` and convert them later with the cheap
+`to_utc()`:
+
+    >>> clock = GPSClock()
+    >>> gps = L80GPS(clock=clock)  # feeds the clock on get_gprmc/get_gpgga
+    >>> gps.get_gprmc()
+    >>> t = time.monotonic()
+    >>> xyz = accelerometer.get_xyz()
+    >>> clock.to_datetime(t)
+
+The accelerometer capture thread and the SHT21 sampler take a clock too:
+
+    >>> capture = MMA8452QCapture(accelerometer, clock=clock)
+    >>> samples, timestamps = capture.buffer.read_block()
+    >>> utc = capture.to_utc(timestamps)
+
+"""
+import datetime
+import collections
+from microstacknode.hardware.gps.track import point_datetime
+
+
+DEFAULT_WINDOW = 32  # fixes
+EPOCH = datetime.datetime(1970, 1, 1)
+SECONDS_PER_DAY = 86400
+
+
+class ClockNotSyncedError(Exception):
+    pass
+
+
+class GPSClock(object):
+    """Estimates UTC = monotonic + offset + drift * (monotonic - reference).
+
+    :param window: Number of recent fixes used for the fit.
+    :type window: int
+    :param latency: Seconds between the GPS fix time and the arrival of
+                    the end of its serial frame (subtracted from arrival
+                    times).
+    :type latency: float
+    """
+
+    def __init__(self, window=DEFAULT_WINDOW, latency=0.0):
+        self.latency = latency
+        self._samples = collections.deque(maxlen=window)
+        self._date = None
+        self._date_seconds = None
+        self.offset = None
+        self.drift = 0.0
+        self.reference = 0.0
+
+    @property
+    def synced(self):
+        return self.offset is not None
+
+    def add_fix(self, nmea_dict, arrival):
+        """Adds a parsed GPRMC or GPGGA dictionary which arrived at
+        `arrival` (a `time.monotonic()` value). GPGGA messages carry no date
+        so they are ignored until a GPRMC message has been seen.
+        """
+        utc = nmea_dict.get('utc')
+        if utc is None:  # 0.0 is midnight
+            return
+        if nmea_dict.get('date'):
+            self._date = nmea_dict['date']
+            self._date_seconds = _seconds_of_day(utc)
+        elif self._date is None:
+            return
+        fix = {'utc': utc, 'date': self._date}
+        seconds = (point_datetime(fix) - EPOCH).total_seconds()
+        if _seconds_of_day(utc) < self._date_seconds - SECONDS_PER_DAY / 2:
+            # GPGGA after midnight, before the next GPRMC
+            seconds += SECONDS_PER_DAY
+        self.add_sample(arrival - self.latency, seconds)
+
+    def add_sample(self, monotonic_ts, utc_seconds):
+        """Adds a (monotonic, UTC seconds since the epoch) pair and refits."""
+        self._samples.append((monotonic_ts, utc_seconds - monotonic_ts))
+        self._fit()
+
+    def to_utc(self, monotonic_ts):
+        """Returns the UTC time (seconds since the epoch) of a
+        `time.monotonic()` value.
+
+        :raises: ClockNotSyncedError
+        """
+        if self.offset is None:
+            raise ClockNotSyncedError("No GPS fixes yet.")
+        return (monotonic_ts + self.offset +
+                self.drift * (monotonic_ts - self.reference))
+
+    def to_datetime(self, monotonic_ts):
+        """Returns the UTC time of a `time.monotonic()` value as a naive
+        datetime.
+
+        :raises: ClockNotSyncedError
+        """
+        return EPOCH + datetime.timedelta(seconds=self.to_utc(monotonic_ts))
+
+    def _fit(self):
+        samples = list(self._samples)
+        self.reference = samples[-1][0]
+        if len(samples) < 2:
+            self.drift = 0.0
+        else:
+            slopes = [(b[1] - a[1]) / (b[0] - a[0])
+                      for i, a in enumerate(samples)
+                      for b in samples[i + 1:]
+                      if b[0] != a[0]]
+            self.drift = _median(slopes) if slopes else 0.0
+        self.offset = _median([d - self.drift * (m - self.reference)
+                               for m, d in samples])
+
+
+def _seconds_of_day(hhmmss):
+    hhmmss = float(hhmmss)
+    return (int(hhmmss / 10000) * 3600 +
+            (int(hhmmss / 100) % 100) * 60 +
+            hhmmss % 100)
+
+
+def _median(values):
+    values = sorted(values)
+    n = len(values)
+    if n % 2:
+        return values[n // 2]
+    else:
+        return (values[n // 2 - 1] + values[n // 2]) / 2
@@ -1,14 +1,9 @@
 # http://www.gsm-rainbow.ru/sites/default/files/l80_gps_protocol_specification_v1.0.pdf
 import re
-import io
 import sys
 import time
-import serial
-import logging
 import datetime
-import threading
-import subprocess
-# logging.basicConfig(level=logging.DEBUG)
+import functools
 
 
 # Test these with `echo -e "\$PMTK161,0*28\r\n" > /dev/ttyAMA0`
@@ -27,20 +22,38 @@ PMTK_Q_LOCUS_DATA_PARTIAL = '$PMTK622,1*29\r\n'
 # setup default GPS device (different on Raspberry Pi 3 and above)
 def get_rpi_revision():
     """Returns the version number from the revision line."""
-    for line in open("/proc/cpuinfo"):
-        if "Revision" in line:
-            return re.sub('Revision\t: ([a-z0-9]+)\n', r'\1', line)
+    try:
+        with open("/proc/cpuinfo") as cpuinfo:
+            for line in cpuinfo:
+                if "Revision" in line:
+                    return re.sub('Revision\t: ([a-z0-9]+)\n', r'\1', line)
+    except OSError:
+        return None
+
+
+@functools.lru_cache(maxsize=None)
+def get_default_gps_device():
+    """Returns the serial device the GPS module is connected to on this
+    Raspberry Pi. This is only worked out once (on first use).
+    """
+    rpi_revision = get_rpi_revision()
+    if (rpi_revision and
+          (rpi_revision != 'Beta') and
+          (int('0x'+rpi_revision, 16) >= 0xa02082)):
+        # RPi 3 and above
+        return '/dev/ttyS0'
+    else:
+        # RPi 2 and below
+        return '/dev/ttyAMA0'
 
 
-rpi_revision = get_rpi_revision()
-if (rpi_revision and
-      (rpi_revision != 'Beta') and
-      (int('0x'+rpi_revision, 16) >= 0xa02082)):
-    # RPi 3 and above
-    DEFAULT_GPS_DEVICE = '/dev/ttyS0'
-else:
-    # RPi 2 and below
-    DEFAULT_GPS_DEVICE = '/dev/ttyAMA0'
+def __getattr__(name):
+    # DEFAULT_GPS_DEVICE used to be worked out on import, keep it available
+    # without reading /proc/cpuinfo until someone asks for it
+    if name == 'DEFAULT_GPS_DEVICE':
+        return get_default_gps_device()
+    raise AttributeError(
+        "module {!r} has no attribute {!r}".format(__name__, name))
 
 
 class NMEAPacketNotFoundError(Exception):
@@ -59,9 +72,27 @@ class L80GPS(object):
     """Thread that reads a stream of L80 GPS protocol lines and stores the
     information. Methods may raise exceptions if data is invalid (usually
     becasue of a poor GPS reception - try moving the GPS module outside).
+
+    :param device: The serial device the GPS module is connected to
+                   (default: `get_default_gps_device()`).
+    :type device: str
+    :param clock: Optional `clocksync.GPSClock` which is fed the UTC time
+                  of every GPRMC/GPGGA message read as it arrives. Lines
+                  which were already waiting in the serial buffer when
+                  they were read have no arrival time (`last_pkt_arrival`
+                  is None) and are not fed to it, so read continuously.
+    :type clock: GPSClock
     """
 
-    def __init__(self, device=DEFAULT_GPS_DEVICE):
+    def __init__(self, device=None, clock=None):
+        # pyserial is only needed once we actually talk to a GPS module
+        import serial
+        if device is None:
+            device = get_default_gps_device()
+        self.clock = clock
+        # time.monotonic() when the last NMEA packet arrived (None if it
+        # was already buffered, see `get_nmea_pkt()`)
+        self.last_pkt_arrival = None
         self.device_tx_rx = serial.Serial(device,
                                           baudrate=9600,
                                           bytesize=8,
@@ -122,6 +153,8 @@ class L80GPS(object):
         pkt = self.get_nmea_pkt('GPRMC')
         gprmc_dict, checksum = gprmc_as_dict(pkt)
         if gprmc_dict['data_valid'] == "A":
+            if self.clock is not None and self.last_pkt_arrival is not None:
+                self.clock.add_fix(gprmc_dict, self.last_pkt_arrival)
             return gprmc_dict
         else:
             raise DataInvalidError("Indicated by data_valid field.")
@@ -136,6 +169,9 @@ class L80GPS(object):
         """Returns the latest GPGGA message."""
         pkt = self.get_nmea_pkt('GPGGA')
         gpgga_dict, checksum = gpgga_as_dict(pkt)
+        if self.clock is not None and self.last_pkt_arrival is not None \
+                and gpgga_dict['fix'] not in ('', '0'):
+            self.clock.add_fix(gpgga_dict, self.last_pkt_arrival)
         return gpgga_dict
 
     def get_gpgsa(self):
@@ -301,10 +337,18 @@ class L80GPS(object):
             >>> gps.get_nmea_pkt('GPRMC')
             '$GPRMC,013732.000,A,3150.7238,N,11711.7278,E,0.00,0.00,220413,,,A*68'
 
+        `last_pkt_arrival` is set to when the line arrived or to None if
+        all of it was already buffered (its arrival time is unknown).
         """
         pattern_bytes = bytes(pattern, 'utf-8')
         while True:
+            buffered = self.device_tx_rx.in_waiting
             line = self.device_tx_rx.readline()
+            if buffered >= len(line):
+                # the whole line was already waiting, it arrived earlier
+                self.last_pkt_arrival = None
+            else:
+                self.last_pkt_arrival = time.monotonic()
             # logging.debug("L80GPS:readline returned - "+str(line))
             if line == b'':
                 raise NMEAPacketNotFoundError(
@@ -514,35 +558,21 @@ def gpgsv_as_dict(gpgsv_str):
                          'snr': 28}]},
           77)
     """
-    # TODO varaible length string depending on number of satellites
+    # there are up to four satellites per message (fewer in the last one)
     gpgsv, checksum = gpgsv_str[1:].split("*")  # remove `$` split *
-    message_id, num_messages, sequence_num, satellites_in_view, \
-        satellite_1_id, satellite_1_elevation, satellite_1_azimuth, \
-        satellite_1_snr, satellite_2_id, satellite_2_elevation, \
-        satellite_2_azimuth, satellite_2_snr, satellite_3_id, \
-        satellite_3_elevation, satellite_3_azimuth, satellite_3_snr, \
-        satellite_4_id, satellite_4_elevation, satellite_4_azimuth, \
-        satellite_4_snr = gpgsv.split(",")
+    gpgsv_data = gpgsv.split(",")
+    message_id, num_messages, sequence_num, satellites_in_view = \
+        gpgsv_data[:4]
+    satellites = gpgsv_data[4:]
     gpgsv_dict = {'message_id': message_id,
                   'num_messages': num_messages,
                   'sequence_num': sequence_num,
                   'satellites_in_view': satellites_in_view,
-                  'satellite': [{'id': satellite_1_id,
-                                 'elevation': satellite_1_elevation,
-                                 'azimuth': satellite_1_azimuth,
-                                 'snr': satellite_1_snr},
-                                {'id': satellite_2_id,
-                                 'elevation': satellite_2_elevation,
-                                 'azimuth': satellite_2_azimuth,
-                                 'snr': satellite_2_snr},
-                                {'id': satellite_3_id,
-                                 'elevation': satellite_3_elevation,
-                                 'azimuth': satellite_3_azimuth,
-                                 'snr': satellite_3_snr},
-                                {'id': satellite_4_id,
-                                 'elevation': satellite_4_elevation,
-                                 'azimuth': satellite_4_azimuth,
-                                 'snr': satellite_4_snr}]}
+                  'satellite': [{'id': satellites[i],
+                                 'elevation': satellites[i+1],
+                                 'azimuth': satellites[i+2],
+                                 'snr': satellites[i+3]}
+                                for i in range(0, len(satellites) - 3, 4)]}
     return (gpgsv_dict, checksum)
 
 
@@ -0,0 +1,143 @@
+"""Streaming satellite signal statistics from GPGSV and GPGSA messages.
+
+All statistics live in fixed-size arrays so they can be updated for as
+long as the GPS runs without growing, and `snapshot()` only copies those
+arrays:
+
+    >>> stats = SatelliteStats()
+    >>> while True:
+    ...     stats.add_gsv(gps.get_gpgsv())
+    ...     stats.add_gsa(gps.get_gpgsa())
+
+"""
+import array
+
+
+MAX_PRN = 100  # GPS (1-32), SBAS (33-64) and GLONASS (65-96) satellites
+ELEVATION_BUCKET = 10  # degrees
+NUM_ELEVATION_BUCKETS = 9  # 0-90 degrees
+SNR_BUCKET = 5  # dB-Hz
+NUM_SNR_BUCKETS = 20  # 0-99 dB-Hz
+DEFAULT_DOP_HISTORY = 600  # GPGSA messages (10 minutes at 1 Hz)
+
+
+class SatelliteStats(object):
+    """Running per-satellite SNR statistics, an SNR histogram for each
+    elevation bucket and a ring buffer of recent PDOP/HDOP/VDOP values.
+
+    :param dop_history: Number of DOP values to keep.
+    :type dop_history: int
+    """
+
+    def __init__(self, dop_history=DEFAULT_DOP_HISTORY):
+        self.dop_history = dop_history
+        self.reset()
+
+    def reset(self):
+        """Clears all of the statistics."""
+        self._snr_count = array.array('L', [0] * MAX_PRN)
+        self._snr_sum = array.array('d', [0] * MAX_PRN)
+        self._snr_min = array.array('B', [255] * MAX_PRN)
+        self._snr_max = array.array('B', [0] * MAX_PRN)
+        self._histogram = array.array(
+            'L', [0] * (NUM_ELEVATION_BUCKETS * NUM_SNR_BUCKETS))
+        # pdop, hdop, vdop interleaved
+        self._dop = array.array('f', [0] * (3 * self.dop_history))
+        self._dop_index = 0
+        self._dop_count = 0
+        self._sequence = []
+        self.in_view = []
+
+    def add_gsv(self, gpgsv_dict):
+        """Adds a GPGSV dictionary (see `l80gps.gpgsv_as_dict`).
+
+        Satellites without an SNR are in view but not being tracked, they
+        only appear in `in_view`. `in_view` is updated once the last
+        message of a GPGSV sequence has been added.
+        """
+        sequence_num = _int(gpgsv_dict['sequence_num'])
+        num_messages = _int(gpgsv_dict['num_messages'])
+        if sequence_num == 1:
+            self._sequence = []
+        for satellite in gpgsv_dict['satellite']:
+            prn = _int(satellite['id'])
+            if prn is None or not 0 < prn < MAX_PRN:
+                continue
+            elevation = _int(satellite['elevation'])
+            snr = _int(satellite['snr'])
+            self._sequence.append((prn, elevation, snr))
+            if snr is not None:
+                self._add_snr(prn, elevation, snr)
+        if sequence_num is not None and sequence_num == num_messages:
+            self.in_view = self._sequence
+            self._sequence = []
+
+    def add_gsa(self, gpgsa_dict):
+        """Adds a GPGSA dictionary (see `l80gps.gpgsa_as_dict`). Messages
+        without DOP values (no fix) are ignored.
+        """
+        try:
+            dops = [float(gpgsa_dict[k]) for k in ('pdop', 'hdop', 'vdop')]
+        except ValueError:
+            return
+        i = 3 * self._dop_index
+        self._dop[i:i+3] = array.array('f', dops)
+        self._dop_index = (self._dop_index + 1) % self.dop_history
+        self._dop_count = min(self._dop_count + 1, self.dop_history)
+
+    def snapshot(self):
+        """Returns a dictionary of the current statistics:
+
+            {'satellites': {prn: {'count': int,
+                                  'snr_mean': float,
+                                  'snr_min': int,
+                                  'snr_max': int}},
+             'elevation_histogram': [[count per SNR bucket]
+                                     for each elevation bucket],
+             'dop': [(pdop, hdop, vdop), ...],  # oldest first
+             'in_view': [(prn, elevation, snr), ...]}
+
+        """
+        count = self._snr_count
+        satellites = {prn: {'count': count[prn],
+                            'snr_mean': self._snr_sum[prn] / count[prn],
+                            'snr_min': self._snr_min[prn],
+                            'snr_max': self._snr_max[prn]}
+                      for prn in range(MAX_PRN) if count[prn]}
+        histogram = [self._histogram[i:i+NUM_SNR_BUCKETS].tolist()
+                     for i in range(0, len(self._histogram), NUM_SNR_BUCKETS)]
+        return {'satellites': satellites,
+                'elevation_histogram': histogram,
+                'dop': self.get_dop(),
+                'in_view': list(self.in_view)}
+
+    def get_dop(self):
+        """Returns the DOP history as a list of (pdop, hdop, vdop),
+        oldest first.
+        """
+        if self._dop_count < self.dop_history:
+            order = range(self._dop_count)
+        else:
+            order = [(self._dop_index + i) % self.dop_history
+                     for i in range(self.dop_history)]
+        dop = self._dop
+        return [(dop[3*i], dop[3*i+1], dop[3*i+2]) for i in order]
+
+    def _add_snr(self, prn, elevation, snr):
+        self._snr_count[prn] += 1
+        self._snr_sum[prn] += snr
+        snr = min(snr, 255)
+        if snr < self._snr_min[prn]:
+            self._snr_min[prn] = snr
+        if snr > self._snr_max[prn]:
+            self._snr_max[prn] = snr
+        if elevation is not None:
+            e = min(max(elevation, 0) // ELEVATION_BUCKET,
+                    NUM_ELEVATION_BUCKETS - 1)
+            s = min(snr // SNR_BUCKET, NUM_SNR_BUCKETS - 1)
+            self._histogram[e * NUM_SNR_BUCKETS + s] += 1
+
+
+def _int(s):
+    """Returns s as an int or None if it is blank."""
+    return None if s in ('', None) else int(s)
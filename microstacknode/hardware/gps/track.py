@@ -0,0 +1,282 @@
+"""Streaming track simplification and export (GPX, GeoJSON).
+
+Points are the dictionaries returned by `L80GPS.get_gprmc()`,
+`L80GPS.get_gpgll()` or `parse_locus_data()` -- anything with a
+'latitude' and 'longitude' key (in degrees). Nothing here keeps the whole
+track in memory so it can be used for multi-day sessions:
+
+    >>> with open('walk.gpx', 'w') as f, GPXWriter(f) as gpx:
+    ...     write_track(points, gpx, tolerance=5)
+
+"""
+import json
+import math
+import datetime
+
+
+EARTH_RADIUS = 6371008.8  # metres (mean radius)
+DEFAULT_TOLERANCE = 5.0  # metres
+DEFAULT_WINDOW = 64  # points
+
+
+class TrackSimplifier(object):
+    """Online line simplification with a bounded window.
+
+    This is an opening window version of Douglas-Peucker: points are
+    collected after the last kept point (the anchor) until one of them is
+    further than `tolerance` metres from the line between the anchor and
+    the newest point, or until `window` points are held. The previous point
+    is then kept and becomes the new anchor. Memory (and work per point)
+    is bounded by `window` no matter how long the track is.
+
+    :param tolerance: Maximum distance (metres) a dropped point may be from
+                      the simplified track.
+    :type tolerance: float
+    :param window: Maximum number of points held before one is forced out.
+    :type window: int
+    """
+
+    def __init__(self, tolerance=DEFAULT_TOLERANCE, window=DEFAULT_WINDOW):
+        if window < 2:
+            raise ValueError("window must be at least 2 points.")
+        self.tolerance = tolerance
+        self.window = window
+        self._anchor = None
+        self._candidates = []
+
+    def add(self, point):
+        """Adds a point to the track and returns a list of the points that
+        are now known to be part of the simplified track (usually empty).
+        """
+        if self._anchor is None:
+            self._anchor = point
+            return [point]
+
+        self._candidates.append(point)
+        if len(self._candidates) < 2:
+            return []
+
+        if (len(self._candidates) >= self.window or
+                self._max_deviation(point) > self.tolerance):
+            kept = self._candidates[-2]
+            self._anchor = kept
+            self._candidates = [point]
+            return [kept]
+        else:
+            return []
+
+    def flush(self):
+        """Returns the points still held back (the last point of the track)
+        and resets the simplifier.
+        """
+        remaining = self._candidates[-1:]
+        self._anchor = None
+        self._candidates = []
+        return remaining
+
+    def _max_deviation(self, end):
+        """Returns the largest distance (metres) from the line
+        anchor -> end of the points held between them.
+        """
+        origin = self._anchor
+        ex, ey = _project(end, origin)
+        return max(_segment_distance(_project(p, origin), (ex, ey))
+                   for p in self._candidates[:-1])
+
+
+def simplify(points, tolerance=DEFAULT_TOLERANCE, window=DEFAULT_WINDOW):
+    """Generator that yields the simplified points of the `points` iterable.
+
+    See `TrackSimplifier`.
+    """
+    simplifier = TrackSimplifier(tolerance, window)
+    for point in points:
+        yield from simplifier.add(point)
+    yield from simplifier.flush()
+
+
+class GPXWriter(object):
+    """Writes a GPX 1.1 track to a text file one point at a time.
+
+    :param f: File (opened in text mode) to write to.
+    :param name: Optional name of the track.
+    :type name: str
+    """
+
+    def __init__(self, f, name=None):
+        self.f = f
+        self.name = name
+        self._started = False
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def open(self):
+        """Writes the GPX header."""
+        self.f.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+                     '<gpx version="1.1" creator="microstacknode" '
+                     'xmlns="http://www.topografix.com/GPX/1/1">\n'
+                     '<trk>\n')
+        if self.name is not None:
+            self.f.write('<name>{}</name>\n'.format(_xml_escape(self.name)))
+        self.f.write('<trkseg>\n')
+        self._started = True
+
+    def write_point(self, point):
+        """Writes a single track point."""
+        self.f.write('<trkpt lat="{:.7f}" lon="{:.7f}">'.format(
+            point['latitude'], point['longitude']))
+        elevation = _point_elevation(point)
+        if elevation is not None:
+            self.f.write('<ele>{}</ele>'.format(elevation))
+        time = point_datetime(point)
+        if time is not None:
+            self.f.write('<time>{}Z</time>'.format(time.isoformat()))
+        self.f.write('</trkpt>\n')
+
+    def close(self):
+        """Writes the GPX footer. Does not close the underlying file."""
+        if self._started:
+            self.f.write('</trkseg>\n</trk>\n</gpx>\n')
+            self._started = False
+
+
+class GeoJSONWriter(object):
+    """Writes a GeoJSON Feature with a LineString geometry to a text file
+    one point at a time.
+
+    :param f: File (opened in text mode) to write to.
+    :param properties: Properties of the feature.
+    :type properties: dict
+    """
+
+    def __init__(self, f, properties=None):
+        self.f = f
+        self.properties = {} if properties is None else properties
+        self._started = False
+        self._first = True
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def open(self):
+        """Writes the start of the feature."""
+        self.f.write('{"type": "Feature", '
+                     '"geometry": {"type": "LineString", "coordinates": [')
+        self._started = True
+        self._first = True
+
+    def write_point(self, point):
+        """Writes a single position."""
+        position = [round(point['longitude'], 7),
+                    round(point['latitude'], 7)]
+        elevation = _point_elevation(point)
+        if elevation is not None:
+            position.append(elevation)
+        if not self._first:
+            self.f.write(', ')
+        self.f.write(json.dumps(position))
+        self._first = False
+
+    def close(self):
+        """Writes the end of the feature. Does not close the underlying
+        file.
+        """
+        if self._started:
+            self.f.write(']}, "properties": ' +
+                         json.dumps(self.properties) + '}\n')
+            self._started = False
+
+
+def write_track(points, writer, tolerance=None, window=DEFAULT_WINDOW):
+    """Writes every point in the `points` iterable with `writer`,
+    simplifying them first if a `tolerance` (metres) is given. Returns the
+    number of points written.
+    """
+    if tolerance is not None:
+        points = simplify(points, tolerance, window)
+    count = 0
+    for point in points:
+        writer.write_point(point)
+        count += 1
+    return count
+
+
+def point_datetime(point):
+    """Returns the time of a point as a datetime (UTC) or None.
+
+    LOCUS points store a datetime in 'utc'. GPRMC points store hhmmss.sss
+    in 'utc' and ddmmyy in 'date'.
+    """
+    utc = point.get('utc')
+    if isinstance(utc, datetime.datetime):
+        return utc
+    date = point.get('date')
+    if not date or utc is None:
+        return None
+    hhmmss = float(utc)
+    hours = int(hhmmss / 10000)
+    minutes = int(hhmmss / 100) % 100
+    seconds = round(hhmmss % 100, 3)
+    return (datetime.datetime(2000 + int(date[4:6]),
+                              int(date[2:4]),
+                              int(date[0:2]),
+                              hours,
+                              minutes) +
+            datetime.timedelta(seconds=seconds))
+
+
+def distance(a, b):
+    """Returns the distance in metres between two points (haversine)."""
+    lat1 = math.radians(a['latitude'])
+    lat2 = math.radians(b['latitude'])
+    dlat = lat2 - lat1
+    dlon = math.radians(b['longitude'] - a['longitude'])
+    h = (math.sin(dlat / 2) ** 2 +
+         math.cos(lat1) * math.cos(lat2) * math.sin(dlon / 2) ** 2)
+    return 2 * EARTH_RADIUS * math.asin(min(1, math.sqrt(h)))
+
+
+def _project(point, origin):
+    """Returns (x, y) in metres of point relative to origin using an
+    equirectangular projection (fine over the short spans of a window).
+    """
+    lat0 = math.radians(origin['latitude'])
+    x = (math.radians(point['longitude'] - origin['longitude']) *
+         math.cos(lat0) * EARTH_RADIUS)
+    y = math.radians(point['latitude'] - origin['latitude']) * EARTH_RADIUS
+    return x, y
+
+
+def _segment_distance(p, end):
+    """Returns the distance from p to the segment (0, 0) -> end."""
+    px, py = p
+    ex, ey = end
+    length_sq = ex * ex + ey * ey
+    if length_sq == 0:
+        return math.hypot(px, py)
+    t = max(0, min(1, (px * ex + py * ey) / length_sq))
+    return math.hypot(px - t * ex, py - t * ey)
+
+
+def _point_elevation(point):
+    """Returns the altitude of a point as a float or None."""
+    altitude = point.get('altitude')
+    if altitude in (None, ''):
+        return None
+    return float(altitude)
+
+
+def _xml_escape(s):
+    return (s.replace('&', '&amp;')
+             .replace('<', '&lt;')
+             .replace('>', '&gt;')
+             .replace('"', '&quot;'))
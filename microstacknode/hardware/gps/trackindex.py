@@ -0,0 +1,195 @@
+"""Time and proximity index over recorded GPS fixes.
+
+The index answers "where was the unit at time T" (binary search over a
+sorted time array with linear interpolation) and "when did it pass near
+point P" (a grid of latitude/longitude cells). It can be persisted to a
+file next to the track data; each fix is appended (and flushed) to that
+file as it is added so the index is built incrementally and survives a
+crash:
+
+    >>> index = TrackIndex('walk.gpx.idx')
+    >>> index.add(gps.get_gprmc())
+    >>> index.position_at(datetime.datetime(2016, 4, 22, 13, 37))
+    >>> index.passes_near({'latitude': 52.2, 'longitude': 0.12}, 50)
+
+"""
+import os
+import math
+import array
+import bisect
+import struct
+import datetime
+from microstacknode.hardware.gps.track import (point_datetime,
+                                               distance,
+                                               EARTH_RADIUS)
+
+
+DEFAULT_CELL_SIZE = 0.001  # degrees (about 111 m of latitude)
+INDEX_RECORD = struct.Struct('<ddd')  # time, latitude, longitude
+EPOCH = datetime.datetime(1970, 1, 1)
+
+
+class TrackIndex(object):
+    """Index over fixes (dictionaries with 'latitude', 'longitude' and a
+    time -- see `track.point_datetime`). Fixes must be added in time order.
+
+    :param path: File the index is persisted to (optional). Existing
+                 records are loaded and new ones are appended.
+    :type path: str
+    :param cell_size: Size of the proximity grid cells in degrees.
+    :type cell_size: float
+    """
+
+    def __init__(self, path=None, cell_size=DEFAULT_CELL_SIZE):
+        self.path = path
+        self.cell_size = cell_size
+        self.times = array.array('d')
+        self.latitudes = array.array('d')
+        self.longitudes = array.array('d')
+        self._grid = {}
+        self._file = None
+        if path is not None:
+            self._load()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        return len(self.times)
+
+    def close(self):
+        """Closes the index file."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def add(self, point):
+        """Adds a fix to the index. Fixes without a time are ignored.
+
+        :raises: ValueError if the fix is older than the last one added.
+        """
+        time = point_datetime(point)
+        if time is None:
+            return
+        self._append(_to_seconds(time),
+                     point['latitude'],
+                     point['longitude'],
+                     persist=True)
+        if self._file is not None:
+            self._file.flush()
+
+    def extend(self, points):
+        """Adds every fix in the `points` iterable."""
+        for point in points:
+            self.add(point)
+
+    def position_at(self, time):
+        """Returns the interpolated position at `time` (a datetime) as a
+        dictionary, or None if the time is outside the recorded track.
+        """
+        t = _to_seconds(time)
+        i = bisect.bisect_left(self.times, t)
+        if i >= len(self.times) or (i == 0 and self.times[0] != t):
+            return None
+        if self.times[i] == t:
+            latitude, longitude = self.latitudes[i], self.longitudes[i]
+        else:
+            t0, t1 = self.times[i - 1], self.times[i]
+            f = (t - t0) / (t1 - t0)
+            latitude = _lerp(self.latitudes[i - 1], self.latitudes[i], f)
+            longitude = _lerp(self.longitudes[i - 1], self.longitudes[i], f)
+        return {'utc': time, 'latitude': latitude, 'longitude': longitude}
+
+    def near(self, point, radius):
+        """Returns the indices (in time order) of the fixes within `radius`
+        metres of `point`.
+        """
+        # longitude cells shrink with the cosine of the latitude
+        dlat = math.degrees(radius / EARTH_RADIUS)
+        coslat = max(math.cos(math.radians(point['latitude'])), 1e-6)
+        dlon = dlat / coslat
+        lat_min, lat_max = self._cell(point['latitude'] - dlat), \
+            self._cell(point['latitude'] + dlat)
+        found = []
+        for west, east in _longitude_ranges(point['longitude'], dlon):
+            for i in range(lat_min, lat_max + 1):
+                for j in range(self._cell(west), self._cell(east) + 1):
+                    for k in self._grid.get((i, j), ()):
+                        fix = {'latitude': self.latitudes[k],
+                               'longitude': self.longitudes[k]}
+                        if distance(point, fix) <= radius:
+                            found.append(k)
+        return sorted(set(found))
+
+    def passes_near(self, point, radius):
+        """Returns a list of (start, end) datetimes for each time the track
+        was within `radius` metres of `point`.
+        """
+        passes = []
+        previous = None
+        for k in self.near(point, radius):
+            if previous is not None and k == previous + 1:
+                passes[-1][1] = k
+            else:
+                passes.append([k, k])
+            previous = k
+        return [(_from_seconds(self.times[start]),
+                 _from_seconds(self.times[end]))
+                for start, end in passes]
+
+    def _append(self, t, latitude, longitude, persist):
+        if self.times and t < self.times[-1]:
+            raise ValueError("Fixes must be added in time order.")
+        k = len(self.times)
+        self.times.append(t)
+        self.latitudes.append(latitude)
+        self.longitudes.append(longitude)
+        cell = (self._cell(latitude), self._cell(longitude))
+        self._grid.setdefault(cell, array.array('L')).append(k)
+        if persist and self._file is not None:
+            self._file.write(INDEX_RECORD.pack(t, latitude, longitude))
+
+    def _cell(self, degrees):
+        return int(math.floor(degrees / self.cell_size))
+
+    def _load(self):
+        # created if missing, never truncated
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        self._file = os.fdopen(fd, 'r+b')
+        data = self._file.read()
+        # a partially written final record is ignored and the next record
+        # is written over it so they stay aligned
+        end = len(data) - (len(data) % INDEX_RECORD.size)
+        for t, latitude, longitude in INDEX_RECORD.iter_unpack(data[:end]):
+            self._append(t, latitude, longitude, persist=False)
+        self._file.seek(end)
+
+
+def _to_seconds(time):
+    """Seconds since the epoch of a naive datetime (taken as UTC)."""
+    return (time - EPOCH).total_seconds()
+
+
+def _from_seconds(t):
+    return EPOCH + datetime.timedelta(seconds=t)
+
+
+def _longitude_ranges(longitude, dlon):
+    """Returns the (west, east) longitude ranges within dlon degrees of
+    longitude, split where they cross the antimeridian.
+    """
+    west, east = longitude - dlon, longitude + dlon
+    if east - west >= 360:
+        return [(-180, 180)]
+    if west < -180:
+        return [(-180, east), (west + 360, 180)]
+    if east > 180:
+        return [(west, 180), (-180, east - 360)]
+    return [(west, east)]
+
+
+def _lerp(a, b, f):
+    return a + (b - a) * f
@@ -0,0 +1,175 @@
+"""Dew point, absolute humidity and heat index from temperature and
+relative humidity.
+
+One reading at a time:
+
+    >>> dew_point(23.4, 56.1)
+    14.14...
+
+Readings straight from the sensor words (memoized, the words repeat a
+lot so most calls are a lookup):
+
+    >>> with SHT21() as htsensor:
+    ...     metrics = metrics_from_words(*htsensor.read_words())
+
+Many readings at once (with NumPy if it is installed):
+
+    >>> dew_points, absolute_humidities, heat_indices = batch_metrics(
+    ...     temperatures, humidities)
+
+"""
+import math
+import functools
+from microstacknode._optional import import_numpy
+from microstacknode.hardware.humiditytemperature.sht21 import (
+    STATUS_BITS,
+    temperature_from_word,
+    humidity_from_word)
+
+
+# Magnus formula coefficients (Sensirion, -45 C to 60 C)
+MAGNUS_B = 17.62
+MAGNUS_C = 243.12  # C
+MAGNUS_E0 = 6.112  # hPa
+# water vapour density (g/m^3) = ABSOLUTE_HUMIDITY_FACTOR * e (hPa) / T (K)
+ABSOLUTE_HUMIDITY_FACTOR = 216.7
+ZERO_CELSIUS = 273.15  # K
+# the dew point of 0 %RH is -infinity, lower humidities are clamped to this
+MIN_HUMIDITY = 0.1  # %RH
+WORD_CACHE_SIZE = 4096
+# NOAA heat index (Rothfusz regression, Fahrenheit)
+HEAT_INDEX_COEFFICIENTS = (-42.379, 2.04901523, 10.14333127, -0.22475541,
+                           -6.83783e-3, -5.481717e-2, 1.22874e-3,
+                           8.5282e-4, -1.99e-6)
+
+
+class PsychrometricMetrics(object):
+    """The metrics for one reading.
+
+    :param temperature: Temperature (C).
+    :type temperature: float
+    :param humidity: Relative humidity (%RH).
+    :type humidity: float
+    :param dew_point: Dew point (C).
+    :type dew_point: float
+    :param absolute_humidity: Absolute humidity (g/m^3).
+    :type absolute_humidity: float
+    :param heat_index: Heat index (C).
+    :type heat_index: float
+    """
+
+    def __init__(self, temperature, humidity, dew_point, absolute_humidity,
+                 heat_index):
+        self.temperature = temperature
+        self.humidity = humidity
+        self.dew_point = dew_point
+        self.absolute_humidity = absolute_humidity
+        self.heat_index = heat_index
+
+    def __repr__(self):
+        return ('PsychrometricMetrics(temperature={}, humidity={}, '
+                'dew_point={}, absolute_humidity={}, heat_index={})'.format(
+                    self.temperature, self.humidity, self.dew_point,
+                    self.absolute_humidity, self.heat_index))
+
+
+def metrics(temperature, humidity):
+    """Returns the `PsychrometricMetrics` for a reading."""
+    return PsychrometricMetrics(temperature,
+                                humidity,
+                                dew_point(temperature, humidity),
+                                absolute_humidity(temperature, humidity),
+                                heat_index(temperature, humidity))
+
+
+def metrics_from_words(temperature_word, humidity_word):
+    """Returns the `PsychrometricMetrics` for the raw measurement words
+    (see `SHT21.read_words()`). Results are cached on the words (without
+    their status bits), treat them as read only.
+    """
+    return _metrics_from_words(temperature_word & ~STATUS_BITS,
+                               humidity_word & ~STATUS_BITS)
+
+
+@functools.lru_cache(maxsize=WORD_CACHE_SIZE)
+def _metrics_from_words(temperature_word, humidity_word):
+    return metrics(temperature_from_word(temperature_word),
+                   humidity_from_word(humidity_word))
+
+
+def saturation_vapour_pressure(temperature):
+    """Returns the saturation vapour pressure (hPa) over water."""
+    return MAGNUS_E0 * math.exp(
+        MAGNUS_B * temperature / (MAGNUS_C + temperature))
+
+
+def dew_point(temperature, humidity):
+    """Returns the dew point (C)."""
+    humidity = min(max(humidity, MIN_HUMIDITY), 100)
+    gamma = (math.log(humidity / 100) +
+             MAGNUS_B * temperature / (MAGNUS_C + temperature))
+    return MAGNUS_C * gamma / (MAGNUS_B - gamma)
+
+
+def absolute_humidity(temperature, humidity):
+    """Returns the absolute humidity (g/m^3)."""
+    humidity = min(max(humidity, 0), 100)
+    vapour_pressure = humidity / 100 * saturation_vapour_pressure(
+        temperature)
+    return (ABSOLUTE_HUMIDITY_FACTOR * vapour_pressure /
+            (temperature + ZERO_CELSIUS))
+
+
+def heat_index(temperature, humidity):
+    """Returns the heat index (C), the NOAA formula."""
+    t = temperature * 9 / 5 + 32
+    rh = min(max(humidity, 0), 100)
+    index = 0.5 * (t + 61 + (t - 68) * 1.2 + rh * 0.094)
+    if (index + t) / 2 >= 80:
+        c = HEAT_INDEX_COEFFICIENTS
+        index = (c[0] + c[1] * t + c[2] * rh + c[3] * t * rh +
+                 c[4] * t * t + c[5] * rh * rh + c[6] * t * t * rh +
+                 c[7] * t * rh * rh + c[8] * t * t * rh * rh)
+        if rh < 13 and 80 <= t <= 112:
+            index -= (13 - rh) / 4 * math.sqrt((17 - abs(t - 95)) / 17)
+        elif rh > 85 and 80 <= t <= 87:
+            index += (rh - 85) / 10 * (87 - t) / 5
+    return (index - 32) * 5 / 9
+
+
+def batch_metrics(temperatures, humidities):
+    """Returns (dew points, absolute humidities, heat indices) for
+    sequences of temperatures and humidities. They are NumPy arrays if
+    NumPy is installed, otherwise lists.
+    """
+    numpy = import_numpy()
+    if numpy is None:
+        return ([dew_point(t, h) for t, h in zip(temperatures, humidities)],
+                [absolute_humidity(t, h)
+                 for t, h in zip(temperatures, humidities)],
+                [heat_index(t, h) for t, h in zip(temperatures, humidities)])
+    t = numpy.asarray(temperatures, dtype=float)
+    rh = numpy.clip(numpy.asarray(humidities, dtype=float), 0, 100)
+    magnus = MAGNUS_B * t / (MAGNUS_C + t)
+    # dew point
+    gamma = numpy.log(numpy.maximum(rh, MIN_HUMIDITY) / 100) + magnus
+    dew_points = MAGNUS_C * gamma / (MAGNUS_B - gamma)
+    # absolute humidity
+    vapour_pressure = rh / 100 * MAGNUS_E0 * numpy.exp(magnus)
+    absolute_humidities = (ABSOLUTE_HUMIDITY_FACTOR * vapour_pressure /
+                           (t + ZERO_CELSIUS))
+    # heat index
+    tf = t * 9 / 5 + 32
+    simple = 0.5 * (tf + 61 + (tf - 68) * 1.2 + rh * 0.094)
+    c = HEAT_INDEX_COEFFICIENTS
+    full = (c[0] + c[1] * tf + c[2] * rh + c[3] * tf * rh +
+            c[4] * tf * tf + c[5] * rh * rh + c[6] * tf * tf * rh +
+            c[7] * tf * rh * rh + c[8] * tf * tf * rh * rh)
+    dry = (rh < 13) & (tf >= 80) & (tf <= 112)
+    full[dry] -= ((13 - rh[dry]) / 4 *
+                  numpy.sqrt((17 - numpy.abs(tf[dry] - 95)) / 17))
+    humid = (rh > 85) & (tf >= 80) & (tf <= 87)
+    full[humid] += (rh[humid] - 85) / 10 * (87 - tf[humid]) / 5
+    heat_indices = numpy.where((simple + tf) / 2 >= 80, full, simple)
+    return dew_points, absolute_humidities, (heat_indices - 32) * 5 / 9
+
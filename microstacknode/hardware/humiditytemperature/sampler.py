@@ -0,0 +1,175 @@
+"""Adaptive sampling of an SHT21. Readings are only emitted when they have
+changed by more than a deadband or when `max_interval` has passed since
+the last one, and the sensor is read less often while nothing changes:
+
+    >>> with SHT21() as htsensor:
+    ...     for reading in AdaptiveSampler(htsensor):
+    ...         print(reading.timestamp, reading.temperature,
+    ...               reading.humidity)
+
+"""
+import time
+
+
+DEFAULT_TEMPERATURE_DEADBAND = 0.2  # C
+DEFAULT_HUMIDITY_DEADBAND = 1.0  # %RH
+DEFAULT_MIN_INTERVAL = 1  # seconds
+DEFAULT_MAX_INTERVAL = 300  # seconds
+# the interval grows at most this much per quiet reading
+GROWTH_FACTOR = 2
+# aim to read this fraction of a deadband's change per interval
+DEADBAND_FRACTION = 0.5
+
+
+class SHT21Reading(object):
+    """A temperature and humidity reading.
+
+    :param timestamp: `time.time()` of the reading.
+    :type timestamp: float
+    :param temperature: Temperature (C).
+    :type temperature: float
+    :param humidity: Relative humidity (%RH).
+    :type humidity: float
+    :param reason: 'change', 'max_interval' or 'first'.
+    :type reason: str
+    :param utc: GPS UTC time of the reading (seconds since the epoch) or
+                None (see `AdaptiveSampler`'s clock).
+    :type utc: float
+    """
+
+    def __init__(self, timestamp, temperature, humidity, reason, utc=None):
+        self.timestamp = timestamp
+        self.temperature = temperature
+        self.humidity = humidity
+        self.reason = reason
+        self.utc = utc
+
+    def __repr__(self):
+        return ('SHT21Reading(timestamp={}, temperature={}, humidity={}, '
+                'reason={!r}, utc={})'.format(self.timestamp,
+                                              self.temperature,
+                                              self.humidity,
+                                              self.reason,
+                                              self.utc))
+
+
+class AdaptiveSampler(object):
+    """Reads an SHT21 at an interval which follows the rate of change.
+
+    After each reading the interval is set so that (at the current rate of
+    change) about half a deadband's change is expected before the next
+    one, growing by at most `GROWTH_FACTOR` per reading and kept between
+    `min_interval` and `max_interval`. A reading is emitted if either
+    value has moved more than its deadband from the last emitted reading
+    or `max_interval` has passed since it.
+
+    `reads` and `emitted` count the sensor reads and emitted readings.
+
+    :param sensor: An open SHT21 (anything with `read_both()`).
+    :type sensor: SHT21
+    :param temperature_deadband: Temperature change to emit (C).
+    :type temperature_deadband: float
+    :param humidity_deadband: Humidity change to emit (%RH).
+    :type humidity_deadband: float
+    :param min_interval: Shortest time between reads (seconds).
+    :type min_interval: float
+    :param max_interval: Longest time between emitted readings (seconds).
+    :type max_interval: float
+    :param clock: If given (and synced) `sample()` sets the readings'
+                  `utc` from the `time.monotonic()` time they were read.
+    :type clock: gps.clocksync.GPSClock
+    """
+
+    def __init__(self,
+                 sensor,
+                 temperature_deadband=DEFAULT_TEMPERATURE_DEADBAND,
+                 humidity_deadband=DEFAULT_HUMIDITY_DEADBAND,
+                 min_interval=DEFAULT_MIN_INTERVAL,
+                 max_interval=DEFAULT_MAX_INTERVAL,
+                 clock=None):
+        if not 0 < min_interval <= max_interval:
+            raise ValueError(
+                "Intervals must satisfy 0 < min_interval <= max_interval.")
+        if temperature_deadband <= 0 or humidity_deadband <= 0:
+            raise ValueError("Deadbands must be positive.")
+        self.sensor = sensor
+        self.temperature_deadband = temperature_deadband
+        self.humidity_deadband = humidity_deadband
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.clock = clock
+        self.interval = min_interval
+        self.reads = 0
+        self.emitted = 0
+        self.last_emitted = None
+        self._previous = None  # last (timestamp, temperature, humidity)
+
+    def __iter__(self):
+        """Yields readings as they are emitted, sleeping in between."""
+        while True:
+            reading = self.sample()
+            if reading is not None:
+                yield reading
+            time.sleep(self.next_delay())
+
+    def sample(self):
+        """Reads the sensor and returns a `SHT21Reading` if it should be
+        emitted or None.
+        """
+        temperature, humidity = self.sensor.read_both()
+        monotonic_ts = time.monotonic()
+        reading = self.update(time.time(), temperature, humidity)
+        clock = self.clock
+        if reading is not None and clock is not None and clock.synced:
+            reading.utc = clock.to_utc(monotonic_ts)
+        return reading
+
+    def update(self, timestamp, temperature, humidity):
+        """Updates the interval with a reading and returns a `SHT21Reading`
+        if it should be emitted or None.
+        """
+        self.reads += 1
+        self._adapt(timestamp, temperature, humidity)
+        last = self.last_emitted
+        if last is None:
+            reason = 'first'
+        elif (abs(temperature - last.temperature) >
+                self.temperature_deadband or
+                abs(humidity - last.humidity) > self.humidity_deadband):
+            reason = 'change'
+        elif timestamp - last.timestamp >= self.max_interval:
+            reason = 'max_interval'
+        else:
+            return None
+        self.emitted += 1
+        self.last_emitted = SHT21Reading(
+            timestamp, temperature, humidity, reason)
+        return self.last_emitted
+
+    def next_delay(self):
+        """Returns the time (seconds) until the next read: the interval,
+        shortened so that `max_interval` is not missed.
+        """
+        delay = self.interval
+        if self.last_emitted is not None:
+            due = self.last_emitted.timestamp + self.max_interval
+            delay = min(delay, due - time.time())
+        return max(delay, 0)
+
+    def _adapt(self, timestamp, temperature, humidity):
+        previous = self._previous
+        self._previous = (timestamp, temperature, humidity)
+        if previous is None:
+            return
+        elapsed = timestamp - previous[0]
+        if elapsed <= 0:
+            return
+        # fraction of a deadband per second, the faster channel decides
+        rate = max(
+            abs(temperature - previous[1]) / self.temperature_deadband,
+            abs(humidity - previous[2]) / self.humidity_deadband) / elapsed
+        interval = self.interval * GROWTH_FACTOR
+        if rate > 0:
+            interval = min(interval, DEADBAND_FRACTION / rate)
+        self.interval = min(max(interval, self.min_interval),
+                            self.max_interval)
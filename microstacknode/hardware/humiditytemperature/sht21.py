@@ -1,5 +1,7 @@
 import time
+import errno
 from microstackcommon.i2c import I2CMaster, writing_bytes, writing, reading
+from microstacknode.hardware.i2cbus import PRIORITY_SENSOR
 
 
 DEFAULT_I2C_BUS = 1
@@ -9,24 +11,77 @@ DEFAULT_I2C_ADDRESS = 0x40
 CMD_SOFTRESET = 0xFE
 CMD_TEMPERATURE_NO_HOLD = 0xF3
 CMD_HUMIDITY_NO_HOLD = 0xF5
+CMD_WRITE_USER_REGISTER = 0xE6
+CMD_READ_USER_REGISTER = 0xE7
+RESET_TIME = 0.050  # seconds
+
+# user register
+USER_REGISTER_RESOLUTION_MASK = 0x81  # bits 7 and 0
+USER_REGISTER_END_OF_BATTERY = 0x40
+USER_REGISTER_HEATER = 0x04
+USER_REGISTER_DISABLE_OTP_RELOAD = 0x02
+# (humidity bits, temperature bits): resolution bits in the user register
+RESOLUTIONS = {(12, 14): 0x00,
+               (8, 12): 0x01,
+               (10, 13): 0x80,
+               (11, 11): 0x81}
+DEFAULT_RESOLUTION = (12, 14)
+
+# conversion times in seconds (typical, maximum) from the datasheet
+TEMPERATURE_TIMES = {14: (0.066, 0.085),
+                     13: (0.033, 0.043),
+                     12: (0.017, 0.022),
+                     11: (0.009, 0.011)}
+HUMIDITY_TIMES = {12: (0.022, 0.029),
+                  11: (0.012, 0.015),
+                  10: (0.007, 0.009),
+                  8: (0.003, 0.004)}
+# the two least significant bits of a measurement are status, not data
+STATUS_BITS = 0x0003
+POLL_INTERVAL = 0.002  # seconds between reads while the sensor NACKs
+# errors the I2C drivers report when the sensor NACKs a read
+NACK_ERRNOS = (errno.EREMOTEIO, errno.ENXIO, errno.EIO)
 
 
 class ChecksumFailedError(Exception):
     pass
 
 
+class MeasurementError(Exception):
+    pass
+
+
 class SHT21():
-    """SHT21 temperature and humidity sensor."""
+    """SHT21 temperature and humidity sensor.
+
+    :param i2c_master: The I2C bus the sensor is on
+                       (default: `I2CMaster(DEFAULT_I2C_BUS)`, created when
+                       the SHT21 is).
+    :type i2c_master: I2CMaster
+    :param bus_manager: Shared bus to use instead of i2c_master (see
+                        `microstacknode.hardware.i2cbus`).
+    :type bus_manager: I2CBusManager
+    """
 
     def __init__(self,
-                 i2c_master=I2CMaster(DEFAULT_I2C_BUS),
+                 i2c_master=None,
                  i2c_reading=reading,
                  i2c_writing_bytes=writing_bytes,
-                 i2c_addr=DEFAULT_I2C_ADDRESS):
+                 i2c_addr=DEFAULT_I2C_ADDRESS,
+                 bus_manager=None):
+        if bus_manager is not None:
+            i2c_master = bus_manager.device(i2c_addr, PRIORITY_SENSOR)
+        elif i2c_master is None:
+            i2c_master = I2CMaster(DEFAULT_I2C_BUS)
         self.i2c_master = i2c_master
         self.i2c_reading = i2c_reading
         self.i2c_writing_bytes = i2c_writing_bytes
         self.i2c_addr = i2c_addr
+        self.resolution = DEFAULT_RESOLUTION
+        self._measurement_times = _measurement_times(DEFAULT_RESOLUTION)
+        self._measurement = None  # command of the measurement in progress
+        self._measurement_start = None
+        self._last_measurement = None
 
     def __enter__(self):
         self.i2c_master = self.i2c_master.__enter__()
@@ -37,37 +92,230 @@ class SHT21():
         self.i2c_master.__exit__(*args)
 
     def reset(self):
-        """Resets the SHT12."""
+        """Resets the SHT12. This also sets the resolution back to the
+        default.
+        """
         self.i2c_master.transaction(
             self.i2c_writing_bytes(self.i2c_addr, CMD_SOFTRESET))
-        time.sleep(0.050)
+        time.sleep(RESET_TIME)
+        self._set_measurement_times(DEFAULT_RESOLUTION)
 
-    def get_temperature(self):
-        """Reads the temperature from the sensor. This call blocks
-        for 250ms to allow the sensor to return the data.
+    def read_user_register(self):
+        """Returns the user register."""
+        return self.i2c_master.transaction(
+            self.i2c_writing_bytes(self.i2c_addr, CMD_READ_USER_REGISTER),
+            self.i2c_reading(self.i2c_addr, 1))[0][0]
+
+    def write_user_register(self, value):
+        """Writes the user register. Bits 3 to 5 are reserved, read the
+        register and change only the bits you need (see
+        `update_user_register()`).
         """
         self.i2c_master.transaction(
-            self.i2c_writing_bytes(self.i2c_addr, CMD_TEMPERATURE_NO_HOLD))
-        time.sleep(0.250)
-        data = self.i2c_master.transaction(
-            self.i2c_reading(self.i2c_addr, 3))[0]
-        if _calculate_checksum(data, 2) != data[2]:
-            raise ChecksumFailedError("Temperature checksum failed.")
-        else:
-            return _get_temperature_from_buffer(data)
+            self.i2c_writing_bytes(self.i2c_addr,
+                                   CMD_WRITE_USER_REGISTER,
+                                   value))
+        self._set_measurement_times(_resolution(value))
+
+    def update_user_register(self, mask, value):
+        """Sets the bits in mask to value (read, modify, write)."""
+        register = self.read_user_register()
+        self.write_user_register((register & ~mask) | (value & mask))
+
+    def set_resolution(self, humidity_bits=12, temperature_bits=14):
+        """Sets the measurement resolution. Lower resolutions convert
+        faster and the measurement waits are shortened to suit.
+
+        ======== =========== ===================
+        Humidity Temperature Conversion (ms max)
+        ======== =========== ===================
+        12 bit   14 bit      29 + 85
+        11 bit   11 bit      15 + 11
+        10 bit   13 bit      9 + 43
+        8 bit    12 bit      4 + 22
+        ======== =========== ===================
+
+        :param humidity_bits: 12, 11, 10 or 8
+        :type humidity_bits: int
+        :param temperature_bits: 14, 11, 13 or 12 (to match humidity_bits)
+        :type temperature_bits: int
+        """
+        resolution = (humidity_bits, temperature_bits)
+        if resolution not in RESOLUTIONS:
+            raise ValueError(
+                "Resolution must be one of {}.".format(
+                    sorted(RESOLUTIONS, reverse=True)))
+        self.update_user_register(USER_REGISTER_RESOLUTION_MASK,
+                                  RESOLUTIONS[resolution])
+
+    def get_resolution(self):
+        """Returns the resolution (humidity bits, temperature bits) read
+        from the sensor.
+        """
+        resolution = _resolution(self.read_user_register())
+        self._set_measurement_times(resolution)
+        return resolution
+
+    def _set_measurement_times(self, resolution):
+        self.resolution = resolution
+        self._measurement_times = _measurement_times(resolution)
+
+    def get_temperature(self):
+        """Reads the temperature from the sensor. This call blocks until
+        the measurement is ready (about 66 ms at full resolution).
+        """
+        self.start_measurement(CMD_TEMPERATURE_NO_HOLD)
+        return self.wait_measurement()
 
     def get_humidity(self):
-        """Reads the humidity from the sensor. This call blocks
-        for 250ms to allow the sensor to return the data"""
+        """Reads the humidity from the sensor. This call blocks until
+        the measurement is ready (about 22 ms at full resolution).
+        """
+        self.start_measurement(CMD_HUMIDITY_NO_HOLD)
+        return self.wait_measurement()
+
+    def read_both(self):
+        """Returns (temperature, humidity). The humidity measurement is
+        started as soon as the temperature has been read, so this takes
+        about as long as the two conversions.
+        """
+        self.start_measurement(CMD_TEMPERATURE_NO_HOLD)
+        temperature_data = self._wait_data()
+        self.start_measurement(CMD_HUMIDITY_NO_HOLD)
+        # check the temperature while the humidity is converted
+        temperature = _convert(CMD_TEMPERATURE_NO_HOLD, temperature_data)
+        return temperature, self.wait_measurement()
+
+    def read_words(self):
+        """Returns the raw measurement words (temperature, humidity), see
+        `temperature_from_word()` and `humidity_from_word()`.
+        """
+        self.start_measurement(CMD_TEMPERATURE_NO_HOLD)
+        temperature_data = self._wait_data()
+        self.start_measurement(CMD_HUMIDITY_NO_HOLD)
+        temperature_word = _check(CMD_TEMPERATURE_NO_HOLD, temperature_data)
+        humidity_data = self._wait_data()
+        return (temperature_word,
+                _check(CMD_HUMIDITY_NO_HOLD, humidity_data))
+
+    def start_measurement(self, command):
+        """Starts a measurement and returns straight away. The result is
+        returned by `poll_measurement()` or `wait_measurement()`.
+
+        :param command: CMD_TEMPERATURE_NO_HOLD or CMD_HUMIDITY_NO_HOLD
+        :type command: int
+        """
         self.i2c_master.transaction(
-            self.i2c_writing_bytes(self.i2c_addr, CMD_HUMIDITY_NO_HOLD))
-        time.sleep(0.250)
-        data = self.i2c_master.transaction(
-            self.i2c_reading(self.i2c_addr, 3))[0]
-        if _calculate_checksum(data, 2) != data[2]:
-            raise ChecksumFailedError("Humidity checksum failed.")
+            self.i2c_writing_bytes(self.i2c_addr, command))
+        self._measurement = command
+        self._measurement_start = time.monotonic()
+
+    def poll_measurement(self):
+        """Returns the result of the measurement started with
+        `start_measurement()` or None if it is not ready yet.
+
+        The sensor NACKs reads while it is measuring, so a NACK means
+        not ready.
+
+        :raises: MeasurementError if no measurement was started or it is
+                 taking far too long, ChecksumFailedError
+        """
+        data = self._poll_data()
+        if data is None:
+            return None
+        return _convert(self._last_measurement, data)
+
+    def wait_measurement(self):
+        """Waits for the measurement started with `start_measurement()`
+        and returns its result.
+        """
+        data = self._wait_data()
+        return _convert(self._last_measurement, data)
+
+    def _wait_data(self):
+        """Sleeps for the typical conversion time and then polls the
+        sensor until it ACKs. Returns the raw data.
+        """
+        if self._measurement is None:
+            raise MeasurementError("No measurement started.")
+        typical, maximum = self._measurement_times[self._measurement]
+        delay = self._measurement_start + typical - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        while True:
+            data = self._poll_data()
+            if data is not None:
+                return data
+            time.sleep(POLL_INTERVAL)
+
+    def _poll_data(self):
+        command = self._measurement
+        if command is None:
+            raise MeasurementError("No measurement started.")
+        try:
+            data = self.i2c_master.transaction(
+                self.i2c_reading(self.i2c_addr, 3))[0]
+        except OSError as e:
+            if e.errno not in NACK_ERRNOS:
+                raise
+            typical, maximum = self._measurement_times[command]
+            if time.monotonic() - self._measurement_start > 2 * maximum:
+                self._measurement = None
+                raise MeasurementError("The sensor did not respond.")
+            return None
+        self._measurement = None
+        self._last_measurement = command
+        return data
+
+
+def _resolution(user_register):
+    """Returns the resolution set in the user register."""
+    bits = user_register & USER_REGISTER_RESOLUTION_MASK
+    for resolution, resolution_bits in RESOLUTIONS.items():
+        if bits == resolution_bits:
+            return resolution
+
+
+def _measurement_times(resolution):
+    """Returns the conversion times for each command at resolution."""
+    humidity_bits, temperature_bits = resolution
+    return {CMD_TEMPERATURE_NO_HOLD: TEMPERATURE_TIMES[temperature_bits],
+            CMD_HUMIDITY_NO_HOLD: HUMIDITY_TIMES[humidity_bits]}
+
+
+def _convert(command, data):
+    """Checks and converts the data read for a measurement."""
+    word = _check(command, data)
+    if command == CMD_TEMPERATURE_NO_HOLD:
+        return temperature_from_word(word)
+    else:
+        return humidity_from_word(word)
+
+
+def _check(command, data):
+    """Checks the data read for a measurement and returns its word."""
+    if _calculate_checksum(data, 2) != data[2]:
+        if command == CMD_TEMPERATURE_NO_HOLD:
+            raise ChecksumFailedError("Temperature checksum failed.")
         else:
-            return _get_humidity_from_buffer(data)
+            raise ChecksumFailedError("Humidity checksum failed.")
+    return (data[0] << 8) + data[1]
+
+
+def temperature_from_word(word):
+    """Returns the temperature in C for a measurement word:
+    T = -46.85 + 175.72 * ST / 2^16
+    where ST is the word with its status bits cleared.
+    """
+    return -46.85 + 175.72 * (word & ~STATUS_BITS) / (1 << 16)
+
+
+def humidity_from_word(word):
+    """Returns the relative humidity in percent for a measurement word:
+    RH = -6 + 125 * SRH / 2^16
+    where SRH is the word with its status bits cleared.
+    """
+    return -6 + 125.0 * (word & ~STATUS_BITS) / (1 << 16)
 
 
 def _calculate_checksum(data, nbrOfBytes):
@@ -84,28 +332,3 @@ def _calculate_checksum(data, nbrOfBytes):
             else:
                 crc = (crc << 1)
     return crc
-
-def _get_temperature_from_buffer(data):
-    """This function reads the first two bytes of data and
-    returns the temperature in C by using the following function:
-    T = =46.82 + (172.72 * (ST/2^16))
-    where ST is the value from the sensor
-    """
-    unadjusted = (data[0] << 8) + data[1]
-    unadjusted *= 175.72
-    unadjusted /= 1 << 16 # divide by 2^16
-    unadjusted -= 46.85
-    return unadjusted
-
-
-def _get_humidity_from_buffer(data):
-    """This function reads the first two bytes of data and returns
-    the relative humidity in percent by using the following function:
-    RH = -6 + (125 * (SRH / 2 ^16))
-    where SRH is the value read from the sensor
-    """
-    unadjusted = (data[0] << 8) + data[1]
-    unadjusted *= 125.0
-    unadjusted /= 1 << 16 # divide by 2^16
-    unadjusted -= 6
-    return unadjusted
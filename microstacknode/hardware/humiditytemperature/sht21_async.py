@@ -0,0 +1,136 @@
+"""An asyncio SHT21 driver. The conversion waits are `asyncio.sleep()`s
+so many sensors can be read from one event loop:
+
+    >>> async def read_sensors(sensors):
+    ...     return await asyncio.gather(*[s.read_both() for s in sensors])
+    ...
+    >>> async def main():
+    ...     async with AsyncSHT21(I2CMaster(1)) as first, \\
+    ...             AsyncSHT21(I2CMaster(3)) as second:
+    ...         print(await read_sensors([first, second]))
+
+The transactions are a few bytes and are performed directly (so they
+never interleave within an event loop) and the bus is free while the
+sensors convert. Each sensor holds its own lock from starting a
+measurement to reading its result, so several tasks can share a sensor.
+"""
+import time
+import asyncio
+from microstackcommon.i2c import writing_bytes, reading
+from microstacknode.hardware.humiditytemperature.sht21 import (
+    SHT21,
+    CMD_SOFTRESET,
+    CMD_TEMPERATURE_NO_HOLD,
+    CMD_HUMIDITY_NO_HOLD,
+    DEFAULT_I2C_ADDRESS,
+    DEFAULT_RESOLUTION,
+    POLL_INTERVAL,
+    RESET_TIME,
+    MeasurementError,
+    _convert)
+
+
+class AsyncSHT21(object):
+    """SHT21 temperature and humidity sensor for asyncio. It wraps an
+    `SHT21` (`sensor`), the transactions themselves are short (a few bytes)
+    and are performed directly.
+
+    Only one measurement can be in progress on a sensor, so the methods
+    which read it hold `lock` until they have the result. The lower level
+    `start_measurement()` and `wait_measurement()` don't, use them inside
+    `async with sensor.lock` if other tasks use the sensor.
+
+    :param i2c_master: The I2C bus the sensor is on
+                       (default: `I2CMaster(DEFAULT_I2C_BUS)`).
+    :type i2c_master: I2CMaster
+    :param bus_manager: Shared bus to use instead of i2c_master, its
+                        scheduling is blocking so it is only worth using
+                        to share the bus with other threads.
+    :type bus_manager: I2CBusManager
+    """
+
+    def __init__(self,
+                 i2c_master=None,
+                 i2c_reading=reading,
+                 i2c_writing_bytes=writing_bytes,
+                 i2c_addr=DEFAULT_I2C_ADDRESS,
+                 bus_manager=None):
+        self.sensor = SHT21(i2c_master,
+                            i2c_reading=i2c_reading,
+                            i2c_writing_bytes=i2c_writing_bytes,
+                            i2c_addr=i2c_addr,
+                            bus_manager=bus_manager)
+        self.lock = asyncio.Lock()
+
+    async def __aenter__(self):
+        self.sensor.i2c_master = self.sensor.i2c_master.__enter__()
+        await self.reset()
+        return self
+
+    async def __aexit__(self, *args):
+        self.sensor.i2c_master.__exit__(*args)
+
+    async def reset(self):
+        """Resets the SHT21 (and its resolution)."""
+        sensor = self.sensor
+        async with self.lock:
+            sensor.i2c_master.transaction(
+                sensor.i2c_writing_bytes(sensor.i2c_addr, CMD_SOFTRESET))
+            await asyncio.sleep(RESET_TIME)
+            sensor._set_measurement_times(DEFAULT_RESOLUTION)
+
+    async def set_resolution(self, humidity_bits=12, temperature_bits=14):
+        """See `SHT21.set_resolution()`."""
+        async with self.lock:
+            self.sensor.set_resolution(humidity_bits, temperature_bits)
+
+    async def get_resolution(self):
+        """See `SHT21.get_resolution()`."""
+        async with self.lock:
+            return self.sensor.get_resolution()
+
+    async def get_temperature(self):
+        """Returns the temperature in C."""
+        async with self.lock:
+            await self.start_measurement(CMD_TEMPERATURE_NO_HOLD)
+            return await self.wait_measurement()
+
+    async def get_humidity(self):
+        """Returns the relative humidity in percent."""
+        async with self.lock:
+            await self.start_measurement(CMD_HUMIDITY_NO_HOLD)
+            return await self.wait_measurement()
+
+    async def read_both(self):
+        """Returns (temperature, humidity), see `SHT21.read_both()`."""
+        async with self.lock:
+            await self.start_measurement(CMD_TEMPERATURE_NO_HOLD)
+            temperature_data = await self._wait_data()
+            await self.start_measurement(CMD_HUMIDITY_NO_HOLD)
+            temperature = _convert(CMD_TEMPERATURE_NO_HOLD, temperature_data)
+            return temperature, await self.wait_measurement()
+
+    async def start_measurement(self, command):
+        """See `SHT21.start_measurement()`."""
+        self.sensor.start_measurement(command)
+
+    async def wait_measurement(self):
+        """Waits for the measurement started with `start_measurement()`
+        and returns its result.
+        """
+        data = await self._wait_data()
+        return _convert(self.sensor._last_measurement, data)
+
+    async def _wait_data(self):
+        sensor = self.sensor
+        if sensor._measurement is None:
+            raise MeasurementError("No measurement started.")
+        typical, maximum = sensor._measurement_times[sensor._measurement]
+        delay = sensor._measurement_start + typical - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        while True:
+            data = sensor._poll_data()
+            if data is not None:
+                return data
+            await asyncio.sleep(POLL_INTERVAL)
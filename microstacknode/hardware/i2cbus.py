@@ -0,0 +1,297 @@
+"""Sharing an I2C bus between drivers and threads.
+
+An `I2CBusManager` opens the bus once for everything on it, performs one
+transaction at a time (highest priority first) and records how long each
+device waited for the bus and how long its transactions took:
+
+    >>> bus = get_bus_manager(1)
+    >>> with SSD1306_96x16(bus_manager=bus) as display, \\
+    ...         MMA8452Q(bus_manager=bus) as accelerometer, \\
+    ...         SHT21(bus_manager=bus) as htsensor:
+    ...     ...
+    >>> print(bus.stats)
+
+A transaction in progress is never interrupted, so a waiting sensor read
+is delayed by at most one transaction. The display splits its flushes
+into `ssd1306.MANAGED_DATA_CHUNK` byte transfers when it is managed.
+"""
+import time
+import heapq
+import itertools
+import threading
+from fcntl import ioctl
+from microstackcommon.i2c import I2CMaster, DEFAULT_BUS
+from microstackcommon.linux_i2c import I2C_RDWR
+
+
+# transaction priorities (lower goes first)
+PRIORITY_SENSOR = 0
+PRIORITY_NORMAL = 1
+PRIORITY_DISPLAY = 2
+
+_managers = {}
+_managers_lock = threading.Lock()
+
+
+def get_bus_manager(bus=DEFAULT_BUS):
+    """Returns the `I2CBusManager` shared by everything on I2C bus number
+    bus.
+    """
+    with _managers_lock:
+        try:
+            return _managers[bus]
+        except KeyError:
+            manager = _managers[bus] = I2CBusManager(bus)
+            return manager
+
+
+class DeviceStats(object):
+    """Transaction latency of one device (seconds)."""
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.total_transfer = 0.0
+        self.max_transfer = 0.0
+
+    @property
+    def mean_wait(self):
+        """Mean time spent waiting for the bus."""
+        return self.total_wait / self.count if self.count else 0.0
+
+    @property
+    def mean_transfer(self):
+        """Mean time the transactions took once they had the bus."""
+        return self.total_transfer / self.count if self.count else 0.0
+
+    def add(self, wait, transfer):
+        self.count += 1
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+        self.total_transfer += transfer
+        self.max_transfer = max(self.max_transfer, transfer)
+
+    def __repr__(self):
+        return ('DeviceStats(count={}, errors={}, mean_wait={:.6f}, '
+                'max_wait={:.6f}, mean_transfer={:.6f}, '
+                'max_transfer={:.6f})'.format(
+                    self.count, self.errors, self.mean_wait, self.max_wait,
+                    self.mean_transfer, self.max_transfer))
+
+
+class I2CBusManager(object):
+    """One open I2C bus shared by several devices and threads.
+
+    The bus is opened by the first `open()` and closed by the last
+    `close()`. Transactions are performed one at a time, waiting
+    transactions go in priority order and then in the order they arrived.
+    `stats` maps device addresses to their `DeviceStats`.
+
+    :param bus: The I2C bus number.
+    :type bus: int
+    :param i2c_master: The master to share (default: `I2CMaster(bus)`).
+    :type i2c_master: I2CMaster
+    """
+
+    def __init__(self, bus=DEFAULT_BUS, i2c_master=None):
+        if i2c_master is None:
+            i2c_master = I2CMaster(bus)
+        self.bus = bus
+        self.i2c_master = i2c_master
+        self.stats = {}
+        self._users = 0
+        self._condition = threading.Condition()
+        self._busy = False
+        self._waiting = []  # heap of (priority, arrival)
+        self._arrivals = itertools.count()
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @property
+    def fd(self):
+        return self.i2c_master.fd
+
+    def open(self):
+        """Opens the bus if nothing else has."""
+        with self._condition:
+            if self._users == 0:
+                self.i2c_master.open()
+            self._users += 1
+
+    def close(self):
+        """Closes the bus if nothing else is using it."""
+        with self._condition:
+            self._users -= 1
+            if self._users == 0:
+                self.i2c_master.close()
+
+    def device(self, address, priority=PRIORITY_NORMAL):
+        """Returns an `I2CDevice` for the device at address, which can be
+        passed to drivers in place of an I2CMaster.
+        """
+        return I2CDevice(self, address, priority)
+
+    def transaction(self, *msgs, priority=PRIORITY_NORMAL, address=None):
+        """Performs the messages as one transaction (see
+        `I2CMaster.transaction()`) when the bus is free.
+
+        :param priority: PRIORITY_SENSOR, PRIORITY_NORMAL or
+                         PRIORITY_DISPLAY
+        :type priority: int
+        :param address: The device the statistics are recorded against.
+        :type address: int
+        """
+        return self._perform(self.i2c_master.transaction, msgs,
+                             priority, address)
+
+    def rdwr(self, ioctl_data, priority=PRIORITY_NORMAL, address=None):
+        """Performs a prebuilt I2C_RDWR transfer when the bus is free."""
+        return self._perform(ioctl, (self.fd, I2C_RDWR, ioctl_data),
+                             priority, address)
+
+    def _perform(self, function, args, priority, address):
+        requested = time.monotonic()
+        self._acquire(priority)
+        started = time.monotonic()
+        failed = False
+        try:
+            return function(*args)
+        except OSError:
+            failed = True
+            raise
+        finally:
+            finished = time.monotonic()
+            self._release(address, started - requested, finished - started,
+                          failed)
+
+    def _acquire(self, priority):
+        with self._condition:
+            ticket = (priority, next(self._arrivals))
+            heapq.heappush(self._waiting, ticket)
+            while self._busy or self._waiting[0] != ticket:
+                self._condition.wait()
+            heapq.heappop(self._waiting)
+            self._busy = True
+
+    def _release(self, address, wait, transfer, failed):
+        with self._condition:
+            # recorded while the condition is held, so two threads using
+            # the same address can't lose counts
+            stats = self._device_stats(address)
+            stats.add(wait, transfer)
+            if failed:
+                stats.errors += 1
+            self._busy = False
+            self._condition.notify_all()
+
+    def _device_stats(self, address):
+        """Returns the `DeviceStats` of address (call it holding
+        `_condition`).
+        """
+        try:
+            return self.stats[address]
+        except KeyError:
+            stats = self.stats[address] = DeviceStats()
+            return stats
+
+
+class I2CDevice(object):
+    """A device on a managed bus. It has the parts of `I2CMaster` the
+    drivers use, so it can be passed to them in its place.
+
+    :param manager: The bus.
+    :type manager: I2CBusManager
+    :param address: The device's address.
+    :type address: int
+    :param priority: Priority of its transactions.
+    :type priority: int
+    """
+
+    def __init__(self, manager, address, priority=PRIORITY_NORMAL):
+        self.manager = manager
+        self.address = address
+        self.priority = priority
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @property
+    def bus(self):
+        return self.manager.bus
+
+    @property
+    def fd(self):
+        return self.manager.fd
+
+    def open(self):
+        self.manager.open()
+
+    def close(self):
+        self.manager.close()
+
+    def transaction(self, *msgs):
+        return self.manager.transaction(*msgs,
+                                        priority=self.priority,
+                                        address=self.address)
+
+
+class ManagedI2CMaster(I2CMaster):
+    """Base for drivers which are I2CMasters. Given a bus manager it opens
+    and closes the shared bus and schedules its transactions through it,
+    otherwise it is a plain I2CMaster.
+
+    Subclasses set `priority` and have an `i2c_address`.
+
+    :param bus: The I2C bus number (ignored if bus_manager is given).
+    :type bus: int
+    :param bus_manager: The shared bus.
+    :type bus_manager: I2CBusManager
+    """
+
+    priority = PRIORITY_NORMAL
+
+    def __init__(self, bus=DEFAULT_BUS, bus_manager=None):
+        if bus_manager is not None:
+            bus = bus_manager.bus
+        super().__init__(bus)
+        self.bus_manager = bus_manager
+
+    def open(self, extra_open_flags=0):
+        if self.bus_manager is None:
+            super().open(extra_open_flags)
+        else:
+            self.bus_manager.open()
+            self.fd = self.bus_manager.fd
+
+    def close(self):
+        if self.bus_manager is None:
+            super().close()
+        else:
+            self.bus_manager.close()
+
+    def transaction(self, *msgs):
+        if self.bus_manager is None:
+            return super().transaction(*msgs)
+        return self.bus_manager.transaction(*msgs,
+                                            priority=self.priority,
+                                            address=self.i2c_address)
+
+    def _rdwr(self, ioctl_data):
+        """Performs a prebuilt I2C transfer."""
+        if self.bus_manager is None:
+            ioctl(self.fd, I2C_RDWR, ioctl_data)
+        else:
+            self.bus_manager.rdwr(ioctl_data,
+                                  priority=self.priority,
+                                  address=self.i2c_address)
@@ -0,0 +1,88 @@
+"""An MMA8452Q which talks to a simulated register bank instead of the
+I2C bus, so the driver can be tested without the hardware.
+"""
+import ctypes
+from microstackcommon.linux_i2c import I2C_M_RD
+from microstacknode.hardware.accelerometer import mma8452q
+
+
+class FakeMMA8452Q(mma8452q.MMA8452Q):
+    """Messages are applied to `registers`. A write sets the register
+    pointer (first byte) and writes any following bytes with auto
+    increment. A read which is not preceded by a write in the same
+    transaction starts at 0x00, like the real chip.
+    """
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault('calibration_cache', None)
+        super().__init__(*args, **kwargs)
+        self.registers = bytearray(0x32)
+        self.registers[mma8452q.WHO_AM_I] = 0x2A
+        self.transactions = []
+
+    def open(self):
+        self.fd = None
+
+    def close(self):
+        pass
+
+    def set_xyz(self, x, y, z, status=0x0f):
+        """Sets the output registers to signed 12-bit counts."""
+        self.registers[mma8452q.STATUS] = status
+        for i, value in enumerate((x, y, z)):
+            word = (value & 0xfff) << 4
+            self.registers[1 + 2*i] = word >> 8
+            self.registers[2 + 2*i] = word & 0xff
+
+    def transaction(self, *msgs):
+        return self._apply(msgs)
+
+    def _rdwr(self, ioctl_data):
+        self._apply([ioctl_data.msgs[i] for i in range(ioctl_data.nmsgs)])
+
+    def _apply(self, msgs):
+        self.transactions.append(
+            [('r' if m.flags & I2C_M_RD else 'w', m.len) for m in msgs])
+        pointer = 0
+        results = []
+        for m in msgs:
+            if m.flags & I2C_M_RD:
+                data = bytearray()
+                for i in range(m.len):
+                    data.append(self.registers[pointer])
+                    pointer = self._next(pointer)
+                ctypes.memmove(m.buf, bytes(data), m.len)
+                results.append(bytes(data))
+            else:
+                data = ctypes.string_at(m.buf, m.len)
+                pointer = data[0]
+                for value in data[1:]:
+                    self.registers[pointer] = value
+                    pointer += 1
+        return results
+
+    def _next(self, pointer):
+        fast_read = self.registers[mma8452q.CTRL_REG1] & 0x02
+        if fast_read and pointer in (0x01, 0x03):
+            return pointer + 2
+        elif pointer == (0x05 if fast_read else 0x06):
+            return 0x00
+        else:
+            return pointer + 1
+
+
+class FakeInterrupt(object):
+    """Stands in for `detectors.GPIOInterrupt`. `wait()` calls `on_wait`
+    (to raise an event on the fake chip) and reports an edge.
+    """
+
+    def __init__(self, on_wait=None):
+        self.on_wait = on_wait
+        self.waits = 0
+
+    def wait(self, timeout=None):
+        self.waits += 1
+        if self.on_wait is not None:
+            self.on_wait()
+            return True
+        return False
@@ -0,0 +1,68 @@
+"""An I2C master with a simulated SHT21 on it, so the driver can be tested
+without the hardware.
+"""
+import errno
+from microstacknode.hardware.humiditytemperature import sht21
+
+
+def reading(addr, n_bytes):
+    return ('r', addr, n_bytes)
+
+
+def writing_bytes(addr, *data):
+    return ('w', addr, data)
+
+
+def measurement_data(word):
+    """Returns the three bytes the sensor sends for a 16-bit word."""
+    data = [word >> 8, word & 0xff]
+    return bytes(data + [sht21._calculate_checksum(data, 2)])
+
+
+class FakeSHT21Bus(object):
+    """Pass `reading` and `writing_bytes` from this module to the SHT21.
+    Each measurement NACKs `busy_reads` reads before returning its word
+    from `words` (keyed by command).
+    """
+
+    bus = 1
+
+    def __init__(self, busy_reads=2):
+        self.busy_reads = busy_reads
+        self.words = {sht21.CMD_TEMPERATURE_NO_HOLD: 0x6664,  # 23.4 C
+                      sht21.CMD_HUMIDITY_NO_HOLD: 0x7f2a}  # 56.1 %RH
+        self.user_register = 0x3a  # reset value
+        self.messages = []
+        self._command = None
+        self._busy = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def transaction(self, *msgs):
+        results = []
+        for msg in msgs:
+            self.messages.append(msg)
+            if msg[0] == 'w':
+                self._command = msg[2][0]
+                if self._command == sht21.CMD_WRITE_USER_REGISTER:
+                    self.user_register = msg[2][1]
+                elif self._command != sht21.CMD_READ_USER_REGISTER:
+                    self._busy = self.busy_reads
+            elif self._command == sht21.CMD_READ_USER_REGISTER:
+                results.append(bytes([self.user_register]))
+            elif self._busy:
+                self._busy -= 1
+                raise OSError(errno.EREMOTEIO, 'Remote I/O error')
+            else:
+                results.append(measurement_data(self.words[self._command]))
+        return results
+
+
+def fake_sht21(busy_reads=2):
+    return sht21.SHT21(FakeSHT21Bus(busy_reads),
+                       i2c_reading=reading,
+                       i2c_writing_bytes=writing_bytes)
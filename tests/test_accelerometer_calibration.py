@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+import os
+import sys
+parentdir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, parentdir)
+import tempfile
+import unittest
+from microstacknode.hardware.accelerometer import mma8452q
+from microstacknode.hardware.accelerometer.calibration import (calibrate,
+                                                               load_offsets)
+from fake_mma8452q import FakeMMA8452Q
+
+
+class TestCalibration(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = os.path.join(tempfile.mkdtemp(), 'cal', 'mma8452q.json')
+
+    def test_calibrate(self):
+        accelerometer = FakeMMA8452Q().__enter__()
+        accelerometer.set_xyz(10, -20, 1030)
+        offsets = calibrate(accelerometer, n_samples=4, cache=self.cache)
+        self.assertEqual(offsets, (-5, 10, -3))
+        self.assertEqual(list(accelerometer.registers[mma8452q.OFF_X:]),
+                         [0xfb, 10, 0xfd])
+        self.assertEqual(load_offsets(self.cache, 1, 0x1d), offsets)
+        self.assertIsNone(load_offsets(self.cache, 1, 0x1c))
+
+    def test_init_reloads_offsets(self):
+        accelerometer = FakeMMA8452Q().__enter__()
+        accelerometer.set_xyz(0, 0, 1024 - 4)
+        calibrate(accelerometer, n_samples=4, cache=self.cache)
+        accelerometer = FakeMMA8452Q(calibration_cache=self.cache)
+        accelerometer.__enter__()
+        self.assertEqual(accelerometer.offsets, (0, 0, 2))
+        self.assertEqual(accelerometer.registers[mma8452q.OFF_Z], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
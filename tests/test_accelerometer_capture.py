@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+import os
+import sys
+parentdir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, parentdir)
+import time
+import unittest
+from microstacknode.hardware.accelerometer import mma8452q
+from microstacknode.hardware.accelerometer.capture import (SampleRingBuffer,
+                                                           MMA8452QCapture,
+                                                           ShockTrigger)
+from microstacknode.hardware.gps.clocksync import GPSClock
+from fake_mma8452q import FakeMMA8452Q
+
+
+class FakeAccelerometer(object):
+    output_data_rate = 800
+    sleep_rate = None
+
+    def __init__(self, statuses):
+        self.statuses = statuses
+        self.n = 0
+
+    def get_xyz_into(self, out, raw=False):
+        status = self.statuses[self.n % len(self.statuses)]
+        self.n += 1
+        out[0], out[1], out[2] = self.n, -self.n, 1024
+        return status
+
+    def get_sample_rate(self, system_mode):
+        return self.output_data_rate
+
+
+class ClockedAccelerometer(object):
+    """Produces a sample every period on the real clock and takes
+    read_time to read (like an I2C transfer).
+    """
+    sleep_rate = None
+
+    def __init__(self, output_data_rate, read_time):
+        self.output_data_rate = output_data_rate
+        self.read_time = read_time
+        self.start = time.monotonic()
+        self.last = 0  # number of the last sample read
+
+    def get_xyz_into(self, out, raw=False):
+        time.sleep(self.read_time)
+        n = int((time.monotonic() - self.start) * self.output_data_rate)
+        status = 0
+        if n > self.last:
+            status = mma8452q.STATUS_ZYXDR
+            if n > self.last + 1:
+                status |= mma8452q.STATUS_ZYXOW
+        self.last = n
+        out[0], out[1], out[2] = n, 0, 1024
+        return status
+
+    def get_sample_rate(self, system_mode):
+        return self.output_data_rate
+
+
+class TestSampleRingBuffer(unittest.TestCase):
+
+    def test_read_block(self):
+        buffer = SampleRingBuffer(4)
+        for i in range(3):
+            buffer.write(i, -i, 1024, float(i))
+        samples, timestamps = buffer.read_block()
+        self.assertEqual(samples.tolist(), [0, 0, 1024, 1, -1, 1024,
+                                            2, -2, 1024])
+        self.assertEqual(timestamps.tolist(), [0.0, 1.0, 2.0])
+        self.assertEqual(len(buffer), 0)
+
+    def test_overrun_wraps(self):
+        buffer = SampleRingBuffer(4)
+        for i in range(6):
+            buffer.write(i, 0, 0, float(i))
+        self.assertEqual(buffer.overruns, 2)
+        samples, timestamps = buffer.read_block(max_samples=3)
+        self.assertEqual(samples[::3].tolist(), [2, 3, 4])
+        samples, timestamps = buffer.read_block()
+        self.assertEqual(timestamps.tolist(), [5.0])
+
+
+class TestShockTrigger(unittest.TestCase):
+
+    def setUp(self):
+        self.buffer = SampleRingBuffer(64)
+        self.n = 0
+
+    def write(self, n, x=0):
+        for i in range(n):
+            self.buffer.write(x, 0, 1024, self.n * 0.01)
+            self.n += 1
+
+    def test_pre_and_post_windows(self):
+        trigger = ShockTrigger(self.buffer, 1.5, axis='x', holdoff=1.0,
+                               pre_samples=8, post_samples=16)
+        self.write(40)
+        self.write(3, x=1800)
+        self.write(7)
+        self.assertEqual(trigger.poll(), [])
+        self.write(6)
+        (shock,) = trigger.poll()
+        self.assertEqual(len(shock.samples), 3 * 24)
+        self.assertEqual(shock.trigger_index, 8)
+        self.assertEqual(shock.samples[3 * 8], 1800)
+        self.assertEqual(shock.samples[3 * 7], 0)
+        self.assertAlmostEqual(shock.timestamp, 0.40)
+        self.assertAlmostEqual(shock.peak, 1800 / 1024)
+        # unread samples are not consumed
+        self.assertEqual(len(self.buffer), 56)
+
+    def test_holdoff_and_hysteresis(self):
+        trigger = ShockTrigger(self.buffer, 1.5, pre_samples=4,
+                               post_samples=4, holdoff=0.5)
+        for i in range(3):
+            self.write(20)
+            self.write(1, x=2000)
+            self.write(20)
+            self.assertEqual(len(trigger.poll()), 0 if i == 1 else 1)
+
+
+class TestMMA8452QCapture(unittest.TestCase):
+
+    def test_capture(self):
+        accelerometer = FakeAccelerometer([0x0f])
+        with MMA8452QCapture(accelerometer, capacity=1024) as capture:
+            time.sleep(0.05)
+        samples, timestamps = capture.buffer.read_block()
+        self.assertGreater(len(timestamps), 0)
+        self.assertEqual(samples[0:3].tolist(), [1, -1, 1024])
+        self.assertEqual(list(timestamps), sorted(timestamps))
+
+    def test_status_gating(self):
+        # ready, not ready, ready with a sample overwritten
+        accelerometer = FakeAccelerometer([0x0f, 0x00, 0x8f])
+        with MMA8452QCapture(accelerometer, capacity=1024) as capture:
+            time.sleep(0.05)
+        reads = accelerometer.n
+        samples, timestamps = capture.buffer.read_block()
+        self.assertEqual(samples[0:6].tolist(), [1, -1, 1024, 3, -3, 1024])
+        self.assertEqual(len(timestamps) + capture.not_ready, reads)
+        self.assertGreater(capture.buffer.dropped, 0)
+
+    def test_read_time_does_not_drift(self):
+        # reads take 30 % of a period, scheduling from the end of each read
+        # would fall a period behind every few samples
+        accelerometer = ClockedAccelerometer(100, 0.003)
+        with MMA8452QCapture(accelerometer) as capture:
+            time.sleep(0.6)
+        self.assertGreater(len(capture.buffer), 50)
+        self.assertLessEqual(capture.buffer.dropped, 1)
+
+    def test_to_utc(self):
+        clock = GPSClock()
+        clock.add_sample(0.0, 1461326400.0)
+        clock.add_sample(10.0, 1461326410.0)
+        capture = MMA8452QCapture(FakeAccelerometer([0x0f]), clock=clock)
+        self.assertEqual(capture.to_utc([1.0, 2.5]).tolist(),
+                         [1461326401.0, 1461326402.5])
+        with self.assertRaises(ValueError):
+            MMA8452QCapture(FakeAccelerometer([0x0f])).to_utc([1.0])
+
+    def test_follows_system_mode(self):
+        accelerometer = FakeMMA8452Q().__enter__()
+        with accelerometer.configure():
+            accelerometer.set_auto_sleep(sleep_rate=6.25, timeout=1)
+        registers = accelerometer.registers
+        registers[mma8452q.SYSMOD] = mma8452q.SYSMOD_SLEEP
+        registers[mma8452q.STATUS] = 0x00
+        with MMA8452QCapture(accelerometer) as capture:
+            time.sleep(0.05)
+            self.assertEqual(capture.system_mode, mma8452q.SYSMOD_SLEEP)
+            registers[mma8452q.SYSMOD] = mma8452q.SYSMOD_WAKE
+            registers[mma8452q.STATUS] = 0x0f
+            time.sleep(0.2)
+            self.assertEqual(capture.system_mode, mma8452q.SYSMOD_WAKE)
+        self.assertGreater(len(capture.buffer), 10)
+
+
+    def test_idle_while_asleep(self):
+        accelerometer = FakeMMA8452Q().__enter__()
+        with accelerometer.configure():
+            accelerometer.set_auto_sleep(sleep_rate=1.56, timeout=1)
+        registers = accelerometer.registers
+        registers[mma8452q.SYSMOD] = mma8452q.SYSMOD_SLEEP
+        registers[mma8452q.STATUS] = 0x00
+        with MMA8452QCapture(accelerometer) as capture:
+            time.sleep(0.1)
+            self.assertEqual(capture.system_mode, mma8452q.SYSMOD_SLEEP)
+            transfers = len(accelerometer.transactions)
+            time.sleep(1)
+            transfers = len(accelerometer.transactions) - transfers
+        # SYSMOD every SLEEP_POLL_INTERVAL and XYZ at 1.56 Hz
+        self.assertLessEqual(transfers, 10 + 2 + 2)
+        self.assertGreaterEqual(transfers, 8)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+import os
+import sys
+parentdir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, parentdir)
+import unittest
+from microstacknode.hardware.accelerometer import mma8452q
+from microstacknode.hardware.accelerometer.detectors import (
+    Detector, EventMonitor, MotionDetector, TapDetector, OrientationDetector)
+from fake_mma8452q import FakeMMA8452Q, FakeInterrupt
+
+
+class TestDetectors(unittest.TestCase):
+
+    def setUp(self):
+        self.accelerometer = FakeMMA8452Q().__enter__()
+        self.monitor = EventMonitor(self.accelerometer,
+                                    [MotionDetector(threshold=1.0),
+                                     TapDetector(threshold=2.0, double=True),
+                                     OrientationDetector(duration=0.1)])
+
+    def test_configure(self):
+        self.monitor.configure()
+        registers = self.accelerometer.registers
+        self.assertEqual(registers[mma8452q.FF_MT_CFG], 0xf8)
+        self.assertEqual(registers[mma8452q.FF_MT_THS], 16)
+        self.assertEqual(registers[mma8452q.PULSE_CFG], 0x7f)
+        self.assertEqual(registers[mma8452q.PL_COUNT], 80)
+        self.assertEqual(registers[mma8452q.CTRL_REG4], 0x1c)
+        self.assertEqual(registers[mma8452q.CTRL_REG5], 0x1c)
+        self.assertEqual(registers[mma8452q.CTRL_REG1] &
+                         mma8452q.CTRL_REG1_SET_ACTIVE, 1)
+
+    def test_read_events(self):
+        registers = self.accelerometer.registers
+        self.assertEqual(self.monitor.read_events(), [])
+        registers[mma8452q.INT_SOURCE] = \
+            mma8452q.INT_PULSE | mma8452q.INT_LNDPRT
+        registers[mma8452q.PULSE_SRC] = 0x80 | 0x40 | 0x08 | 0x04
+        registers[mma8452q.PL_STATUS] = 0x80 | 0x04 | 0x01
+        orientation, tap = sorted(self.monitor.read_events(),
+                                  key=lambda event: event.kind)
+        self.assertEqual(tap.axes, {'z': -1})
+        self.assertTrue(tap.double)
+        self.assertEqual(orientation.orientation, 'landscape right')
+        self.assertTrue(orientation.back)
+
+    def test_wait_for_interrupt(self):
+        registers = self.accelerometer.registers
+
+        def motion():
+            registers[mma8452q.INT_SOURCE] = mma8452q.INT_FF_MT
+            registers[mma8452q.FF_MT_SRC] = 0x80 | 0x02
+
+        interrupt = FakeInterrupt(motion)
+        self.monitor.interrupt = interrupt
+        events = self.monitor.wait()
+        self.assertEqual(interrupt.waits, 1)
+        self.assertEqual(events[0].kind, 'motion')
+        self.assertEqual(events[0].axes, {'x': 1})
+
+    def test_wait_timeout(self):
+        self.monitor.poll_interval = 0.001
+        self.assertEqual(self.monitor.wait(timeout=0.01), [])
+
+    def test_detector_is_abstract(self):
+        class NoDecode(Detector):
+            def registers(self, output_data_rate):
+                return {}
+        with self.assertRaises(TypeError):
+            NoDecode()
+        with self.assertRaises(TypeError):
+            Detector()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+import os
+import sys
+parentdir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, parentdir)
+import math
+import unittest
+from microstacknode import _optional
+from microstacknode.hardware.accelerometer.dsp import (Pipeline,
+                                                       LowPassFilter,
+                                                       HighPassFilter,
+                                                       WindowedStats,
+                                                       BandEnergies,
+                                                       Decimator,
+                                                       TiltAngles,
+                                                       deinterleave)
+
+
+def sine_counts(n, frequency=100, amplitude=512, offset=1024, rate=800):
+    """x: a sine wave, y: zero, z: a constant (counts)."""
+    samples = []
+    for i in range(n):
+        x = amplitude * math.sin(2 * math.pi * frequency * i / rate)
+        samples += [int(round(x)), 0, offset]
+    return samples
+
+
+class DSPTests(object):
+
+    def test_filters(self):
+        pipeline = Pipeline(filters=[LowPassFilter(20, 800)],
+                            analysers=[WindowedStats(400)])
+        highpass = Pipeline(filters=[HighPassFilter(5, 800)],
+                            analysers=[WindowedStats(400)])
+        samples = sine_counts(1600)
+        (stats,) = pipeline.process(samples)
+        rms, peak = stats[-1]
+        self.assertLess(rms[0], 0.02)  # 100 Hz attenuated
+        self.assertAlmostEqual(rms[2], 1.0, 3)  # DC (1 G) kept
+        (stats,) = highpass.process(samples)
+        rms, peak = stats[-1]
+        self.assertAlmostEqual(rms[0], 0.5 / math.sqrt(2), 2)
+        self.assertLess(rms[2], 0.01)
+
+    def test_blocks_match_whole(self):
+        samples = sine_counts(1000)
+        whole = Pipeline(filters=[HighPassFilter(5, 800)],
+                         analysers=[WindowedStats(100)])
+        split = Pipeline(filters=[HighPassFilter(5, 800)],
+                         analysers=[WindowedStats(100)])
+        expected = whole.process(samples)[0]
+        results = []
+        for start in range(0, len(samples), 3 * 77):
+            results += split.process(samples[start:start + 3 * 77])[0]
+        self.assertEqual(len(results), len(expected))
+        for (rms, peak), (rms2, peak2) in zip(results, expected):
+            for a, b in zip(rms, rms2):
+                self.assertAlmostEqual(a, b)
+
+    def test_band_energies(self):
+        bands = BandEnergies(800, [(80, 120), (200, 400)], window=64,
+                             overlap=0.5)
+        pipeline = Pipeline(analysers=[bands])
+        (frames,) = pipeline.process(sine_counts(160))
+        self.assertEqual(len(frames), 4)  # frames at 0, 32, 64, 96
+        x, y, z = frames[0]
+        self.assertAlmostEqual(x[0], 0.125, 3)  # (0.5 G) ** 2 / 2
+        self.assertAlmostEqual(x[1], 0, 6)
+        self.assertEqual(y, [0, 0])
+        (frames,) = pipeline.process(sine_counts(32))
+        self.assertEqual(len(frames), 1)
+
+    def test_decimator(self):
+        # 390 Hz is well above the 50 Hz output Nyquist frequency
+        samples = sine_counts(1600, frequency=390)
+        pipeline = Pipeline(filters=[Decimator(8)],
+                            analysers=[WindowedStats(100)])
+        (stats,) = pipeline.process(samples)
+        self.assertEqual(len(stats), 2)  # 200 output samples
+        rms, peak = stats[-1]
+        self.assertLess(rms[0], 0.01)
+        self.assertAlmostEqual(rms[2], 1.0, 3)
+
+    def test_decimator_blocks(self):
+        samples = sine_counts(500, frequency=20)
+        whole = Decimator(8).process(deinterleave(samples))
+        decimator = Decimator(8)
+        split = [[], [], []]
+        for start in range(0, len(samples), 3 * 37):
+            block = decimator.process(
+                deinterleave(samples[start:start + 3 * 37]))
+            for i in range(3):
+                split[i] += list(block[i])
+        self.assertEqual(len(split[0]), len(whole[0]))
+        for a, b in zip(split[0], whole[0]):
+            self.assertAlmostEqual(a, b)
+
+    def test_tilt_angles(self):
+        (angles,) = Pipeline(analysers=[TiltAngles()]).process(
+            [0, 0, 1024, 1024, 0, 0, 724, 0, 724])
+        pitch, roll, tilt = [list(channel) for channel in angles]
+        self.assertEqual([round(a) for a in pitch], [0, 90, 45])
+        self.assertEqual([round(a) for a in roll], [0, 0, 0])
+        self.assertEqual([round(a) for a in tilt], [0, 90, 45])
+
+
+class TestDSPNumPy(DSPTests, unittest.TestCase):
+
+    def setUp(self):
+        if _optional.import_numpy() is None:
+            self.skipTest('NumPy is not installed')
+
+
+class TestDSPFallback(DSPTests, unittest.TestCase):
+
+    def setUp(self):
+        _optional.disable('numpy')
+
+    def tearDown(self):
+        _optional.reset()
+
+
+
+class TestBiquadPaths(unittest.TestCase):
+    """The SciPy and chunked NumPy biquads match the sample by sample one
+    over blocks which don't line up with the chunks.
+    """
+
+    block_sizes = (1, 63, 64, 65, 200, 7)
+
+    def setUp(self):
+        if _optional.import_numpy() is None:
+            self.skipTest('NumPy is not installed')
+
+    def tearDown(self):
+        _optional.reset()
+
+    def filtered(self, filter_class, *args):
+        f = filter_class(*args, channels=1)
+        signal = [math.sin(i * 0.3) + (i % 7) / 7 for i in range(400)]
+        start = 0
+        output = []
+        for size in self.block_sizes:
+            output += list(f.process([signal[start:start + size]])[0])
+            start += size
+        return output
+
+    def assert_paths_match(self, filter_class, *args):
+        _optional.disable('numpy')
+        expected = self.filtered(filter_class, *args)
+        _optional.reset()
+        actual = self.filtered(filter_class, *args)
+        self.assertEqual(len(actual), len(expected))
+        for a, b in zip(actual, expected):
+            self.assertAlmostEqual(a, b, 9)
+
+    def test_chunked(self):
+        _optional.disable('scipy.signal')
+        self.assert_paths_match(LowPassFilter, 20, 800)
+        self.assert_paths_match(HighPassFilter, 5, 800)
+
+    def test_scipy(self):
+        if _optional.import_scipy_signal() is None:
+            self.skipTest('SciPy is not installed')
+        self.assert_paths_match(LowPassFilter, 20, 800)
+        self.assert_paths_match(HighPassFilter, 5, 800)
+
+
+if __name__ == "__main__":
+    unittest.main()
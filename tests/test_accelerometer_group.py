@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+import os
+import sys
+parentdir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, parentdir)
+import unittest
+from microstacknode.hardware.accelerometer import mma8452q
+from microstacknode.hardware.accelerometer.group import MMA8452QGroup
+from fake_mma8452q import FakeMMA8452Q
+
+
+class FakeGroup(MMA8452QGroup):
+    """Sends each message to the fake accelerometer at its address."""
+
+    def open(self):
+        self.fd = None
+        self.transfers = 0
+
+    def close(self):
+        pass
+
+    def transaction(self, *msgs):
+        self.transfers += 1
+        for m in msgs:
+            self._device(m.addr)._apply([m])
+
+    def _rdwr(self, ioctl_data):
+        self.transaction(*[ioctl_data.msgs[i]
+                           for i in range(ioctl_data.nmsgs)])
+
+    def _device(self, address):
+        for accelerometer in self.accelerometers:
+            if accelerometer.i2c_address == address:
+                return accelerometer
+
+
+class TestMMA8452QGroup(unittest.TestCase):
+
+    def setUp(self):
+        self.first = FakeMMA8452Q(i2c_address=0x1c)
+        self.second = FakeMMA8452Q(i2c_address=0x1d)
+        self.group = FakeGroup([self.first, self.second],
+                               output_data_rate=400, g_range=4)
+        self.group.__enter__()
+
+    def test_init(self):
+        for accelerometer in (self.first, self.second):
+            self.assertEqual(accelerometer.registers[mma8452q.CTRL_REG1],
+                             mma8452q.CTRL_REG1_ODR_400 |
+                             mma8452q.CTRL_REG1_SET_ACTIVE)
+            self.assertEqual(accelerometer.registers[mma8452q.XYZ_DATA_CFG],
+                             mma8452q.XYZ_DATA_CFG_FSR_4G)
+        # both activated in the last transfer
+        self.assertEqual(self.first.transactions[-1], [('w', 2)])
+        self.assertEqual(self.second.transactions[-1], [('w', 2)])
+
+    def test_fast_read_rejected(self):
+        self.first.set_fast_read(True)
+        with self.assertRaises(ValueError):
+            self.group.init()
+
+    def test_read_block(self):
+        self.first.set_xyz(1, 2, 3)
+        self.second.set_xyz(-1, -2, -3, status=0x00)
+        transfers = self.group.transfers
+        samples, timestamps = self.group.read_block(2)
+        self.assertEqual(self.group.transfers - transfers, 2)
+        self.assertEqual(samples.tolist(), [1, 2, 3, 0, 0, 0] * 2)
+        self.assertEqual(self.group.held, [0, 2])
+        self.second.set_xyz(-1, -2, -3, status=0x8f)
+        samples, timestamps = self.group.read_block(1)
+        first, second = self.group.split(samples)
+        self.assertEqual(first.tolist(), [1, 2, 3])
+        self.assertEqual(second.tolist(), [-1, -2, -3])
+        self.assertEqual(self.group.overwritten, [0, 1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+import os
+import sys
+parentdir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, parentdir)
+import datetime
+import unittest
+from microstacknode.hardware.gps.l80gps import L80GPS
+from microstacknode.hardware.gps.clocksync import (GPSClock,
+                                                   ClockNotSyncedError)
+
+
+GPRMC = (b'$GPRMC,013732.000,A,3150.7238,N,11711.7278,E,0.00,0.00,220413,'
+         b',,A*68\r\n')
+
+
+class FakeSerial(object):
+    """Returns lines, each with the number of bytes which were buffered
+    before it was read.
+    """
+
+    def __init__(self, lines):
+        self.lines = list(lines)  # (in_waiting, line)
+
+    @property
+    def in_waiting(self):
+        return self.lines[0][0] if self.lines else 0
+
+    def readline(self):
+        return self.lines.pop(0)[1] if self.lines else b''
+
+
+class TestGPSClock(unittest.TestCase):
+
+    def test_not_synced(self):
+        with self.assertRaises(ClockNotSyncedError):
+            GPSClock().to_utc(0)
+
+    def test_drift_and_outlier(self):
+        clock = GPSClock()
+        for i in range(10):
+            # monotonic clock runs 100 ppm fast, one frame arrives late
+            arrival = 1000 + i * 1.0001 + (0.4 if i == 5 else 0)
+            clock.add_fix({'utc': 120000.0 + i, 'date': '220416'}, arrival)
+        expected = datetime.datetime(2016, 4, 22, 12, 0, 20)
+        self.assertAlmostEqual(
+            (clock.to_datetime(1000 + 20 * 1.0001) - expected).total_seconds(),
+            0, places=6)
+
+    def test_midnight(self):
+        clock = GPSClock()
+        clock.add_fix({'utc': 0.0, 'date': '230416'}, 10)
+        self.assertEqual(clock.to_datetime(10),
+                         datetime.datetime(2016, 4, 23))
+
+    def test_buffered_lines_are_not_timed(self):
+        gps = L80GPS.__new__(L80GPS)
+        gps.clock = GPSClock()
+        gps.device_tx_rx = FakeSerial([(0, GPRMC), (len(GPRMC) * 2, GPRMC)])
+        gps.get_gprmc()
+        self.assertIsNotNone(gps.last_pkt_arrival)
+        gps.get_gprmc()
+        self.assertIsNone(gps.last_pkt_arrival)
+        self.assertEqual(len(gps.clock._samples), 1)
+
+    def test_gpgga_needs_date(self):
+        clock = GPSClock()
+        clock.add_fix({'utc': 120000.0}, 10)
+        self.assertFalse(clock.synced)
+        clock.add_fix({'utc': 235959.0, 'date': '220416'}, 10)
+        clock.add_fix({'utc': 1.0}, 12)
+        self.assertEqual(clock.to_datetime(12),
+                         datetime.datetime(2016, 4, 23, 0, 0, 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+import os
+import sys
+parentdir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, parentdir)
+import unittest
+from microstacknode.hardware.gps.l80gps import gpgsv_as_dict
+from microstacknode.hardware.gps.satstats import SatelliteStats
+
+
+GPGSV_SEQUENCE = [
+    '$GPGSV,3,1,09,01,05,060,18,02,17,259,43,04,56,287,28,09,08,277,28*77',
+    '$GPGSV,3,2,09,10,34,195,,12,71,100,45,14,12,318,,17,23,044,39*7A',
+    '$GPGSV,3,3,09,32,10,050,*4B',
+]
+
+
+class TestGPGSVAsDict(unittest.TestCase):
+
+    def test_satellites_per_message(self):
+        for n in range(1, 5):
+            fields = ','.join('{:02d},10,100,30'.format(i + 1)
+                              for i in range(n))
+            gpgsv, checksum = gpgsv_as_dict(
+                '$GPGSV,1,1,0{},{}*00'.format(n, fields))
+            self.assertEqual(len(gpgsv['satellite']), n)
+            self.assertEqual(gpgsv['satellite'][-1]['id'],
+                             '{:02d}'.format(n))
+            self.assertEqual(checksum, '00')
+
+    def test_no_satellites(self):
+        gpgsv, checksum = gpgsv_as_dict('$GPGSV,1,1,00*79')
+        self.assertEqual(gpgsv['satellites_in_view'], '00')
+        self.assertEqual(gpgsv['satellite'], [])
+
+    def test_empty_fields(self):
+        gpgsv, checksum = gpgsv_as_dict(GPGSV_SEQUENCE[1])
+        self.assertEqual([s['snr'] for s in gpgsv['satellite']],
+                         ['', '45', '', '39'])
+
+    def test_last_message(self):
+        gpgsv, checksum = gpgsv_as_dict(GPGSV_SEQUENCE[2])
+        self.assertEqual(gpgsv['sequence_num'], gpgsv['num_messages'])
+        self.assertEqual(gpgsv['satellite'], [{'id': '32',
+                                               'elevation': '10',
+                                               'azimuth': '050',
+                                               'snr': ''}])
+        self.assertEqual(checksum, '4B')
+
+
+class TestSatelliteStats(unittest.TestCase):
+
+    def test_accumulation(self):
+        stats = SatelliteStats()
+        for message in GPGSV_SEQUENCE[:2]:
+            stats.add_gsv(gpgsv_as_dict(message)[0])
+        # in_view only changes at the end of a sequence
+        self.assertEqual(stats.in_view, [])
+        stats.add_gsv(gpgsv_as_dict(GPGSV_SEQUENCE[2])[0])
+        for message in GPGSV_SEQUENCE:
+            stats.add_gsv(gpgsv_as_dict(message)[0])
+        in_view = stats.in_view
+        self.assertEqual(len(in_view), 9)
+        self.assertIn((32, 10, None), in_view)
+        snapshot = stats.snapshot()
+        satellites = snapshot['satellites']
+        # satellites without an SNR are not tracked
+        self.assertEqual(sorted(satellites), [1, 2, 4, 9, 12, 17])
+        self.assertEqual(satellites[2], {'count': 2,
+                                         'snr_mean': 43.0,
+                                         'snr_min': 43,
+                                         'snr_max': 43})
+        # satellite 12: elevation 71, SNR 45
+        self.assertEqual(snapshot['elevation_histogram'][7][9], 2)
+
+    def test_dop_ring_wraps(self):
+        stats = SatelliteStats(dop_history=3)
+        stats.add_gsa({'pdop': '', 'hdop': '', 'vdop': ''})  # no fix
+        self.assertEqual(stats.get_dop(), [])
+        for i in range(5):
+            stats.add_gsa({'pdop': str(i + 1.5),
+                           'hdop': str(i + 1.0),
+                           'vdop': str(i + 0.5)})
+        self.assertEqual(stats.get_dop(), [(3.5, 3.0, 2.5),
+                                           (4.5, 4.0, 3.5),
+                                           (5.5, 5.0, 4.5)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+import os
+import io
+import sys
+parentdir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, parentdir)
+import json
+import datetime
+import unittest
+from microstacknode.hardware.gps.track import (TrackSimplifier,
+                                               GPXWriter,
+                                               GeoJSONWriter,
+                                               simplify,
+                                               write_track,
+                                               point_datetime)
+
+
+def straight_line(n):
+    return [{'latitude': 52.0 + i * 0.0001, 'longitude': -1.0}
+            for i in range(n)]
+
+
+class TestTrackSimplifier(unittest.TestCase):
+
+    def test_straight_line_keeps_ends(self):
+        points = straight_line(20)
+        simplified = list(simplify(points, tolerance=1, window=100))
+        self.assertEqual(simplified, [points[0], points[-1]])
+
+    def test_corner_is_kept(self):
+        points = straight_line(10)
+        corner = points[-1]
+        points += [{'latitude': corner['latitude'],
+                    'longitude': corner['longitude'] + i * 0.0001}
+                   for i in range(1, 10)]
+        simplified = list(simplify(points, tolerance=1, window=100))
+        self.assertIn(corner, simplified)
+        self.assertEqual(simplified[0], points[0])
+        self.assertEqual(simplified[-1], points[-1])
+
+    def test_window_is_bounded(self):
+        simplifier = TrackSimplifier(tolerance=1000, window=8)
+        for point in straight_line(100):
+            simplifier.add(point)
+            self.assertLessEqual(len(simplifier._candidates), 8)
+
+
+class TestTrackWriters(unittest.TestCase):
+
+    def test_gpx(self):
+        f = io.StringIO()
+        with GPXWriter(f, name='walk') as gpx:
+            n = write_track(straight_line(3), gpx)
+        self.assertEqual(n, 3)
+        self.assertEqual(f.getvalue().count('<trkpt'), 3)
+        self.assertTrue(f.getvalue().endswith('</gpx>\n'))
+
+    def test_geojson(self):
+        f = io.StringIO()
+        with GeoJSONWriter(f, {'name': 'walk'}) as geojson:
+            write_track(straight_line(3), geojson)
+        feature = json.loads(f.getvalue())
+        self.assertEqual(len(feature['geometry']['coordinates']), 3)
+        self.assertEqual(feature['geometry']['coordinates'][0],
+                         [-1.0, 52.0])
+        self.assertEqual(feature['properties'], {'name': 'walk'})
+
+    def test_gprmc_datetime(self):
+        point = {'utc': 13732.5, 'date': '220413'}
+        self.assertEqual(point_datetime(point),
+                         datetime.datetime(2013, 4, 22, 1, 37, 32, 500000))
+
+
+if __name__ == "__main__":
+    unittest.main()
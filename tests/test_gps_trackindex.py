@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+import os
+import sys
+parentdir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, parentdir)
+import tempfile
+import datetime
+import unittest
+from microstacknode.hardware.gps.trackindex import TrackIndex, INDEX_RECORD
+
+
+START = datetime.datetime(2016, 4, 22, 12, 0, 0)
+
+
+def timed(points):
+    return [dict(p, utc=START + datetime.timedelta(seconds=i))
+            for i, p in enumerate(points)]
+
+
+def straight_line(n, longitude=-1.0):
+    return timed([{'latitude': 52.0 + i * 0.0001, 'longitude': longitude}
+                  for i in range(n)])
+
+
+class TestTrackIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.points = straight_line(10)
+        self.path = os.path.join(tempfile.mkdtemp(), 'track.idx')
+
+    def test_position_at(self):
+        index = TrackIndex()
+        index.extend(self.points)
+        time = self.points[2]['utc'] + datetime.timedelta(seconds=0.5)
+        position = index.position_at(time)
+        self.assertAlmostEqual(position['latitude'], 52.00025)
+        self.assertIsNone(
+            index.position_at(time + datetime.timedelta(hours=1)))
+
+    def test_passes_near(self):
+        index = TrackIndex()
+        index.extend(self.points)
+        passes = index.passes_near(self.points[5], 12)
+        self.assertEqual(passes, [(self.points[4]['utc'],
+                                   self.points[6]['utc'])])
+
+    def test_persisted(self):
+        with TrackIndex(self.path) as index:
+            index.extend(self.points[:5])
+        with TrackIndex(self.path) as index:
+            index.extend(self.points[5:])
+        with TrackIndex(self.path) as index:
+            self.assertEqual(len(index), 10)
+            self.assertEqual(index.near(self.points[9], 1), [9])
+
+    def test_add_is_flushed(self):
+        index = TrackIndex(self.path)
+        index.add(self.points[0])
+        index.add(self.points[1])
+        # not closed, as if the process had died
+        self.assertEqual(os.path.getsize(self.path), 2 * INDEX_RECORD.size)
+        self.assertEqual(len(TrackIndex(self.path)), 2)
+        index.close()
+
+    def test_reload_after_partial_write(self):
+        with TrackIndex(self.path) as index:
+            index.extend(self.points[:3])
+        with open(self.path, 'ab') as f:
+            f.write(INDEX_RECORD.pack(1.0, 2.0, 3.0)[:10])
+        size = os.path.getsize(self.path)
+        with TrackIndex(self.path) as index:
+            self.assertEqual(len(index), 3)
+        # loading leaves the file alone
+        self.assertEqual(os.path.getsize(self.path), size)
+        with TrackIndex(self.path) as index:
+            index.extend(self.points[3:])
+        self.assertEqual(os.path.getsize(self.path), 10 * INDEX_RECORD.size)
+        with TrackIndex(self.path) as index:
+            self.assertEqual(len(index), 10)
+            position = index.position_at(self.points[9]['utc'])
+            self.assertAlmostEqual(position['latitude'],
+                                   self.points[9]['latitude'])
+
+    def test_near_antimeridian(self):
+        points = timed([{'latitude': 0.0, 'longitude': 179.9999},
+                        {'latitude': 0.0, 'longitude': 180.0},
+                        {'latitude': 0.0, 'longitude': -179.9999},
+                        {'latitude': 0.0, 'longitude': -179.99}])
+        index = TrackIndex()
+        index.extend(points)
+        # about 11 m either side of the line, the last fix is 1.1 km away
+        self.assertEqual(index.near(points[0], 25), [0, 1, 2])
+        self.assertEqual(index.near(points[2], 25), [0, 1, 2])
+        self.assertEqual(index.passes_near(points[1], 25),
+                         [(points[0]['utc'], points[2]['utc'])])
+
+
+if __name__ == "__main__":
+    unittest.main()
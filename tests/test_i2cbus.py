@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+import os
+import sys
+parentdir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, parentdir)
+import time
+import threading
+import unittest
+from microstacknode.hardware.i2cbus import (I2CBusManager,
+                                            get_bus_manager,
+                                            PRIORITY_SENSOR,
+                                            PRIORITY_DISPLAY)
+from microstacknode.hardware.display.ssd1306 import SSD1306_96x16
+from microstacknode.hardware.humiditytemperature.sht21 import SHT21
+from fake_sht21 import FakeSHT21Bus, reading, writing_bytes
+
+
+class FakeMaster(object):
+    """Records transactions, each message is a name. A transaction of
+    'block' waits for `unblock` to be set.
+    """
+
+    def __init__(self):
+        self.opened = 0
+        self.closed = 0
+        self.fd = 3
+        self.transactions = []
+        self.unblock = threading.Event()
+
+    def open(self):
+        self.opened += 1
+
+    def close(self):
+        self.closed += 1
+
+    def transaction(self, *msgs):
+        if msgs == ('block',):
+            self.unblock.wait()
+        self.transactions.append(msgs)
+        return []
+
+
+def wait_for(condition):
+    deadline = time.monotonic() + 1
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("Timed out.")
+        time.sleep(0.001)
+
+
+class TestI2CBusManager(unittest.TestCase):
+
+    def setUp(self):
+        self.master = FakeMaster()
+        self.manager = I2CBusManager(1, self.master)
+
+    def test_shared_handle(self):
+        self.assertIs(get_bus_manager(5), get_bus_manager(5))
+        first = self.manager.device(0x40)
+        second = self.manager.device(0x1d)
+        with first:
+            with second:
+                self.assertEqual(second.fd, 3)
+            self.assertEqual(self.master.closed, 0)
+        self.assertEqual((self.master.opened, self.master.closed), (1, 1))
+
+    def test_priority(self):
+        manager = self.manager
+
+        def transact(name, priority):
+            return threading.Thread(
+                target=manager.transaction,
+                args=(name,),
+                kwargs={'priority': priority, 'address': name})
+
+        threads = [transact('block', PRIORITY_SENSOR)]
+        threads[0].start()
+        wait_for(lambda: manager._busy)
+        for name, priority in (('display', PRIORITY_DISPLAY),
+                               ('sensor', PRIORITY_SENSOR)):
+            threads.append(transact(name, priority))
+            threads[-1].start()
+            wait_for(lambda: len(manager._waiting) == len(threads) - 1)
+        self.master.unblock.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.master.transactions,
+                         [('block',), ('sensor',), ('display',)])
+        self.assertGreater(manager.stats['display'].max_wait,
+                           manager.stats['block'].max_wait)
+
+    def test_stats_from_threads(self):
+        device = self.manager.device(0x1d)
+
+        def transactions():
+            for i in range(200):
+                device.transaction('read')
+
+        threads = [threading.Thread(target=transactions) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(list(self.manager.stats), [0x1d])
+        self.assertEqual(self.manager.stats[0x1d].count, 8 * 200)
+
+    def test_sht21_stats(self):
+        manager = I2CBusManager(1, FakeSHT21Bus(busy_reads=2))
+        sensor = SHT21(i2c_reading=reading,
+                       i2c_writing_bytes=writing_bytes,
+                       bus_manager=manager)
+        sensor.read_both()
+        stats = manager.stats[0x40]
+        self.assertEqual(stats.count, 8)  # 2 writes, 6 reads
+        self.assertEqual(stats.errors, 4)  # NACKs
+
+    def test_display_chunks(self):
+        display = SSD1306_96x16(bus_manager=self.manager)
+        display.send_data(*[0] * 192)
+        self.assertEqual(len(self.master.transactions), 6)
+        self.assertEqual(self.manager.stats[0x3c].count, 6)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+import os
+import sys
+parentdir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, parentdir)
+import array
+import unittest
+from microstacknode import _optional
+from microstacknode.hardware.accelerometer import mma8452q
+from fake_mma8452q import FakeMMA8452Q
+
+
+# one sample: x = 1G, y = -1G, z = 2047 counts (at 2G range)
+RAW_SAMPLE = bytes([0x40, 0x00, 0xC0, 0x00, 0x7f, 0xf0])
+
+
+class TestConversion(unittest.TestCase):
+
+    def tearDown(self):
+        _optional.reset()
+
+    def check_raw_to_g(self):
+        g = mma8452q.raw_to_g(RAW_SAMPLE * 2, g_range=2)
+        self.assertEqual(list(g), [1.0, -1.0, 2047 / 1024] * 2)
+        ms2 = mma8452q.raw_to_g(RAW_SAMPLE, g_range=4, si=True)
+        self.assertAlmostEqual(ms2[0], 2 * mma8452q.STANDARD_GRAVITY, 5)
+
+    def test_raw_to_g_lookup_table(self):
+        _optional.disable('numpy')
+        self.check_raw_to_g()
+        self.assertEqual(len(mma8452q._raw_to_g_table(2, False)), 4096)
+
+    def test_raw_to_g_numpy(self):
+        if _optional.import_numpy() is None:
+            self.skipTest('NumPy is not installed')
+        self.check_raw_to_g()
+
+    def test_counts_to_g(self):
+        _optional.disable('numpy')
+        self.assertEqual(list(mma8452q.counts_to_g([1024, -2048], 8)),
+                         [4.0, -8.0])
+
+    def test_bad_length(self):
+        with self.assertRaises(ValueError):
+            mma8452q.raw_to_g(RAW_SAMPLE[:5])
+
+
+class TestGetXYZInto(unittest.TestCase):
+
+    def setUp(self):
+        self.accelerometer = FakeMMA8452Q().__enter__()
+        self.accelerometer.set_xyz(1024, -512, 2047, status=0x0f)
+
+    def test_fills_in_place(self):
+        xyz = array.array('f', [0, 0, 0])
+        status = self.accelerometer.get_xyz_into(xyz)
+        self.assertEqual(status, 0x0f)
+        self.assertEqual(xyz.tolist(), [1.0, -0.5, 2047 / 1024])
+        xyz_dict = self.accelerometer.get_xyz()
+        self.assertEqual([xyz_dict['x'], xyz_dict['y'], xyz_dict['z']],
+                         xyz.tolist())
+
+    def test_raw_and_reused_buffer(self):
+        xyz = [0, 0, 0]
+        self.accelerometer.get_xyz_into(xyz, raw=True)
+        buf = self.accelerometer._xyz_buf
+        self.accelerometer.set_xyz(-1, 0, 1)
+        self.accelerometer.get_xyz_into(xyz, raw=True)
+        self.assertEqual(xyz, [-1, 0, 1])
+        self.assertIs(self.accelerometer._xyz_buf, buf)
+
+
+class TestFastRead(unittest.TestCase):
+
+    def setUp(self):
+        self.accelerometer = FakeMMA8452Q().__enter__()
+        self.accelerometer.set_xyz(1024, -512, 16)
+
+    def test_fast_read(self):
+        accelerometer = self.accelerometer
+        accelerometer.standby()
+        accelerometer.set_fast_read(True)
+        accelerometer.activate()
+        self.assertTrue(accelerometer._ctrl_reg1_value &
+                        mma8452q.CTRL_REG1_F_READ)
+        self.assertEqual(accelerometer.registers[mma8452q.CTRL_REG1],
+                         accelerometer._ctrl_reg1_value)
+        xyz = [0, 0, 0]
+        accelerometer.get_xyz_into(xyz, raw=True)
+        self.assertEqual(xyz, [1024, -512, 16])
+        self.assertEqual(accelerometer.transactions[-1], [('r', 4)])
+        self.assertEqual(accelerometer.get_xyz(),
+                         {'x': 1.0, 'y': -0.5, 'z': 2 / 128})
+        self.assertEqual(accelerometer.transactions[-1], [('r', 4)])
+
+    def test_reset_clears_fast_read(self):
+        self.accelerometer.set_fast_read(True)
+        self.accelerometer.reset()
+        self.assertFalse(self.accelerometer.fast_read)
+        self.accelerometer.get_xyz_into([0, 0, 0])
+        self.assertEqual(self.accelerometer.transactions[-1], [('r', 7)])
+
+
+class TestRegisterReads(unittest.TestCase):
+
+    def setUp(self):
+        self.accelerometer = FakeMMA8452Q().__enter__()
+
+    def test_register_get(self):
+        ctrl_reg1 = mma8452q.MMA8452QRegister(
+            mma8452q.CTRL_REG1, self.accelerometer.i2c_address,
+            self.accelerometer)
+        self.assertEqual(ctrl_reg1.get(),
+                         self.accelerometer._ctrl_reg1_value)
+        self.assertEqual(self.accelerometer.transactions[-1],
+                         [('w', 1), ('r', 1)])
+
+    def test_read_registers(self):
+        self.accelerometer.registers[mma8452q.PULSE_SRC] = 0x44
+        self.assertEqual(
+            self.accelerometer.read_register(mma8452q.WHO_AM_I), 0x2A)
+        self.assertEqual(
+            self.accelerometer.read_registers(mma8452q.PULSE_CFG, 2)[1],
+            0x44)
+
+
+class TestConfigure(unittest.TestCase):
+
+    def setUp(self):
+        self.accelerometer = FakeMMA8452Q().__enter__()
+
+    def test_init_is_batched(self):
+        self.assertEqual(len(self.accelerometer.transactions), 3)
+        self.assertEqual(self.accelerometer.registers[mma8452q.CTRL_REG1],
+                         mma8452q.CTRL_REG1_SET_ACTIVE)
+
+    def test_session(self):
+        accelerometer = self.accelerometer
+        accelerometer.transactions = []
+        with accelerometer.configure():
+            accelerometer.set_output_data_rate(100)
+            accelerometer.set_g_range(4)
+            for i, register in enumerate((mma8452q.OFF_Z,
+                                          mma8452q.OFF_Y,
+                                          mma8452q.OFF_X)):
+                accelerometer._set_register(register, 3 - i)
+            self.assertEqual(accelerometer.transactions, [])
+        # standby, XYZ_DATA_CFG, OFF_X to OFF_Z and then CTRL_REG1
+        self.assertEqual(accelerometer.transactions,
+                         [[('w', 2)], [('w', 2)], [('w', 4)], [('w', 2)]])
+        registers = accelerometer.registers
+        self.assertEqual(registers[mma8452q.XYZ_DATA_CFG],
+                         mma8452q.XYZ_DATA_CFG_FSR_4G)
+        self.assertEqual(registers[mma8452q.CTRL_REG1],
+                         mma8452q.CTRL_REG1_ODR_100 |
+                         mma8452q.CTRL_REG1_SET_ACTIVE)
+        self.assertEqual(list(registers[mma8452q.OFF_X:]), [1, 2, 3])
+
+    def test_active_ctrl_reg1_change(self):
+        accelerometer = self.accelerometer
+        accelerometer.transactions = []
+        writes = []
+        write_registers = accelerometer._write_registers
+        accelerometer._write_registers = lambda address, values: (
+            writes.append((address, list(values))),
+            write_registers(address, values))
+        with accelerometer.configure():
+            accelerometer.set_output_data_rate(100)
+        # standby (old rate) and then the new rate with ACTIVE
+        self.assertEqual(accelerometer.transactions, [[('w', 2)]] * 2)
+        self.assertEqual(writes[0][1][0] & mma8452q.CTRL_REG1_SET_ACTIVE, 0)
+        self.assertEqual(accelerometer.registers[mma8452q.CTRL_REG1],
+                         mma8452q.CTRL_REG1_ODR_100 |
+                         mma8452q.CTRL_REG1_SET_ACTIVE)
+        # only changing ACTIVE needs one write
+        accelerometer.transactions = []
+        with accelerometer.configure():
+            accelerometer.standby()
+        self.assertEqual(accelerometer.transactions, [[('w', 2)]])
+
+    def test_auto_sleep(self):
+        accelerometer = self.accelerometer
+        with accelerometer.configure():
+            accelerometer.set_auto_sleep(sleep_rate=1.56, timeout=3.2,
+                                         wake_sources=['tap', 'motion'])
+        registers = accelerometer.registers
+        self.assertEqual(registers[mma8452q.CTRL_REG1],
+                         mma8452q.CTRL_REG1_ASLP_RATE_1_56 |
+                         mma8452q.CTRL_REG1_SET_ACTIVE)
+        self.assertEqual(registers[mma8452q.ASLP_COUNT], 10)
+        self.assertEqual(registers[mma8452q.CTRL_REG2],
+                         mma8452q.CTRL_REG2_SLPE)
+        self.assertEqual(registers[mma8452q.CTRL_REG3], 0x18)
+        registers[mma8452q.SYSMOD] = mma8452q.SYSMOD_SLEEP
+        mode = accelerometer.get_system_mode()
+        self.assertEqual(accelerometer.get_sample_rate(mode), 1.56)
+
+    def test_register_runs(self):
+        shadow = {0x29: 1, 0x2B: 2, 0x2C: 3, 0x2F: 4}
+        self.assertEqual(
+            mma8452q._register_runs([0x29, 0x2C, 0x2F], shadow, 0x08),
+            [(0x29, [1, 0x08, 2, 3]), (0x2F, [4])])
+
+    def test_block_read(self):
+        self.accelerometer.set_xyz(1, 2, 3, status=0x8f)
+        out = array.array('h', [0] * 6)
+        overwritten = self.accelerometer.get_xyz_block_into(out, 2, True)
+        self.assertEqual(out.tolist(), [1, 2, 3] * 2)
+        self.assertEqual(overwritten, 2)
+
+    def test_block_read_standby(self):
+        self.accelerometer.standby()
+        self.accelerometer.set_xyz(1, 2, 3, status=0x00)
+        out = array.array('h', [0] * 6)
+        with self.assertRaises(TimeoutError):
+            self.accelerometer.get_xyz_block_into(out, 2, True)
+
+
+if __name__ == "__main__":
+    unittest.main()
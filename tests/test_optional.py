@@ -0,0 +1,27 @@
+#!/usr/bin/env python3
+import os
+import sys
+parentdir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, parentdir)
+import unittest
+from microstacknode import _optional
+
+
+class TestOptional(unittest.TestCase):
+
+    def tearDown(self):
+        _optional.reset()
+
+    def test_missing(self):
+        self.assertIsNone(_optional._import('microstacknode_no_such_module'))
+
+    def test_disable_and_reset(self):
+        self.assertIsNotNone(_optional._import('json'))
+        _optional.disable('json')
+        self.assertIsNone(_optional._import('json'))
+        _optional.reset()
+        self.assertIsNotNone(_optional._import('json'))
+
+
+if __name__ == "__main__":
+    unittest.main()
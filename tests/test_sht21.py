@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+import os
+import sys
+parentdir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, parentdir)
+import time
+import unittest
+from microstacknode.hardware.humiditytemperature import sht21
+from fake_sht21 import fake_sht21
+
+
+class TestMeasurement(unittest.TestCase):
+
+    def setUp(self):
+        self.sensor = fake_sht21(busy_reads=2)
+
+    def test_split_phase(self):
+        sensor = self.sensor
+        sensor.start_measurement(sht21.CMD_TEMPERATURE_NO_HOLD)
+        self.assertIsNone(sensor.poll_measurement())
+        self.assertIsNone(sensor.poll_measurement())
+        self.assertAlmostEqual(sensor.poll_measurement(), 23.4, 1)
+        with self.assertRaises(sht21.MeasurementError):
+            sensor.poll_measurement()
+
+    def test_read_both(self):
+        start = time.monotonic()
+        temperature, humidity = self.sensor.read_both()
+        self.assertLess(time.monotonic() - start, 0.25)
+        self.assertAlmostEqual(temperature, 23.4, 1)
+        self.assertAlmostEqual(humidity, 56.1, 1)
+
+    def test_checksum(self):
+        self.sensor.i2c_master.transaction = \
+            lambda *msgs: [b'\x7f\x2a\x00'] if msgs[0][0] == 'r' else []
+        with self.assertRaises(sht21.ChecksumFailedError):
+            self.sensor.get_humidity()
+
+
+class TestResolution(unittest.TestCase):
+
+    def setUp(self):
+        self.sensor = fake_sht21(busy_reads=0)
+        self.bus = self.sensor.i2c_master
+
+    def test_set_resolution(self):
+        self.sensor.set_resolution(8, 12)
+        self.assertEqual(self.bus.user_register, 0x3b)
+        self.assertEqual(self.sensor.get_resolution(), (8, 12))
+        self.sensor.set_resolution(10, 13)
+        self.assertEqual(self.bus.user_register, 0xba)
+        with self.assertRaises(ValueError):
+            self.sensor.set_resolution(12, 12)
+
+    def test_wait_follows_resolution(self):
+        self.sensor.set_resolution(8, 12)
+        start = time.monotonic()
+        self.sensor.get_humidity()
+        self.assertLess(time.monotonic() - start, 0.015)
+        self.sensor.reset()
+        self.assertEqual(self.sensor.resolution, sht21.DEFAULT_RESOLUTION)
+        start = time.monotonic()
+        self.sensor.get_humidity()
+        self.assertGreaterEqual(time.monotonic() - start, 0.022)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+import os
+import sys
+parentdir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, parentdir)
+import asyncio
+import unittest
+from microstacknode.hardware.humiditytemperature import sht21
+from microstacknode.hardware.humiditytemperature.sht21_async import (
+    AsyncSHT21)
+from fake_sht21 import FakeSHT21Bus, reading, writing_bytes
+
+
+class LoggedBus(FakeSHT21Bus):
+    """Records (name, message) in a log shared between buses."""
+
+    def __init__(self, name, log, busy_reads=1):
+        super().__init__(busy_reads)
+        self.name = name
+        self.log = log
+
+    def transaction(self, *msgs):
+        for msg in msgs:
+            self.log.append((self.name, msg[0], msg[2][0]
+                             if msg[0] == 'w' else None))
+        return super().transaction(*msgs)
+
+
+def fake_async_sht21(bus):
+    return AsyncSHT21(bus,
+                      i2c_reading=reading,
+                      i2c_writing_bytes=writing_bytes)
+
+
+class TestAsyncSHT21(unittest.TestCase):
+
+    def setUp(self):
+        self.log = []
+
+    def test_concurrent_reads(self):
+        sensors = [fake_async_sht21(LoggedBus(name, self.log))
+                   for name in ('first', 'second')]
+
+        async def read_all():
+            return await asyncio.gather(*[s.read_both() for s in sensors])
+
+        readings = asyncio.run(read_all())
+        for temperature, humidity in readings:
+            self.assertAlmostEqual(temperature, 23.4, 1)
+            self.assertAlmostEqual(humidity, 56.1, 1)
+        # the conversions overlap: both sensors were started before
+        # either was read
+        self.assertEqual(
+            self.log[:2],
+            [('first', 'w', sht21.CMD_TEMPERATURE_NO_HOLD),
+             ('second', 'w', sht21.CMD_TEMPERATURE_NO_HOLD)])
+
+    def test_one_sensor_from_several_tasks(self):
+        sensor = fake_async_sht21(LoggedBus('sensor', self.log))
+
+        async def read_both_kinds():
+            return await asyncio.gather(sensor.get_temperature(),
+                                        sensor.get_humidity())
+
+        temperature, humidity = asyncio.run(read_both_kinds())
+        self.assertAlmostEqual(temperature, 23.4, 1)
+        self.assertAlmostEqual(humidity, 56.1, 1)
+        # the humidity measurement waits for the temperature result
+        commands = [entry for entry in self.log if entry[1] == 'w']
+        self.assertEqual([c[2] for c in commands],
+                         [sht21.CMD_TEMPERATURE_NO_HOLD,
+                          sht21.CMD_HUMIDITY_NO_HOLD])
+        humidity_start = self.log.index(commands[1])
+        self.assertIn('r', [entry[1] for entry in self.log[:humidity_start]])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+import os
+import sys
+parentdir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, parentdir)
+import unittest
+from microstacknode import _optional
+from microstacknode.hardware.humiditytemperature.psychrometrics import (
+    dew_point,
+    absolute_humidity,
+    heat_index,
+    batch_metrics,
+    metrics_from_words)
+
+
+TEMPERATURES = [23.4, 32.0, 20.0, 40.0, 29.0, -10.0]
+HUMIDITIES = [56.1, 70.0, 50.0, 10.0, 90.0, 0.0]
+
+
+class TestPsychrometrics(unittest.TestCase):
+
+    def tearDown(self):
+        _optional.reset()
+
+    def test_reading(self):
+        self.assertAlmostEqual(dew_point(25, 100), 25)
+        self.assertAlmostEqual(dew_point(20, 50), 9.26, 2)
+        self.assertAlmostEqual(absolute_humidity(25, 50), 11.5, 1)
+        # NOAA table: 90 F at 70 % is 105 F
+        self.assertAlmostEqual(heat_index(32.22, 70), 40.6, 0)
+        self.assertAlmostEqual(heat_index(20, 50), 19.4, 1)
+
+    def test_batch(self):
+        expected = [[f(t, h) for t, h in zip(TEMPERATURES, HUMIDITIES)]
+                    for f in (dew_point, absolute_humidity, heat_index)]
+        for disable_numpy in (False, True):
+            if disable_numpy:
+                _optional.disable('numpy')
+            for values, want in zip(
+                    batch_metrics(TEMPERATURES, HUMIDITIES), expected):
+                for value, want_value in zip(values, want):
+                    self.assertAlmostEqual(value, want_value)
+
+    def test_memoized_words(self):
+        first = metrics_from_words(0x6664, 0x7f2a)
+        # same words apart from the status bits
+        self.assertIs(metrics_from_words(0x6665, 0x7f28), first)
+        self.assertAlmostEqual(first.temperature, 23.4, 1)
+        self.assertAlmostEqual(first.dew_point,
+                               dew_point(first.temperature, first.humidity))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+import os
+import sys
+parentdir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, parentdir)
+import time
+import unittest
+from microstacknode.hardware.gps.clocksync import GPSClock
+from microstacknode.hardware.humiditytemperature.sampler import (
+    AdaptiveSampler)
+
+
+class FakeSensor(object):
+
+    def read_both(self):
+        return 20.0, 50.0
+
+
+class TestAdaptiveSampler(unittest.TestCase):
+
+    def setUp(self):
+        self.sampler = AdaptiveSampler(None,
+                                       temperature_deadband=0.2,
+                                       humidity_deadband=1.0,
+                                       min_interval=1,
+                                       max_interval=60)
+
+    def run_readings(self, temperatures, humidity=50.0):
+        """Feeds readings at the sampler's interval, returns the emitted
+        ones and the final time.
+        """
+        now = 0.0
+        emitted = []
+        for temperature in temperatures:
+            reading = self.sampler.update(now, temperature, humidity)
+            if reading is not None:
+                emitted.append(reading)
+            now += self.sampler.interval
+        return emitted, now
+
+    def test_stable(self):
+        emitted, now = self.run_readings([20.0] * 20)
+        self.assertEqual(self.sampler.interval, 60)
+        # first, then one per max_interval
+        self.assertEqual([r.reason for r in emitted],
+                         ['first'] + ['max_interval'] * (len(emitted) - 1))
+        self.assertLess(self.sampler.reads, now / 10)
+
+    def test_change_tightens(self):
+        self.run_readings([20.0] * 8)
+        quiet_interval = self.sampler.interval
+        emitted, _ = self.run_readings([20.0, 20.3, 20.6, 20.9])
+        self.assertLess(self.sampler.interval, quiet_interval)
+        self.assertIn('change', [r.reason for r in emitted])
+        self.assertAlmostEqual(self.sampler.last_emitted.temperature, 20.9)
+
+    def test_within_deadband(self):
+        self.assertIsNotNone(self.sampler.update(0, 20.0, 50.0))
+        self.assertIsNone(self.sampler.update(1, 20.1, 50.5))
+        reading = self.sampler.update(2, 20.1, 51.5)
+        self.assertEqual(reading.reason, 'change')
+
+    def test_clock(self):
+        clock = GPSClock()
+        sampler = AdaptiveSampler(FakeSensor(), clock=clock)
+        self.assertIsNone(sampler.sample().utc)  # not synced
+        now = time.monotonic()
+        clock.add_sample(now, 1461326400.0)
+        sampler = AdaptiveSampler(FakeSensor(), clock=clock)
+        reading = sampler.sample()
+        self.assertAlmostEqual(reading.utc, 1461326400.0, 0)
+        self.assertGreaterEqual(reading.utc, 1461326400.0)
+
+
+if __name__ == "__main__":
+    unittest.main()